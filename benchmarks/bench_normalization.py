@@ -0,0 +1,106 @@
+"""
+Microbenchmark da normalização: funções por linha de src/utils.py x normalização em lote (src/normalization.py).
+
+Gera anúncios sintéticos com os campos em texto, como saem das páginas (preço, quartos, área,
+'Cidade, UF, CEP'), e compara:
+  - por linha: extract_price/extract_number/split_city_state_cep/clean_text em cada campo de cada
+    anúncio, e um DataFrame montado a partir da lista de dicts (colunas 'object');
+  - em lote: normalize_records, com as colunas tipadas.
+Mostra o tempo (melhor de --repeat execuções) e a memória ocupada pelo DataFrame resultante.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_normalization --rows 200000 --repeat 3
+"""
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from src.normalization import normalize_records
+from src.utils import clean_text, extract_number, extract_price, split_city_state_cep
+
+_CITIES = [("São Paulo", "SP"), ("Rio de Janeiro", "RJ"), ("Belo Horizonte", "MG"), ("Curitiba", "PR"), ("Porto Alegre", "RS")]
+_NEIGHBORHOODS = ["Centro", "Jardim América", "Vila Mariana", "Moema", "Copacabana", "Savassi", "Batel", "Moinhos de Vento"]
+
+
+def synthetic_records(rows, seed=42):
+    rng = random.Random(seed)
+    ceps = [f"{rng.randint(10000, 99999)}-{rng.randint(100, 999)}" for _ in range(500)] # Poucos CEPs por bairro, como nas buscas reais
+    records = []
+    for index in range(rows):
+        city, state = rng.choice(_CITIES)
+        price = rng.randint(80, 3000) * 1000
+        records.append({
+            "url_anuncio": f"https://sp.olx.com.br/imoveis/apartamento-{index}",
+            "titulo": f"  Apartamento  com {rng.randint(1, 4)} quartos\n ",
+            "preco_str": f"R$ {price:,}".replace(",", ".") if rng.random() > 0.05 else "Sob consulta",
+            "quartos": f"{rng.randint(1, 5)} quartos",
+            "banheiros": str(rng.randint(1, 4)),
+            "vagas na garagem": str(rng.randint(0, 3)),
+            "área útil": f"{rng.randint(30, 400)} m²",
+            "local_bairro": rng.choice(_NEIGHBORHOODS),
+            "local_cidade_estado_cep": f"{city}, {state}, {rng.choice(ceps)}",
+        })
+    return records
+
+
+def normalize_per_row(records):
+    """Caminho atual: uma chamada de função (e uma busca de regex) por campo, por anúncio."""
+    rows = []
+    for record in records:
+        city, state, cep = split_city_state_cep(record["local_cidade_estado_cep"])
+        rows.append({
+            "url_anuncio": record["url_anuncio"],
+            "titulo": clean_text(record["titulo"]),
+            "preco_str": record["preco_str"],
+            "preco": extract_price(record["preco_str"]),
+            "quartos": extract_number(record["quartos"]),
+            "banheiros": extract_number(record["banheiros"]),
+            "vagas na garagem": extract_number(record["vagas na garagem"]),
+            "área útil": extract_number(record["área útil"]),
+            "local_bairro": clean_text(record["local_bairro"]),
+            "local_cidade_estado_cep": record["local_cidade_estado_cep"],
+            "local_cidade": city,
+            "local_estado": state,
+            "local_cep": cep,
+        })
+    return pd.DataFrame(rows)
+
+
+def best_of(repeat, func, *args):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark da normalização por linha x em lote.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Quantidade de anúncios sintéticos.")
+    parser.add_argument("--repeat", type=int, default=3, help="Execuções de cada caminho (vale a melhor).")
+    args = parser.parse_args(argv)
+
+    records = synthetic_records(args.rows)
+    row_seconds, row_frame = best_of(args.repeat, normalize_per_row, records)
+    batch_seconds, batch_frame = best_of(args.repeat, normalize_records, records)
+    row_mb = row_frame.memory_usage(deep=True).sum() / 1024 / 1024
+    batch_mb = batch_frame.memory_usage(deep=True).sum() / 1024 / 1024
+
+    print(f"{args.rows} anúncios, melhor de {args.repeat}:")
+    print(f"  por linha: {row_seconds:8.3f}s  {args.rows / row_seconds:12,.0f} anúncios/s  DataFrame {row_mb:8.1f} MB")
+    print(f"  em lote:   {batch_seconds:8.3f}s  {args.rows / batch_seconds:12,.0f} anúncios/s  DataFrame {batch_mb:8.1f} MB")
+    print(f"  ganho: {row_seconds / batch_seconds:.1f}x no tempo, {row_mb / batch_mb:.1f}x na memória")
+
+    # As duas saídas precisam concordar
+    mismatches = (row_frame["preco"].astype("float32").fillna(-1) != batch_frame["preco"].fillna(-1)).sum()
+    mismatches += (row_frame["área útil"] != batch_frame["área útil"].astype("float64")).sum()
+    mismatches += (row_frame["local_cep"] != batch_frame["local_cep"].astype(object)).sum()
+    print(f"  divergências entre os caminhos: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Microbenchmark da base de consulta (src/query_store.py) x filtrar uma exportação CSV no pandas.
+
+Gera anúncios sintéticos (os mesmos de bench_normalization, com descrição e categoria), grava-os em um CSV e,
+em lotes, na base SQLite, e responde à mesma pergunta pelos dois caminhos:
+"3 quartos até R$ 400.000 em Moema, mencionando 'piscina'".
+  - CSV: pd.read_csv da exportação inteira + filtros e str.contains na descrição;
+  - SQLite: QueryStore.search (índice em bairro/quartos/preço + FTS5).
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_query_store --rows 200000 --repeat 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.bench_normalization import best_of, synthetic_records
+from src.query_store import QueryStore
+
+_AMENITIES = ["piscina", "churrasqueira", "academia", "salão de festas", "portaria 24h", "varanda gourmet", "playground"]
+
+
+def add_descriptions(records, seed=42):
+    rng = random.Random(seed)
+    for record in records:
+        record["descricao"] = f"Imóvel bem localizado, com {', '.join(rng.sample(_AMENITIES, 2))}. Próximo ao metrô e a comércios."
+        record["categoria"] = "Apartamentos"
+    return records
+
+
+def query_csv(csv_filename):
+    frame = pd.read_csv(csv_filename)
+    quartos = frame["quartos"].str.extract(r"(\d+)", expand=False).astype(float)
+    preco = frame["preco_str"].str.replace(r"[^\d]", "", regex=True).replace("", None).astype(float)
+    mask = (
+        (frame["local_bairro"] == "Moema")
+        & (quartos == 3)
+        & (preco <= 400_000)
+        & frame["descricao"].str.contains("piscina", case=False)
+    )
+    return frame[mask]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Microbenchmark da base de consulta SQLite x filtro de CSV no pandas.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Quantidade de anúncios sintéticos.")
+    parser.add_argument("--repeat", type=int, default=5, help="Execuções de cada consulta (vale a melhor).")
+    parser.add_argument("--batch-size", type=int, default=500, help="Anúncios por upsert (como EXPORT_BATCH_SIZE).")
+    args = parser.parse_args(argv)
+
+    records = add_descriptions(synthetic_records(args.rows))
+    with tempfile.TemporaryDirectory() as folder:
+        csv_filename = os.path.join(folder, "anuncios.csv")
+        pd.DataFrame(records).to_csv(csv_filename, index=False)
+
+        with QueryStore(os.path.join(folder, "anuncios.sqlite3")) as store:
+            start = time.perf_counter()
+            for index in range(0, len(records), args.batch_size):
+                store.upsert(records[index:index + args.batch_size])
+            load_seconds = time.perf_counter() - start
+
+            csv_seconds, csv_result = best_of(args.repeat, query_csv, csv_filename)
+            sqlite_seconds, sqlite_result = best_of(
+                args.repeat,
+                lambda: store.search(texto="piscina", bairro="Moema", quartos=3, max_preco=400_000, limit=args.rows),
+            )
+
+    print(f"{args.rows} anúncios ({args.rows / load_seconds:,.0f} anúncios/s na carga da base SQLite), melhor de {args.repeat}:")
+    print(f"  CSV + pandas: {csv_seconds * 1000:10.1f} ms  ({len(csv_result)} anúncios)")
+    print(f"  SQLite:       {sqlite_seconds * 1000:10.1f} ms  ({len(sqlite_result)} anúncios)")
+    print(f"  ganho: {csv_seconds / sqlite_seconds:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark de memória da representação dos anúncios: dicts x AdRecord x ColumnarAccumulator (src/records.py).
+
+Gera anúncios sintéticos com os mesmos campos de extract_ad_details, incluindo as labels da seção de
+detalhes (que, como no extrator, são strings novas a cada anúncio), e mede quanto cada representação
+ocupa mantendo todos eles em memória:
+  - dicts: uma lista de dicts, como o caminho antigo (all_ads_data);
+  - records: uma lista de AdRecord (campos fixos em __slots__, chaves de detalhes internadas);
+  - columnar: um ColumnarAccumulator, uma lista por coluna;
+  - arrow: as colunas do acumulador convertidas em uma tabela Arrow (se o pyarrow estiver instalado),
+    medida pelo tamanho dos buffers da tabela (o pico de RSS incluiria o acumulador usado na conversão).
+As demais são medidas pelo aumento do pico de RSS, cada uma em um processo separado, para que uma não afete a outra.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.bench_records_memory --ads 1000000
+"""
+import argparse
+import multiprocessing
+import time
+
+from benchmarks.run_benchmark import peak_rss_mb
+
+_NEIGHBORHOODS = ["Centro", "Jardim América", "Vila Mariana", "Moema", "Copacabana", "Savassi", "Batel"]
+_DETAIL_LABELS = ["CATEGORIA", "QUARTOS", "BANHEIROS", "VAGAS NA GARAGEM", "ÁREA ÚTIL", "CONDOMÍNIO", "IPTU"]
+
+
+def synthetic_ads(count, description_chars=120):
+    """Gera 'count' dicts no formato de extract_ad_details, com strings novas por anúncio (como no parsing real)."""
+    description = "Apartamento bem localizado, próximo ao metrô e a comércios. " * (description_chars // 60 + 1)
+    for index in range(count):
+        ad = {
+            "url_anuncio": f"https://sp.olx.com.br/sao-paulo-e-regiao/imoveis/apartamento-{index % 5 + 1}-quartos-{1000000000 + index}",
+            "titulo": f"Apartamento com {index % 5 + 1} quartos - {index}",
+            "preco_str": f"R$ {(index % 3000 + 80) * 1000:,}".replace(",", "."),
+            "preco": float((index % 3000 + 80) * 1000),
+            "descricao": f"{description[:description_chars]} #{index}",
+            "local_bairro": _NEIGHBORHOODS[index % len(_NEIGHBORHOODS)] + "",
+            "local_cidade_estado_cep": f"São Paulo, SP, {1000000 + index % 5000:08d}",
+            "data_publicacao": f"2024-05-{index % 28 + 1:02d}T10:{index % 60:02d}:00",
+            "nome_vendedor": f"Vendedor {index % 20000}",
+        }
+        for position, label in enumerate(_DETAIL_LABELS[: 4 + index % 4]):
+            # .lower() cria uma string nova a cada anúncio, como o clean_text(label.lower()) do extrator
+            ad[label.lower()] = (index + position) % 6 if position else "Apartamentos"
+        ad["imagem_principal_url"] = f"https://img.olx.com.br/images/{index % 97:02d}/{1000000000 + index}.jpg"
+        yield ad
+
+
+def _build(representation, count, description_chars):
+    from src.records import AdRecord, ColumnarAccumulator
+
+    ads = synthetic_ads(count, description_chars)
+    if representation == "dicts":
+        return list(ads)
+    if representation == "records":
+        return [AdRecord.from_dict(ad) for ad in ads]
+    accumulator = ColumnarAccumulator()
+    for ad in ads:
+        accumulator.append(AdRecord.from_dict(ad))
+    if representation == "columnar":
+        return accumulator
+    table = accumulator.to_arrow()
+    accumulator.clear()
+    return table
+
+
+def _measure(representation, count, description_chars, results):
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    data = _build(representation, count, description_chars)
+    elapsed = time.perf_counter() - start
+    rss_mb = data.nbytes / 1024 / 1024 if representation == "arrow" else peak_rss_mb() - baseline
+    results[representation] = {"rss_mb": round(rss_mb, 1), "build_s": round(elapsed, 2)}
+    del data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de memória: dicts x AdRecord x armazenamento colunar.")
+    parser.add_argument("--ads", type=int, default=1_000_000, help="Quantidade de anúncios sintéticos.")
+    parser.add_argument("--description-chars", type=int, default=120, help="Tamanho da descrição de cada anúncio.")
+    parser.add_argument("--representations", nargs="+", default=["dicts", "records", "columnar", "arrow"])
+    args = parser.parse_args(argv)
+
+    if peak_rss_mb() is None:
+        parser.error("O módulo 'resource' não está disponível nesta plataforma; não há como medir o RSS.")
+    try:
+        import pyarrow # noqa: F401
+    except ImportError:
+        args.representations = [name for name in args.representations if name != "arrow"]
+
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        results = manager.dict()
+        for representation in args.representations:
+            process = context.Process(target=_measure, args=(representation, args.ads, args.description_chars, results))
+            process.start()
+            process.join()
+        results = dict(results)
+
+    print(f"{args.ads:,} anúncios (descrição de {args.description_chars} caracteres):")
+    reference = results.get("dicts", {}).get("rss_mb")
+    for representation in args.representations:
+        if representation not in results:
+            print(f"  {representation:9s} falhou (veja o erro acima)")
+            continue
+        rss_mb = results[representation]["rss_mb"]
+        per_ad = rss_mb * 1024 * 1024 / args.ads
+        ratio = f"  {reference / rss_mb:4.1f}x menor que dicts" if reference and representation != "dicts" and rss_mb else ""
+        print(f"  {representation:9s} {rss_mb:9.1f} MB  {per_ad:7.0f} bytes/anúncio  construção {results[representation]['build_s']:6.2f}s{ratio}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Benchmark da coleta completa contra o servidor stub local (benchmarks/stub_server.py).
+
+Roda o run_scraper de verdade (pipeline, rate limiter, checkpoint, extração e exportação),
+apontado para localhost, e mede o tempo de cada etapa: fetch, parse, extract_ad_details
+(e o caminho do JSON embutido) e export. Ao final mostra páginas/s, os percentis p50/p90/p99
+de cada etapa e o pico de memória (RSS), e grava tudo em benchmarks/results/<data>_<commit>.json.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.run_benchmark --listing-pages 10 --latency-ms 30 --error-rate 0.02
+    python -m benchmarks.run_benchmark --compare benchmarks/results/<arquivo_anterior>.json
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+try: # Indisponível no Windows; nesse caso o pico de RSS não é medido
+    import resource
+except ImportError:
+    resource = None
+
+from src.config import USE_EMBEDDED_JSON
+from benchmarks.stub_server import start_stub_server, add_server_arguments, server_options
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+STAGES = ("fetch", "parse", "extract_ad_details", "extract_embedded_json", "export")
+
+
+class StageTimer:
+    """Acumula as durações (em segundos) de cada etapa, de forma thread-safe."""
+
+    def __init__(self):
+        self.durations = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.durations.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed
+
+
+def percentile(sorted_values, fraction):
+    """Percentil por interpolação linear de uma lista já ordenada."""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(durations):
+    values = sorted(durations)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "total_s": round(sum(values), 4),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(values, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def configure_scraper(base_url, args, work_folder, timer):
+    """
+    Aponta o scraper para o servidor stub e instrumenta as etapas.
+    As funções são substituídas nos módulos que as chamam, pois cada um guarda sua própria referência.
+    """
+    from src import scraper, extraction, embedded_json, data_exporter
+
+    start_url = f"{base_url}/brasil?q=imoveis"
+    scraper.BASE_URL_OLX = start_url
+    extraction.BASE_URL_OLX = start_url
+    if scraper.PARSER_BACKEND == "lxml":
+        scraper.lxml_extractor.BASE_URL_OLX = start_url
+    scraper.MAX_PAGES_TO_SCRAPE = args.listing_pages + 1 # +1: a página vazia que encerra a paginação
+    scraper.PARSE_WORKERS = args.parse_workers
+    scraper.CRAWL_STATE_DB_PATH = os.path.join(work_folder, "crawl_state.sqlite3")
+    scraper.http_cache = None # O cache falsearia os tempos de fetch
+    scraper.SESSION_STATE_PATH = None # Nem lê nem grava as sessões da coleta real
+    scraper.configure_limits(args.requests_per_second, args.burst, args.concurrency)
+    data_exporter.DATA_FOLDER = os.path.join(work_folder, "data")
+
+    scraper.fetch_page_bytes = timer.wrap("fetch", scraper.fetch_page_bytes)
+    timed_parse = timer.wrap("parse", extraction.parse_page)
+    scraper.parse_page = timed_parse
+    extraction.parse_page = timed_parse
+    extraction.extract_ad_details = timer.wrap("extract_ad_details", extraction.extract_ad_details)
+    embedded_json.extract_ad_details = timer.wrap("extract_embedded_json", embedded_json.extract_ad_details)
+    return scraper, data_exporter
+
+
+def run(args):
+    timer = StageTimer()
+    server = start_stub_server(**server_options(args))
+
+    with tempfile.TemporaryDirectory(prefix="olx_bench_") as work_folder:
+        scraper, data_exporter = configure_scraper(server.base_url, args, work_folder, timer)
+        # Depois da importação do scraper, que configura o logging: os logs INFO por página dominariam o tempo medido
+        logging.getLogger().setLevel(logging.WARNING)
+        if args.parse_workers:
+            logging.warning("Com --parse-workers, parse/extract rodam em outros processos e não entram nos tempos por etapa.")
+
+        ads_count = 0
+        start = time.perf_counter()
+        try:
+            exporter = data_exporter.StreamingExporter(formats=args.formats, base_filename="benchmark")
+            exporter_write = timer.wrap("export", exporter.write)
+            for ad_data in scraper.run_scraper():
+                exporter_write(ad_data)
+                ads_count += 1
+            export_start = time.perf_counter()
+            exporter.close()
+            export_close_seconds = time.perf_counter() - export_start
+        finally:
+            server.shutdown()
+            server.server_close()
+        elapsed = time.perf_counter() - start
+
+    pages_fetched = len(timer.durations["fetch"])
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parser_backend": scraper.PARSER_BACKEND,
+        "use_embedded_json": USE_EMBEDDED_JSON,
+        "options": vars(args) | {"formats": list(args.formats), "compare": None},
+        "elapsed_s": round(elapsed, 3),
+        "pages_fetched": pages_fetched,
+        "ads_exported": ads_count,
+        "pages_per_second": round(pages_fetched / elapsed, 2) if elapsed else None,
+        "ads_per_second": round(ads_count / elapsed, 2) if elapsed else None,
+        "export_close_s": round(export_close_seconds, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "server_responses": dict(server.response_counts),
+        "stages": {stage: summarize(durations) for stage, durations in timer.durations.items()},
+    }
+
+
+def save_results(results):
+    os.makedirs(RESULTS_FOLDER, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = os.path.join(RESULTS_FOLDER, f"{timestamp}_{results['git_revision']}.json")
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    return filename
+
+
+def _change(current, previous):
+    if current is None or not previous:
+        return ""
+    return f" ({(current - previous) / previous:+.1%} vs. anterior)"
+
+
+def print_report(results, previous=None):
+    previous = previous or {}
+    previous_stages = previous.get("stages", {})
+    print(f"\nRevisão {results['git_revision']} | backend {results['parser_backend']} | {results['elapsed_s']} s")
+    print(f"Páginas buscadas: {results['pages_fetched']} | anúncios exportados: {results['ads_exported']}")
+    print(f"Páginas/s: {results['pages_per_second']}{_change(results['pages_per_second'], previous.get('pages_per_second'))}")
+    print(f"Pico de RSS: {results['peak_rss_mb']} MB{_change(results['peak_rss_mb'], previous.get('peak_rss_mb'))}")
+    print(f"Respostas do servidor: {results['server_responses']}")
+    print(f"\n{'etapa':<24}{'n':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for stage, summary in results["stages"].items():
+        if not summary["count"]:
+            continue
+        print(f"{stage:<24}{summary['count']:>7}{summary['p50_ms']:>10.3f}{summary['p90_ms']:>10.3f}{summary['p99_ms']:>10.3f}"
+              f"{_change(summary['p50_ms'], previous_stages.get(stage, {}).get('p50_ms'))}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline da coleta contra o servidor stub local.")
+    add_server_arguments(parser)
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers de download (MAX_CONCURRENT_REQUESTS).")
+    parser.add_argument("--parse-workers", type=int, default=0, help="Processos de parsing (PARSE_WORKERS).")
+    parser.add_argument("--requests-per-second", type=float, default=1000.0, help="Limite do rate limiter por host.")
+    parser.add_argument("--burst", type=int, default=50, help="Rajada do rate limiter.")
+    parser.add_argument("--formats", nargs="+", default=["csv"], help="Formatos de exportação medidos.")
+    parser.add_argument("--compare", help="JSON de uma execução anterior, para mostrar a variação.")
+    parser.add_argument("--no-save", action="store_true", help="Não grava o resultado em benchmarks/results.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+    print_report(results, previous)
+    if not args.no_save:
+        print(f"\nResultado gravado em {save_results(results)}")
+
+
+if __name__ == "__main__":
+    main()
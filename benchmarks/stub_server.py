@@ -0,0 +1,191 @@
+"""
+Servidor HTTP local que imita a OLX a partir das páginas gravadas em benchmarks/fixtures,
+para que a coleta completa (run_scraper) rode contra localhost de forma repetível.
+
+- /<qualquer caminho>?...&o=N  -> página de listagem N (sem 'o' = página 1), com 50 cards de IDs únicos
+- /imoveis/...-<id>           -> página de anúncio; uma fração delas traz o JSON embutido (__NEXT_DATA__)
+
+Latência, taxa de erros 5xx, de respostas 429 e de páginas de desafio do Cloudflare são configuráveis.
+O desafio é servido como o bloqueio que o cloudscraper não resolve (status 200 com
+"Attention Required! | Cloudflare"), sem o cabeçalho 'Server: cloudflare' que dispararia o solver.
+
+Uso isolado:
+    python -m benchmarks.stub_server --port 8765 --latency-ms 50 --error-rate 0.01
+"""
+import argparse
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ADS_PER_LISTING_PAGE = 50
+
+_AD_PATH = re.compile(r"-(\d+)/?$")
+
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES_FOLDER, name), "rb") as f:
+        return f.read()
+
+
+class StubOlxServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer com as fixtures carregadas em memória e os parâmetros de falha.
+    'response_counts' conta as respostas enviadas por tipo (listing, ad, 429, 5xx, challenge).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, listing_pages=5, latency_ms=0.0, latency_jitter_ms=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, challenge_rate=0.0, embedded_json_ratio=0.5, seed=0):
+        super().__init__(address, _StubOlxHandler)
+        self.listing_pages = listing_pages
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.challenge_rate = challenge_rate
+        self.embedded_json_ratio = embedded_json_ratio
+        self.response_counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.listing_template = _load_fixture("listing_page.html")
+        self.ad_template = _load_fixture("ad_page.html")
+        self.ad_next_data_template = _load_fixture("ad_page_next_data.html")
+        self.challenge_page = _load_fixture("cloudflare_challenge.html")
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw(self):
+        """Número aleatório em [0, 1) do gerador com semente, compartilhado pelas threads do servidor."""
+        with self._lock:
+            return self._random.random()
+
+    def latency(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.latency_jitter_ms, self.latency_jitter_ms) if self.latency_jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def count(self, kind):
+        with self._lock:
+            self.response_counts[kind] += 1
+
+    def listing_page(self, page):
+        if page > self.listing_pages:
+            body = re.sub(rb'<li class="AdListing_adListContainer__item">.*?</li>', b"", self.listing_template, flags=re.S)
+        else:
+            body = self.listing_template
+            for index in range(ADS_PER_LISTING_PAGE):
+                body = body.replace(b"{{AD_ID}}", str(page * 1000 + index).encode(), 2) # 2 links por card
+        return body.replace(b"{{NEXT_PAGE}}", str(page + 1).encode())
+
+    def ad_page(self, ad_id):
+        # A escolha do layout depende só do ID, para que a mesma página seja igual em todas as execuções
+        use_next_data = (int(ad_id) * 2654435761 % 1000) / 1000 < self.embedded_json_ratio
+        template = self.ad_next_data_template if use_next_data else self.ad_template
+        return template.replace(b"{{AD_ID}}", ad_id.encode())
+
+
+class _StubOlxHandler(BaseHTTPRequestHandler):
+    server_version = "StubOlx/1.0"
+
+    def log_message(self, format, *args):
+        pass # Sem uma linha no stderr por requisição
+
+    def _send(self, status, body, kind, headers=None):
+        self.server.count(kind)
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        latency = server.latency()
+        if latency:
+            time.sleep(latency)
+
+        draw = server.draw()
+        if draw < server.rate_limit_rate:
+            return self._send(429, b"Too Many Requests", "429", {"Retry-After": "1"})
+        draw -= server.rate_limit_rate
+        if draw < server.error_rate:
+            return self._send(503, b"Service Unavailable", "5xx")
+        draw -= server.error_rate
+        if draw < server.challenge_rate:
+            return self._send(200, server.challenge_page, "challenge")
+
+        parsed = urlparse(self.path)
+        ad_match = _AD_PATH.search(parsed.path)
+        if ad_match:
+            return self._send(200, server.ad_page(ad_match.group(1)), "ad")
+
+        page_param = parse_qs(parsed.query).get("o", ["1"])[0]
+        page = int(page_param) if page_param.isdigit() else 1
+        return self._send(200, server.listing_page(page), "listing")
+
+
+def start_stub_server(host="127.0.0.1", port=0, **options):
+    """Sobe o servidor em uma thread daemon e o retorna (use server.base_url e, ao final, server.shutdown())."""
+    server = StubOlxServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, name="stub-olx-server", daemon=True)
+    thread.start()
+    return server
+
+
+def add_server_arguments(parser):
+    """Opções do servidor, compartilhadas com benchmarks/run_benchmark.py."""
+    parser.add_argument("--listing-pages", type=int, default=5, help="Páginas de listagem com anúncios (as seguintes vêm vazias).")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Latência média de cada resposta, em ms.")
+    parser.add_argument("--latency-jitter-ms", type=float, default=10.0, help="Variação (+/-) da latência, em ms.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração das respostas com erro 503.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fração das respostas 429 (com Retry-After).")
+    parser.add_argument("--challenge-rate", type=float, default=0.0, help="Fração das respostas com a página de desafio do Cloudflare.")
+    parser.add_argument("--embedded-json-ratio", type=float, default=0.5, help="Fração dos anúncios com __NEXT_DATA__ no HTML.")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do sorteio de falhas e latências.")
+
+
+def server_options(args):
+    return {
+        "listing_pages": args.listing_pages,
+        "latency_ms": args.latency_ms,
+        "latency_jitter_ms": args.latency_jitter_ms,
+        "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate,
+        "challenge_rate": args.challenge_rate,
+        "embedded_json_ratio": args.embedded_json_ratio,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a OLX com páginas gravadas.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubOlxServer((args.host, args.port), **server_options(args))
+    print(f"Servidor stub da OLX em {server.base_url}/brasil?q=imoveis (Ctrl+C para encerrar)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
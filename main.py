@@ -1,39 +1,276 @@
+import argparse
+import json
 import logging
-from src.scraper import run_scraper
-from src.data_exporter import save_data
-from src.config import BASE_URL_OLX
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("scraper.log", mode='a'),
-        logging.StreamHandler()
-    ]
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from src import metrics
+from src.log_setup import setup_logging, flush_sampled_warnings
+from src.config import (
+    BASE_URL_OLX, METRICS_PORT, JOB_QUEUE, JOB_SEARCH_URLS, JOB_PAGES_PER_SHARD, JOB_MAX_PAGES_PER_QUERY,
+    OUTPUT_FILENAME_PREFIX, CHECKPOINT_BATCH_SIZE, CHANGE_TRACKING_ENABLED, CHANGE_TRACKER_DB_PATH,
+    EXPORT_ONLY_CHANGES, CHANGE_TRACKING_REMOVED_AFTER_MISSED_RUNS, DAEMON_INTERVAL_SECONDS, HTTP_HEADERS,
+    IMAGES_ENABLED, IMAGES_FOLDER, IMAGE_DOWNLOAD_WORKERS, IMAGE_REQUESTS_PER_SECOND_PER_HOST, IMAGE_RATE_LIMIT_BURST,
+    IMAGE_MAX_BYTES, IMAGE_MAX_PER_AD, IMAGE_MAX_PENDING_ADS, QUERY_STORE_PATH,
 )
 
-def main():
-    logging.info("--- INICIANDO PROCESSO DE WEB SCRAPING DA OLX ---")
-    logging.info(f"URL Base configurada: {BASE_URL_OLX}")
-    logging.info("Certifique-se de que os seletores em 'src/config.py' estão ATUALIZADOS para a sua região e para o layout atual da OLX.")
+# Os módulos da coleta (scraper/cloudscraper, exportação/pandas, jobs) são importados só pelos comandos que os usam,
+# para que 'status', 'dry-run' e 'query' respondam sem pagar esse tempo de inicialização.
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Web scraper de anúncios de imóveis da OLX.",
+        epilog="Sem comando, executa uma coleta ('crawl').",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continua a coleta interrompida salva em CRAWL_STATE_DB_PATH, sem buscar de novo os anúncios já concluídos.",
+    )
+
+    job_group = parser.add_argument_group("modo job", "Várias buscas divididas em shards, processados por workers em uma ou mais máquinas.")
+    job_group.add_argument("--job-create", action="store_true", help="Cadastra na fila os shards das buscas de --job-urls (ou JOB_SEARCH_URLS).")
+    job_group.add_argument("--job-work", action="store_true", help="Processa shards da fila até ela esvaziar.")
+    job_group.add_argument("--job-export", action="store_true", help="Exporta os anúncios de todos os shards concluídos em um único arquivo.")
+    job_group.add_argument("--job-queue", default=JOB_QUEUE, help=f"Arquivo SQLite ou URL redis:// da fila compartilhada (padrão: {JOB_QUEUE}).")
+    job_group.add_argument("--job-urls", nargs="+", metavar="URL", help="URLs de busca da OLX (padrão: JOB_SEARCH_URLS de config.py).")
+    job_group.add_argument("--job-urls-file", help="Arquivo com uma URL de busca por linha.")
+    job_group.add_argument("--pages-per-shard", type=int, default=JOB_PAGES_PER_SHARD, help="Páginas de listagem por shard.")
+    job_group.add_argument("--max-pages", type=int, default=JOB_MAX_PAGES_PER_QUERY, help="Máximo de páginas de listagem por busca.")
+    job_group.add_argument("--job-processes", type=int, default=1, help="Processos de worker nesta máquina (com --job-work).")
+
+    commands = parser.add_subparsers(dest="command", metavar="comando")
+    crawl_parser = commands.add_parser("crawl", help="Executa uma coleta e exporta os anúncios (padrão).")
+    crawl_parser.add_argument("--resume", action="store_true", default=argparse.SUPPRESS, help="Igual ao --resume geral.")
+    status_parser = commands.add_parser("status", help="Mostra o progresso da última coleta, o histórico, a fila de jobs e as sessões, sem acessar a rede.")
+    status_parser.add_argument("--json", action="store_true", help="Saída em JSON.")
+    dry_run_parser = commands.add_parser("dry-run", help="Mostra o que seria coletado com a configuração atual, sem acessar a rede.")
+    dry_run_parser.add_argument("--page", metavar="ARQUIVO", help="Página de listagem salva em disco para testar os seletores.")
+    daemon_parser = commands.add_parser("daemon", help="Fica residente e executa uma coleta a cada intervalo.")
+    daemon_parser.add_argument("--interval", type=float, default=DAEMON_INTERVAL_SECONDS, help=f"Segundos entre o início de duas coletas (padrão: {DAEMON_INTERVAL_SECONDS}).")
+    daemon_parser.add_argument("--runs", type=int, default=None, help="Encerra após este número de coletas (padrão: sem limite).")
+    daemon_parser.add_argument("--resume", action="store_true", default=argparse.SUPPRESS, help="Retoma a coleta interrompida na primeira execução.")
+    query_parser = commands.add_parser("query", help=f"Consulta a base local de anúncios ({QUERY_STORE_PATH}, formato de exportação 'sqlite').")
+    query_parser.add_argument("--texto", help="Busca no título e na descrição (sintaxe FTS5: 'piscina', 'piscina AND churrasqueira', 'academ*').")
+    query_parser.add_argument("--bairro")
+    query_parser.add_argument("--cidade")
+    query_parser.add_argument("--estado", help="UF (ex: SP).")
+    query_parser.add_argument("--categoria", help="Início da categoria (ex: Apartamento).")
+    query_parser.add_argument("--quartos", type=int, help="Número exato de quartos.")
+    query_parser.add_argument("--min-quartos", type=int)
+    query_parser.add_argument("--min-preco", type=float)
+    query_parser.add_argument("--max-preco", type=float)
+    query_parser.add_argument("--desde", metavar="DATA", help="Publicados a partir desta data (AAAA-MM-DD ou DD/MM/AAAA).")
+    query_parser.add_argument("--incluir-removidos", action="store_true", help="Inclui os anúncios marcados como removidos.")
+    query_parser.add_argument("--limit", type=int, default=20, help="Máximo de anúncios (padrão: 20).")
+    query_parser.add_argument("--json", action="store_true", help="Saída em JSON.")
+    query_parser.add_argument("--importar", nargs="+", metavar="CSV", help="Carrega exportações CSV antigas na base antes da consulta.")
+    return parser.parse_args(argv)
+
+def open_change_tracker():
+    """Histórico de anúncios das coletas anteriores (None se CHANGE_TRACKING_ENABLED estiver desligado)."""
+    if not CHANGE_TRACKING_ENABLED:
+        return None
+    from src.change_tracker import ChangeTracker
+    return ChangeTracker(CHANGE_TRACKER_DB_PATH, CHANGE_TRACKING_REMOVED_AFTER_MISSED_RUNS, CHECKPOINT_BATCH_SIZE)
+
+def open_image_downloader():
+    """Etapa de download das imagens (None se IMAGES_ENABLED estiver desligado)."""
+    if not IMAGES_ENABLED:
+        return None
+    from src.images import ImageDownloader
+    return ImageDownloader(
+        IMAGES_FOLDER,
+        workers=IMAGE_DOWNLOAD_WORKERS,
+        rate=IMAGE_REQUESTS_PER_SECOND_PER_HOST,
+        burst=IMAGE_RATE_LIMIT_BURST,
+        max_bytes=IMAGE_MAX_BYTES,
+        max_per_ad=IMAGE_MAX_PER_AD,
+        max_pending_ads=IMAGE_MAX_PENDING_ADS,
+        headers=HTTP_HEADERS,
+    )
 
+def export_base_filename(change_tracker):
+    """Nome base dos arquivos exportados; exportações só com as mudanças levam '_delta' no nome."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if change_tracker is not None and EXPORT_ONLY_CHANGES:
+        return f"{OUTPUT_FILENAME_PREFIX}_delta_{timestamp}"
+    return f"{OUTPUT_FILENAME_PREFIX}_{timestamp}"
+
+def job_search_urls(args):
+    if args.job_urls_file:
+        with open(args.job_urls_file, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return args.job_urls or JOB_SEARCH_URLS
+
+def run_job(args):
+    """Executa as etapas do modo job pedidas na linha de comando, na ordem: criar, processar e exportar."""
+    from src import jobs
+
+    if args.job_create:
+        jobs.create_job(args.job_queue, job_search_urls(args), args.pages_per_shard, args.max_pages)
+    if args.job_work:
+        jobs.run_job_workers(args.job_queue, args.job_processes)
+    if args.job_export:
+        from src.data_exporter import StreamingExporter
+
+        change_tracker = open_change_tracker()
+        image_downloader = open_image_downloader()
+        try:
+            with StreamingExporter(base_filename=export_base_filename(change_tracker)) as exporter:
+                progress = jobs.export_job_results(args.job_queue, exporter, change_tracker, EXPORT_ONLY_CHANGES, image_downloader)
+        finally:
+            if change_tracker:
+                change_tracker.close()
+            if image_downloader:
+                image_downloader.close()
+        csv_file, xlsx_file = exporter.close()
+        metrics.registry.write_summary(exporter.metrics_filename)
+        logging.info(f"Job: {exporter.rows_written} anúncios exportados para '{csv_file}' e '{xlsx_file}'. Shards: {progress}")
+
+def crawl(resume=False):
+    """Uma coleta completa: run_scraper, histórico de mudanças e exportação incremental. Erros são registrados no log."""
+    from src.scraper import run_scraper
+    from src.data_exporter import StreamingExporter
+
+    exporter = None
+    change_tracker = None
+    image_downloader = None
+    metrics.registry.start_run() # No daemon, o resumo e ads_per_second de cada coleta não somam as anteriores
     try:
-        collected_ads = run_scraper()
-
-        if collected_ads:
-            logging.info(f"Total de {len(collected_ads)} anúncios coletados.")
-            csv_file, xlsx_file = save_data(collected_ads)
-            if csv_file and xlsx_file:
-                logging.info(f"Dados exportados com sucesso para '{csv_file}' e '{xlsx_file}'.")
-            else:
-                logging.error("Falha ao exportar os dados.")
+        change_tracker = open_change_tracker()
+        ads = run_scraper(resume=resume, change_tracker=change_tracker)
+        if change_tracker:
+            # Compara com as coletas anteriores; com EXPORT_ONLY_CHANGES, só novos, alterados e removidos seguem para a exportação
+            ads = change_tracker.track(ads, only_changes=EXPORT_ONLY_CHANGES)
+        image_downloader = open_image_downloader()
+        if image_downloader:
+            # Só os anúncios que vão para a exportação têm as imagens baixadas
+            ads = image_downloader.process(ads)
+
+        # Os anúncios são gravados em disco à medida que são coletados
+        with StreamingExporter(base_filename=export_base_filename(change_tracker)) as exporter:
+            for ad_data in ads:
+                exporter.write(ad_data)
+        csv_file, xlsx_file = exporter.close()
+
+        if exporter.rows_written:
+            logging.info(f"Total de {exporter.rows_written} anúncios exportados.")
+            logging.info(f"Dados exportados com sucesso para '{csv_file}' e '{xlsx_file}'.")
+        elif change_tracker and EXPORT_ONLY_CHANGES and sum(change_tracker.counts.values()):
+            logging.info("Nenhuma mudança desde a última coleta; nada a exportar.")
         else:
             logging.warning("Nenhum anúncio foi coletado. Verifique os logs e as configurações.")
 
     except Exception as e:
         logging.critical(f"Ocorreu um erro crítico no processo principal: {e}", exc_info=True)
+    finally:
+        if change_tracker:
+            change_tracker.close()
+        if image_downloader:
+            image_downloader.close()
+        if exporter:
+            metrics.registry.write_summary(exporter.metrics_filename)
+        flush_sampled_warnings() # Resumo dos avisos repetidos desta coleta
+
+def run_query(args):
+    """Comando 'query': filtra a base local de consulta e mostra os anúncios e o tempo da consulta."""
+    from src.query_store import QueryStore
+
+    if not args.importar and not os.path.exists(QUERY_STORE_PATH):
+        print(f"Base de consulta '{QUERY_STORE_PATH}' não encontrada. Inclua 'sqlite' em EXPORT_FORMATS ou use --importar.")
+        return
+    with QueryStore(QUERY_STORE_PATH) as store:
+        for csv_filename in args.importar or []:
+            print(f"{store.import_csv(csv_filename)} anúncios importados de '{csv_filename}'.")
+        started = time.perf_counter()
+        try:
+            ads = store.search(
+                texto=args.texto, bairro=args.bairro, cidade=args.cidade, estado=args.estado, categoria=args.categoria,
+                quartos=args.quartos, min_quartos=args.min_quartos, min_preco=args.min_preco, max_preco=args.max_preco,
+                publicado_desde=args.desde, incluir_removidos=args.incluir_removidos, limit=args.limit,
+            )
+        except ValueError as e:
+            print(e)
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    if args.json:
+        print(json.dumps(ads, ensure_ascii=False, indent=2))
+        return
+    for ad in ads:
+        preco = f"R$ {ad['preco']:,.0f}".replace(",", ".") if ad["preco"] is not None else "sem preço"
+        local = ", ".join(part for part in (ad["bairro"], ad["cidade"], ad["estado"]) if part)
+        print(f"{preco} | {ad['quartos'] or '-'} quartos | {local} | {ad['titulo']}\n  {ad['url']}")
+    print(f"{len(ads)} anúncio(s) em {elapsed_ms:.1f} ms.")
+
+def run_daemon(interval_seconds, max_runs=None, resume=False):
+    """
+    Executa uma coleta a cada 'interval_seconds' (contados do início de uma ao início da próxima) no mesmo processo,
+    reaproveitando as sessões já liberadas pelo Cloudflare, os seletores compilados e o cache HTTP.
+    SIGTERM encerra o daemon depois da coleta em andamento; Ctrl+C interrompe na hora.
+    """
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        logging.info("Daemon: sinal de parada recebido; encerrando após a coleta em andamento.")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    runs = 0
+    try:
+        while not stop_event.is_set():
+            started = time.monotonic()
+            runs += 1
+            logging.info(f"Daemon: iniciando a coleta #{runs}.")
+            crawl(resume=resume and runs == 1)
+            if max_runs and runs >= max_runs:
+                break
+            wait_seconds = max(0.0, interval_seconds - (time.monotonic() - started))
+            logging.info(f"Daemon: coleta #{runs} finalizada; a próxima começa em {wait_seconds / 60:.1f} min.")
+            stop_event.wait(wait_seconds)
+    except KeyboardInterrupt:
+        logging.info("Daemon interrompido.")
+    logging.info(f"Daemon encerrado após {runs} coleta(s).")
+
+def main(argv=None):
+    args = parse_args(argv)
+    command = args.command or "crawl"
+
+    if command == "status":
+        from src.status import collect_status, format_status
+        status = collect_status(args.job_queue)
+        print(json.dumps(status, ensure_ascii=False, indent=2) if args.json else format_status(status))
+        return
+    if command == "query":
+        run_query(args)
+        return
+    if command == "dry-run":
+        from src.status import dry_run_plan
+        for name, value in dry_run_plan(args.page).items():
+            print(f"{name}: {value}")
+        return
+
+    setup_logging()
+    logging.info("--- INICIANDO PROCESSO DE WEB SCRAPING DA OLX ---")
+    logging.info(f"URL Base configurada: {BASE_URL_OLX}")
+    logging.info("Certifique-se de que os seletores em 'src/config.py' estão ATUALIZADOS para a sua região e para o layout atual da OLX.")
+    if METRICS_PORT:
+        metrics.start_metrics_server(METRICS_PORT)
+
+    try:
+        if args.job_create or args.job_work or args.job_export:
+            try:
+                run_job(args)
+            except Exception as e:
+                logging.critical(f"Ocorreu um erro crítico no modo job: {e}", exc_info=True)
+        elif command == "daemon":
+            run_daemon(args.interval, args.runs, args.resume)
+        else:
+            crawl(resume=args.resume)
     finally:
         logging.info("--- PROCESSO DE WEB SCRAPING FINALIZADO ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,221 @@
+"""
+Controle adaptativo da coleta: ajusta a taxa de requisições por host e o número de requisições
+simultâneas conforme as respostas (AIMD: aumento aditivo enquanto as respostas vêm limpas,
+corte multiplicativo ao receber 429, 5xx ou páginas de desafio do Cloudflare), e reagenda
+as URLs que falharam de forma temporária com backoff exponencial e jitter.
+"""
+import heapq
+import logging
+import queue
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from . import metrics
+
+
+class RetryableFetchError(Exception):
+    """Falha temporária ao buscar uma URL (429, 5xx, desafio do Cloudflare, timeout); vale tentar de novo mais tarde."""
+
+    def __init__(self, url, reason, retry_after=None):
+        super().__init__(f"{reason} em {url}")
+        self.url = url
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos de espera, ou None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def backoff_delay(attempt, base_delay, max_delay, retry_after=None):
+    """
+    Espera antes da tentativa seguinte à 'attempt' (1 = primeira falha): exponencial, limitada a 'max_delay',
+    com metade do valor sorteada (jitter) para que URLs que falharam juntas não voltem todas ao mesmo tempo.
+    Nunca é menor que o Retry-After informado pelo servidor.
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempt - 1))
+    delay = delay / 2 + random.uniform(0, delay / 2)
+    return max(delay, retry_after or 0.0)
+
+
+class ConcurrencyLimiter:
+    """Semáforo com limite ajustável em tempo de execução, usado em volta de cada requisição HTTP."""
+
+    def __init__(self, limit):
+        self.limit = max(1, int(limit))
+        self._active = 0
+        self._condition = threading.Condition()
+
+    def set_limit(self, limit):
+        with self._condition:
+            self.limit = max(1, int(limit))
+            self._condition.notify_all()
+
+    def __enter__(self):
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+        return False
+
+
+class AdaptiveController:
+    """
+    Controlador AIMD da taxa de requisições (por host, nos TokenBuckets do HostRateLimiter)
+    e da concorrência (global, no ConcurrencyLimiter).
+
+    - A cada 'success_window' respostas limpas, a taxa do host sobe 'rate_increase' req/s e a concorrência, 1.
+    - Um sinal de sobrecarga multiplica ambas por 'decrease_factor'. Sinais que chegam juntos (as requisições
+      que já estavam em andamento) contam uma vez só: há um intervalo de 'cooldown_seconds' entre cortes.
+    - Um Retry-After pausa o host pelo tempo pedido, além do corte.
+    """
+
+    def __init__(self, rate_limiter, concurrency_limiter, min_rate, max_rate, min_concurrency, max_concurrency,
+                 rate_increase, decrease_factor=0.5, success_window=10, cooldown_seconds=2.0):
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.rate_increase = rate_increase
+        self.decrease_factor = decrease_factor
+        self.success_window = max(1, success_window)
+        self.cooldown_seconds = cooldown_seconds
+        self._successes = {} # host -> respostas limpas desde o último ajuste
+        self._last_decrease = {} # host -> instante (monotonic) do último corte
+        self._lock = threading.Lock()
+
+    def on_success(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            successes = self._successes.get(host, 0) + 1
+            if successes < self.success_window:
+                self._successes[host] = successes
+                return
+            self._successes[host] = 0
+            bucket = self.rate_limiter.bucket_for(url)
+            new_rate = min(self.max_rate, bucket.rate + self.rate_increase)
+            new_concurrency = min(self.max_concurrency, self.concurrency_limiter.limit + 1)
+        self._apply(host, bucket, new_rate, new_concurrency)
+
+    def on_throttle(self, url, reason, retry_after=None):
+        """Sinal de sobrecarga (429, 5xx, desafio, timeout): reduz taxa e concorrência e honra o Retry-After."""
+        host = urlparse(url).netloc.lower()
+        bucket = self.rate_limiter.bucket_for(url)
+        if retry_after:
+            bucket.pause(retry_after)
+        now = time.monotonic()
+        with self._lock:
+            self._successes[host] = 0
+            if now - self._last_decrease.get(host, float("-inf")) < self.cooldown_seconds:
+                return
+            self._last_decrease[host] = now
+            new_rate = max(self.min_rate, bucket.rate * self.decrease_factor)
+            new_concurrency = max(self.min_concurrency, int(self.concurrency_limiter.limit * self.decrease_factor))
+        logging.warning(
+            f"Controle adaptativo: '{reason}' em {host}. Taxa reduzida para {new_rate:.2f} req/s e concorrência para {new_concurrency}"
+            + (f"; host pausado por {retry_after:.0f}s (Retry-After)." if retry_after else ".")
+        )
+        self._apply(host, bucket, new_rate, new_concurrency)
+
+    def _apply(self, host, bucket, rate, concurrency):
+        bucket.set_rate(rate)
+        self.concurrency_limiter.set_limit(concurrency)
+        metrics.set_gauge("olx_adaptive_rate", round(rate, 4), host=host)
+        metrics.set_gauge("olx_adaptive_concurrency", concurrency)
+
+
+class RetryScheduler:
+    """
+    Devolve à fila de anúncios, após o backoff, as URLs que falharam de forma temporária.
+
+    Uma URL reagendada continua contando como tarefa pendente da fila (o worker não chama task_done);
+    o agendador primeiro a recoloca na fila e só então marca a tarefa original como concluída.
+    Assim, 'fila vazia e sem tarefas pendentes' significa que não há mais nenhuma nova tentativa por vir.
+    """
+
+    def __init__(self, target_queue, stop_event, max_attempts, base_delay, max_delay):
+        self.target_queue = target_queue
+        self.stop_event = stop_event
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._attempts = {}
+        self._heap = [] # (instante da nova tentativa, sequência, url)
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="retry-scheduler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def schedule(self, url, reason, retry_after=None):
+        """
+        Agenda uma nova tentativa de 'url'. Retorna False (sem agendar) se as tentativas se esgotaram;
+        nesse caso o chamador continua responsável pelo task_done da fila.
+        """
+        attempt = self._attempts.get(url, 0) + 1
+        if attempt >= self.max_attempts:
+            self._attempts.pop(url, None)
+            logging.error(f"Desistindo de {url} após {attempt} tentativas (último erro: {reason}).")
+            return False
+        self._attempts[url] = attempt
+        delay = backoff_delay(attempt, self.base_delay, self.max_delay, retry_after)
+        metrics.inc("olx_retries_total", reason=reason)
+        logging.info(f"Nova tentativa de {url} em {delay:.1f}s (tentativa {attempt + 1}/{self.max_attempts}, motivo: {reason}).")
+        with self._condition:
+            self._sequence += 1
+            heapq.heappush(self._heap, (time.monotonic() + delay, self._sequence, url))
+            self._condition.notify()
+        return True
+
+    def forget(self, url):
+        """Descarta a contagem de tentativas de uma URL concluída."""
+        self._attempts.pop(url, None)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self.stop_event.is_set():
+                    if self._heap and self._heap[0][0] <= time.monotonic():
+                        break
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._condition.wait(min(timeout, 0.5) if timeout is not None else 0.5)
+                if self.stop_event.is_set():
+                    self._discard_pending_locked()
+                    return
+                _, _, url = heapq.heappop(self._heap)
+            requeued = False
+            while not self.stop_event.is_set() and not requeued:
+                try:
+                    self.target_queue.put(url, timeout=0.5)
+                    requeued = True
+                except queue.Full:
+                    continue
+            self.target_queue.task_done() # A tarefa original (que falhou) termina aqui
+
+    def _discard_pending_locked(self):
+        # Coleta interrompida: as URLs agendadas continuam pendentes no state_store (para o --resume)
+        for _ in self._heap:
+            self.target_queue.task_done()
+        self._heap.clear()
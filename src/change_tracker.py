@@ -0,0 +1,256 @@
+"""
+Detecção incremental de mudanças entre coletas: cada anúncio é identificado pelo ID da OLX
+(extract_ad_id) e comparado, pelo hash do conteúdo, com o histórico local das execuções anteriores.
+A exportação passa a conter só os anúncios novos, alterados e removidos, e cada mudança de preço
+fica registrada na tabela price_history.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .records import as_record
+from .utils import extract_ad_id
+
+# Campos que não descrevem o anúncio em si e não devem mudar o hash do conteúdo
+_VOLATILE_KEYS = {"url_anuncio", "status_alteracao"}
+
+STATUS_NEW = "novo"
+STATUS_CHANGED = "alterado"
+STATUS_UNCHANGED = "inalterado"
+STATUS_REMOVED = "removido"
+
+
+def content_hash(details):
+    """
+    Hash do conteúdo normalizado de um anúncio (dict de extract_ad_details): ignora campos voláteis
+    e valores vazios, e serializa com as chaves ordenadas, para que a ordem dos campos não importe.
+    """
+    normalized = {key: value for key, value in details.items() if key not in _VOLATILE_KEYS and value not in (None, "")}
+    serialized = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(serialized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ChangeTracker:
+    """
+    Histórico local dos anúncios entre execuções, em um arquivo SQLite, chaveado pelo ID estável da OLX.
+    Para cada anúncio guarda o hash do conteúdo, as datas em que foi visto/alterado, o último preço
+    e os dados completos; a tabela price_history recebe uma linha a cada mudança de 'preco'.
+    A coluna card_hash guarda o hash dos dados do card da listagem, para saber se a página de
+    detalhes precisa ser buscada de novo.
+
+    Um anúncio só é considerado removido depois de não aparecer em 'removed_after_missed_runs'
+    execuções completas seguidas. Completa é a execução que percorreu a busca inteira (paginação até o fim,
+    sem MAX_PAGES_TO_SCRAPE e sem falhas nas páginas de listagem) e viu ao menos um anúncio; nas demais
+    (limite de páginas, rede ou Cloudflare falhando, nenhum anúncio coletado) a detecção de removidos é pulada.
+    O limite de execuções só protege contra anúncios que somem temporariamente de uma busca completa
+    (ex: a ordenação da listagem mudou durante a coleta).
+    """
+
+    def __init__(self, path, removed_after_missed_runs=2, batch_size=50):
+        self.path = path
+        self.removed_after_missed_runs = max(1, removed_after_missed_runs)
+        self.batch_size = max(1, batch_size)
+        self.counts = {STATUS_NEW: 0, STATUS_CHANGED: 0, STATUS_UNCHANGED: 0, STATUS_REMOVED: 0}
+        self.run_id = None
+        self.listing_complete = False # Ver mark_listing_complete
+        self._run_started_at = None
+        self._uncommitted = 0
+        self._card_hashes = {} # ad_id -> card_hash dos cards vistos nesta execução, gravado no próximo observe
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS ads (
+                ad_id TEXT PRIMARY KEY,
+                ad_url TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                card_hash TEXT,
+                preco REAL,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                last_changed TEXT NOT NULL,
+                last_seen_run INTEGER NOT NULL,
+                missed_runs INTEGER NOT NULL DEFAULT 0,
+                removed_at TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ads_last_seen_run ON ads (last_seen_run);
+            CREATE TABLE IF NOT EXISTS price_history (
+                ad_id TEXT NOT NULL,
+                observed_at TEXT NOT NULL,
+                preco REAL,
+                preco_anterior REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_price_history_ad_id ON price_history (ad_id, observed_at);
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at TEXT NOT NULL,
+                finished_at TEXT,
+                new_ads INTEGER,
+                changed_ads INTEGER,
+                unchanged_ads INTEGER,
+                removed_ads INTEGER
+            );
+            """
+        )
+        self._db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def begin_run(self):
+        """Registra o início de uma execução; os anúncios observados a partir daqui contam como vistos nela."""
+        self._run_started_at = datetime.now().isoformat(timespec="seconds")
+        self.listing_complete = False
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO runs (started_at) VALUES (?)", (self._run_started_at,))
+            self._db.commit()
+            self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def _commit_if_needed_locked(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.batch_size:
+            self._db.commit()
+            self._uncommitted = 0
+
+    def observe(self, ad_data, card_hash=None):
+        """
+        Compara o anúncio com o histórico e o atualiza. Retorna 'novo', 'alterado' ou 'inalterado'.
+        Quando o preço muda (ou na primeira vez que o anúncio é visto), acrescenta uma linha em price_history.
+        Sem 'card_hash', usa o que foi informado em remember_card_hash para o anúncio, se houver.
+        """
+        ad_url = ad_data.get("url_anuncio")
+        ad_id = extract_ad_id(ad_url)
+        new_hash = content_hash(ad_data)
+        preco = ad_data.get("preco")
+        now = datetime.now().isoformat(timespec="seconds")
+        data = json.dumps(dict(ad_data), ensure_ascii=False)
+
+        with self._lock:
+            card_hash = self._card_hashes.pop(ad_id, card_hash)
+            row = self._db.execute("SELECT content_hash, preco FROM ads WHERE ad_id = ?", (ad_id,)).fetchone()
+            if row is None:
+                status = STATUS_NEW
+                self._db.execute(
+                    """INSERT INTO ads (ad_id, ad_url, content_hash, card_hash, preco, first_seen, last_seen, last_changed, last_seen_run, data)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (ad_id, ad_url, new_hash, card_hash, preco, now, now, now, self.run_id, data),
+                )
+                self._db.execute("INSERT INTO price_history (ad_id, observed_at, preco, preco_anterior) VALUES (?, ?, ?, NULL)", (ad_id, now, preco))
+            else:
+                previous_hash, previous_preco = row
+                status = STATUS_UNCHANGED if previous_hash == new_hash else STATUS_CHANGED
+                self._db.execute(
+                    """UPDATE ads SET ad_url = ?, content_hash = ?, card_hash = COALESCE(?, card_hash), preco = ?, last_seen = ?,
+                              last_changed = CASE WHEN content_hash = ? THEN last_changed ELSE ? END,
+                              last_seen_run = ?, missed_runs = 0, removed_at = NULL, data = ?
+                       WHERE ad_id = ?""",
+                    (ad_url, new_hash, card_hash, preco, now, new_hash, now, self.run_id, data, ad_id),
+                )
+                if preco != previous_preco:
+                    self._db.execute(
+                        "INSERT INTO price_history (ad_id, observed_at, preco, preco_anterior) VALUES (?, ?, ?, ?)",
+                        (ad_id, now, preco, previous_preco),
+                    )
+            self._commit_if_needed_locked()
+            self.counts[status] += 1
+        return status
+
+    def known_card(self, ad_url):
+        """(card_hash, anúncio) gravados na última vez em que o anúncio foi visto, ou (None, None) se ele é novo."""
+        with self._lock:
+            row = self._db.execute("SELECT card_hash, data FROM ads WHERE ad_id = ?", (extract_ad_id(ad_url),)).fetchone()
+        if row is None:
+            return None, None
+        return row[0], as_record(json.loads(row[1]))
+
+    def remember_card_hash(self, ad_url, card_hash):
+        """Guarda o hash do card da listagem até o anúncio passar por observe (o anúncio chega depois, pela fila de detalhes)."""
+        with self._lock:
+            self._card_hashes[extract_ad_id(ad_url)] = card_hash
+
+    def mark_listing_complete(self):
+        """Informa que a coleta desta execução percorreu a busca inteira (chamado por run_scraper ao terminar)."""
+        self.listing_complete = True
+
+    def finish_run(self, detect_removed=True):
+        """
+        Encerra a execução. Com 'detect_removed' (apenas em execuções completas), incrementa a contagem de
+        execuções perdidas dos anúncios não vistos e devolve os que passaram a ser considerados removidos.
+        Uma execução que não viu nenhum anúncio nunca marca removidos.
+        """
+        removed = []
+        now = datetime.now().isoformat(timespec="seconds")
+        seen = self.counts[STATUS_NEW] + self.counts[STATUS_CHANGED] + self.counts[STATUS_UNCHANGED]
+        if detect_removed and not seen:
+            logging.warning("Nenhum anúncio visto nesta execução; a detecção de anúncios removidos foi pulada.")
+            detect_removed = False
+        with self._lock:
+            if detect_removed:
+                self._db.execute(
+                    "UPDATE ads SET missed_runs = missed_runs + 1 WHERE last_seen_run < ? AND removed_at IS NULL",
+                    (self.run_id,),
+                )
+                rows = self._db.execute(
+                    "SELECT ad_id, data FROM ads WHERE removed_at IS NULL AND missed_runs >= ?",
+                    (self.removed_after_missed_runs,),
+                ).fetchall()
+                self._db.executemany("UPDATE ads SET removed_at = ? WHERE ad_id = ?", [(now, ad_id) for ad_id, _ in rows])
+                removed = [json.loads(data) for _, data in rows]
+                self.counts[STATUS_REMOVED] = len(removed)
+            self._db.execute(
+                "UPDATE runs SET finished_at = ?, new_ads = ?, changed_ads = ?, unchanged_ads = ?, removed_ads = ? WHERE run_id = ?",
+                (now, self.counts[STATUS_NEW], self.counts[STATUS_CHANGED], self.counts[STATUS_UNCHANGED], self.counts[STATUS_REMOVED], self.run_id),
+            )
+            self._db.commit()
+            self._uncommitted = 0
+        logging.info(
+            f"Mudanças desde a última coleta: {self.counts[STATUS_NEW]} novos, {self.counts[STATUS_CHANGED]} alterados, "
+            f"{self.counts[STATUS_UNCHANGED]} inalterados, {self.counts[STATUS_REMOVED]} removidos."
+        )
+        return removed
+
+    def track(self, ads, only_changes=True, detect_removed=None):
+        """
+        Passa os anúncios de 'ads' pelo histórico e devolve (gerador) os que devem ser exportados,
+        com a coluna 'status_alteracao': apenas novos e alterados (ou todos, sem 'only_changes').
+        Se 'ads' terminar normalmente e a execução for completa, os anúncios removidos são devolvidos no final.
+        Com 'detect_removed' None, a execução é completa se 'ads' (run_scraper) chamou mark_listing_complete;
+        se a coleta for interrompida (exceção), a execução fica sem 'finished_at' e nada é marcado como removido.
+        """
+        if self.run_id is None:
+            self.begin_run()
+        for ad_data in ads:
+            status = self.observe(ad_data)
+            if status != STATUS_UNCHANGED or not only_changes:
+                ad_data = as_record(ad_data)
+                ad_data["status_alteracao"] = status
+                yield ad_data
+        if detect_removed is None:
+            detect_removed = self.listing_complete
+        if not detect_removed:
+            logging.info("Coleta parcial (limite de páginas, falha de listagem ou interrupção): a detecção de anúncios removidos foi pulada.")
+        for ad_data in self.finish_run(detect_removed):
+            ad_data = as_record(ad_data)
+            ad_data["status_alteracao"] = STATUS_REMOVED
+            yield ad_data
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
@@ -16,19 +16,136 @@ HTTP_HEADERS = {
 # Tempo de espera (em segundos) entre requisições para não sobrecarregar o servidor
 REQUEST_DELAY_SECONDS = 5 # Aumente se necessário, especialmente com cloudscraper
 
+# Limite de requisições por segundo para cada host (token bucket).
+# O padrão equivale à pausa antiga de REQUEST_DELAY_SECONDS / 2 entre anúncios.
+REQUESTS_PER_SECOND_PER_HOST = 2 / REQUEST_DELAY_SECONDS
+# Quantidade de requisições que podem ser feitas em rajada antes de o limite atuar
+RATE_LIMIT_BURST = 1
+# Número máximo de páginas de anúncio buscadas ao mesmo tempo
+MAX_CONCURRENT_REQUESTS = 8
+# Tamanho máximo da fila de links de anúncios entre a descoberta (listagens) e os workers de detalhes
+AD_QUEUE_MAX_SIZE = 200
+
+# --- Controle adaptativo (AIMD) ---
+# Enquanto as respostas vêm limpas, a taxa por host e a concorrência sobem aos poucos; ao receber 429, 5xx
+# ou uma página de desafio do Cloudflare, ambas são cortadas pela metade (e o Retry-After é respeitado).
+ADAPTIVE_THROTTLING_ENABLED = True
+ADAPTIVE_MIN_RATE = REQUESTS_PER_SECOND_PER_HOST / 4 # req/s
+ADAPTIVE_MAX_RATE = REQUESTS_PER_SECOND_PER_HOST * 4 # req/s
+ADAPTIVE_RATE_INCREASE = 0.05 # req/s somados a cada ADAPTIVE_SUCCESS_WINDOW respostas limpas
+ADAPTIVE_SUCCESS_WINDOW = 10
+ADAPTIVE_DECREASE_FACTOR = 0.5
+ADAPTIVE_MIN_CONCURRENCY = 1 # O máximo é MAX_CONCURRENT_REQUESTS
+# Novas tentativas das URLs que falharam de forma temporária, com backoff exponencial e jitter
+RETRY_MAX_ATTEMPTS = 4 # Total de tentativas por URL, incluindo a primeira
+RETRY_BASE_DELAY_SECONDS = 2
+RETRY_MAX_DELAY_SECONDS = 120
+
+# --- Sessões HTTP (cloudscraper) ---
+# Sessões usadas em paralelo, cada uma com o próprio pool de conexões e cookies do Cloudflare
+SESSION_POOL_SIZE = 4
+# Requisições simultâneas por sessão (o pool comporta MAX_CONCURRENT_REQUESTS no total)
+SESSION_MAX_IN_FLIGHT = -(-MAX_CONCURRENT_REQUESTS // SESSION_POOL_SIZE)
+# Cookies de liberação e User-Agent das sessões, reaproveitados nas próximas execuções enquanto não vencem
+SESSION_STATE_PATH = "cache/sessions.json"
+# Idade máxima de uma sessão (e do estado gravado) antes de ser trocada por uma nova
+SESSION_MAX_AGE_SECONDS = 6 * 60 * 60
+# Páginas de desafio/bloqueio seguidas antes de descartar a sessão e resolver o desafio com uma nova
+SESSION_MAX_CHALLENGES = 2
+# Visita a página inicial com as sessões sem liberação no início da coleta, em segundo plano
+SESSION_WARMUP = True
+
+# --- Cache HTTP em disco ---
+# Guarda as páginas baixadas (comprimidas) para reaproveitá-las em novas execuções,
+# por exemplo ao ajustar os seletores de SELECTORS_AD_PAGE.
+HTTP_CACHE_ENABLED = False
+HTTP_CACHE_FOLDER = "cache/http"
+HTTP_CACHE_MAX_BYTES = 500 * 1024 * 1024 # Acima disso, as entradas menos usadas são removidas
+# Tempo de validade (em segundos) por tipo de página; depois disso a página é revalidada (ETag/Last-Modified)
+HTTP_CACHE_TTL_SECONDS = {
+    'listing': 15 * 60,      # Listagens mudam com frequência
+    'ad': 24 * 60 * 60,      # Anúncios raramente mudam de um dia para o outro
+}
+
+# --- Checkpoint da coleta ---
+# Arquivo SQLite com o progresso da coleta, usado por 'python main.py --resume'
+CRAWL_STATE_DB_PATH = "crawl_state.sqlite3"
+# Quantidade de anúncios concluídos gravados por transação
+CHECKPOINT_BATCH_SIZE = 50
+
+# --- Detecção de mudanças entre coletas ---
+# Histórico local dos anúncios (hash do conteúdo, último preço, histórico de preços), comparado a cada execução
+CHANGE_TRACKING_ENABLED = True
+CHANGE_TRACKER_DB_PATH = "ads_history.sqlite3"
+# Exporta todos os anúncios, com a coluna 'status_alteracao' (novo, alterado, inalterado, removido).
+# True exporta só os novos, alterados e removidos (arquivos '*_delta_*'); os inalterados ficam de fora
+# também da base de consulta ('sqlite'), que então não atualiza o 'last_seen' deles
+EXPORT_ONLY_CHANGES = False
+# Execuções completas seguidas sem ver um anúncio antes de considerá-lo removido
+CHANGE_TRACKING_REMOVED_AFTER_MISSED_RUNS = 2
+
+# --- Modo job: várias buscas divididas em shards (python main.py --job-create / --job-work / --job-export) ---
+# Buscas coletadas pelo job (estados, cidades, categorias...), quando --job-urls não é informado
+JOB_SEARCH_URLS = [BASE_URL_OLX]
+# Fila compartilhada pelos workers: arquivo SQLite ou servidor compatível com Redis ("redis://localhost:6379/0")
+JOB_QUEUE = "jobs.sqlite3"
+# Páginas de listagem (parâmetro 'o') por shard e máximo de páginas consideradas por busca
+JOB_PAGES_PER_SHARD = 5
+JOB_MAX_PAGES_PER_QUERY = 100
+# Tempo que um worker pode ficar com um shard sem dar sinal de vida antes de outro assumi-lo
+JOB_LEASE_SECONDS = 15 * 60
+# Tentativas por shard antes de marcá-lo como 'failed'
+JOB_MAX_SHARD_ATTEMPTS = 3
+
+# --- Modo daemon (python main.py daemon) ---
+# Intervalo entre o início de duas coletas; o processo fica residente, com sessões, seletores e cache já carregados
+DAEMON_INTERVAL_SECONDS = 6 * 60 * 60
+
+# --- Métricas ---
+# Porta do endpoint local (http://127.0.0.1:<porta>/metrics) com as métricas no formato do Prometheus.
+# Defina None para não abrir o endpoint; o resumo em JSON é gravado ao lado das exportações de qualquer forma.
+METRICS_PORT = 9108
+
+# --- Logs ---
+# A gravação dos logs é feita por uma thread própria (QueueHandler/QueueListener), fora das threads da coleta
+LOG_FILE = "scraper.log"
+LOG_LEVEL = "INFO"
+# 'json': uma linha JSON por evento no LOG_FILE, com campos fixos (url, stage, selector, duration_ms...); 'text': formato antigo
+LOG_FORMAT = "json"
+# Avisos repetidos de um mesmo seletor: só as primeiras ocorrências vão para o log; as demais são contadas
+# e resumidas a cada LOG_SAMPLE_SUMMARY_SECONDS (ex: "seletor 'image_in_gallery' falhou em 4812 anúncios")
+LOG_SAMPLE_FIRST = 5
+LOG_SAMPLE_SUMMARY_SECONDS = 60
+
 # --- Seletores HTML (ATUALIZADOS COM BASE NO SEU INPUT) ---
 
+# Backend de parsing/extração: "bs4" (BeautifulSoup) ou "lxml" (lxml.html com os seletores
+# pré-compilados para XPath, bem mais rápido). Ambos produzem os mesmos campos.
+PARSER_BACKEND = "bs4"
+# Extrai os anúncios do JSON embutido na página (__NEXT_DATA__/dataLayer) quando disponível,
+# sem parsear o HTML; os seletores abaixo ficam apenas como alternativa.
+USE_EMBEDDED_JSON = True
+# Modo rápido para monitoramento: monta o anúncio a partir do card da listagem (cerca de 50 por requisição).
+# Com o histórico de mudanças ativo, a página do anúncio só é buscada para anúncios novos ou cujo card mudou;
+# sem ele, só para os cards sem algum dos campos de LISTING_CARD_REQUIRED_FIELDS.
+LISTING_CARD_MODE = False
+LISTING_CARD_REQUIRED_FIELDS = ("titulo", "preco", "local_bairro")
+# Número de processos dedicados ao parsing/extração das páginas de anúncio.
+# 0 faz a extração nas próprias threads de download (limitada a um núcleo pelo GIL).
+PARSE_WORKERS = 0
+
 # Seletores para a página de listagem de anúncios
 SELECTORS_LISTING_PAGE = {
     'ad_card': 'section.olx-adcard.olx-adcard__horizontal',
     'ad_link': 'a',
-    # 'listing_title': 'h2.olx-adcard__title', # Exemplo de como você nomeou
-    # 'listing_price': 'h3.olx-adcard__price',
-    # 'listing_location': 'p.olx-adcard__location',
-    # 'listing_date': 'p.olx-adcard__date',
-    # 'listing_details_summary': 'div.olx-adcard__details',
-    # 'listing_detail_item': 'div.olx-adcard__detail',
-    # 'listing_image_url': 'div.olx-adcard__media picture img', # Pegue o atributo 'src'
+    # Campos do próprio card, usados pelo modo LISTING_CARD_MODE (relativos ao 'ad_card')
+    'listing_title': 'h2.olx-adcard__title', # Exemplo de como você nomeou
+    'listing_price': 'h3.olx-adcard__price',
+    'listing_location': 'p.olx-adcard__location',
+    'listing_date': 'p.olx-adcard__date',
+    'listing_details_summary': 'div.olx-adcard__details',
+    'listing_detail_item': 'div.olx-adcard__detail', # Relativo ao 'listing_details_summary'
+    'listing_image_url': 'div.olx-adcard__media picture img', # Pegue o atributo 'src'
     # 'next_page_link': "a[data-testid='pagination-forward']" # Exemplo, pode ser um botão ou link com texto "Próxima"
 }
 
@@ -72,4 +189,27 @@ SELECTORS_AD_PAGE = {
 
 # --- Configurações de Saída ---
 OUTPUT_FILENAME_PREFIX = "olx_imoveis_anuncios"
-DATA_FOLDER = "data"
\ No newline at end of file
+DATA_FOLDER = "data"
+# Formatos gerados pela exportação incremental: 'csv', 'xlsx', 'parquet' (este último requer pyarrow) e 'sqlite'
+# ('sqlite' acumula os anúncios de todas as coletas em QUERY_STORE_PATH, consultável com 'python main.py query')
+EXPORT_FORMATS = ('csv', 'xlsx')
+# Base local de consulta: índices em cidade, bairro, quartos, preço e data, e busca de texto em título e descrição
+QUERY_STORE_PATH = "data/anuncios.sqlite3"
+# Quantidade de anúncios acumulados em memória antes de cada gravação em disco
+EXPORT_BATCH_SIZE = 500
+# --- Imagens dos anúncios ---
+# Baixa todas as imagens da galeria de cada anúncio exportado e acrescenta a coluna 'imagens_locais'
+IMAGES_ENABLED = False
+# Arquivos nomeados pelo sha256 do conteúdo (fotos repetidas em anúncios republicados ficam uma vez só)
+IMAGES_FOLDER = "data/images"
+IMAGE_DOWNLOAD_WORKERS = 8
+# Limite próprio do CDN de imagens, separado do limite das páginas
+IMAGE_REQUESTS_PER_SECOND_PER_HOST = 5
+IMAGE_RATE_LIMIT_BURST = 5
+IMAGE_MAX_BYTES = 10 * 1024 * 1024 # Imagens maiores são descartadas
+IMAGE_MAX_PER_AD = None # None baixa todas as imagens da galeria
+# Anúncios aguardando os downloads das suas imagens antes de seguirem para a exportação
+IMAGE_MAX_PENDING_ADS = 50
+# Normaliza cada lote com operações vetorizadas (src/normalization.py) antes de gravar: o Parquet recebe colunas
+# tipadas e compactas, e todas as exportações ganham local_cidade, local_estado e local_cep
+EXPORT_NORMALIZE = True
\ No newline at end of file
@@ -1,8 +1,21 @@
 import pandas as pd
+import csv
+import json
 import os
 import logging
+import time
 from datetime import datetime
-from .config import OUTPUT_FILENAME_PREFIX, DATA_FOLDER
+from openpyxl import Workbook
+from . import metrics
+from .config import OUTPUT_FILENAME_PREFIX, DATA_FOLDER, EXPORT_FORMATS, EXPORT_BATCH_SIZE, EXPORT_NORMALIZE, QUERY_STORE_PATH
+from .normalization import LOCATION_COLUMNS, normalize_frame
+from .records import ColumnarAccumulator
+
+try: # Parquet é opcional: só é gerado se o pyarrow estiver instalado
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
 def save_data(data_list):
     """
@@ -14,7 +27,7 @@ def save_data(data_list):
         return None, None
 
     try:
-        df = pd.DataFrame(data_list)
+        df = normalize_frame(pd.DataFrame(data_list))
 
         # Garante que a pasta de dados existe
         if not os.path.exists(DATA_FOLDER):
@@ -41,6 +54,262 @@ def save_data(data_list):
         logging.error(f"Erro ao salvar os dados: {e}", exc_info=True)
         return None, None
 
+class StreamingExporter:
+    """
+    Exporta os anúncios incrementalmente, em lotes de 'batch_size', sem manter a coleta inteira em memória.
+
+    - CSV: as linhas são acrescentadas ao arquivo a cada lote, que pode ser lido enquanto a coleta continua,
+      com as colunas conhecidas quando o arquivo foi aberto. Colunas que surgem depois (labels de detalhes ainda
+      não vistas) ficam só no spool até o fechamento, quando o CSV é reescrito uma única vez com o cabeçalho completo.
+    - Parquet (opcional, requer pyarrow): cada lote vira um row group; quando o schema aumenta,
+      um novo arquivo 'part-NNNNN.parquet' é iniciado na pasta '<base>_parquet'. No fechamento as partes
+      são unificadas em um único '<base>.parquet'.
+    - XLSX: gerado no fechamento, em modo write-only do openpyxl, a partir de um arquivo temporário JSON Lines.
+    - SQLite ('sqlite'): cada lote é gravado com um upsert na base local de consulta (query_store.py), que acumula
+      os anúncios de todas as coletas em um único arquivo indexado.
+    - Com 'normalize', cada lote passa pela normalização vetorizada (normalization.py): o Parquet recebe as
+      colunas tipadas (float32, inteiros anuláveis, categorias) e todos os formatos ganham local_cidade,
+      local_estado e local_cep.
+
+    Uso:
+        with StreamingExporter() as exporter:
+            for ad in run_scraper():
+                exporter.write(ad)
+    """
+
+    def __init__(self, formats=EXPORT_FORMATS, batch_size=EXPORT_BATCH_SIZE, base_filename=None, normalize=EXPORT_NORMALIZE,
+                 query_store_path=QUERY_STORE_PATH):
+        self.formats = set(formats)
+        self.batch_size = max(1, batch_size)
+        self.normalize = normalize
+        self.columns = []
+        self.rows_written = 0
+        self._buffer = ColumnarAccumulator() # Lote atual, guardado por coluna
+
+        # Garante que a pasta de dados existe
+        if not os.path.exists(DATA_FOLDER):
+            os.makedirs(DATA_FOLDER)
+            logging.info(f"Pasta '{DATA_FOLDER}' criada.")
+
+        if base_filename is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            base_filename = f"{OUTPUT_FILENAME_PREFIX}_{timestamp}"
+        self.csv_filename = os.path.join(DATA_FOLDER, f"{base_filename}.csv") if "csv" in self.formats else None
+        self.xlsx_filename = os.path.join(DATA_FOLDER, f"{base_filename}.xlsx") if "xlsx" in self.formats else None
+        self.metrics_filename = os.path.join(DATA_FOLDER, f"{base_filename}_metrics.json") # Resumo das métricas da coleta
+        self.parquet_folder = None
+        if "parquet" in self.formats:
+            if pq is None:
+                logging.warning("Formato 'parquet' solicitado, mas o pyarrow não está instalado. Parquet não será gerado.")
+            else:
+                self.parquet_folder = os.path.join(DATA_FOLDER, f"{base_filename}_parquet")
+                os.makedirs(self.parquet_folder, exist_ok=True)
+        self.query_store = None
+        if "sqlite" in self.formats:
+            from .query_store import QueryStore
+            self.query_store = QueryStore(query_store_path)
+
+        # Cópia fiel (tipada) de todas as linhas, usada para reescrever o CSV e gerar o XLSX no final
+        self._spool_filename = os.path.join(DATA_FOLDER, f".{base_filename}.jsonl")
+        self._spool_file = open(self._spool_filename, "w", encoding="utf-8")
+        self._csv_file = None
+        self._csv_writer = None
+        self._parquet_writer = None
+        self._parquet_schema = None
+        self._parquet_part = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def write(self, record):
+        """Adiciona um anúncio (AdRecord ou dict); o lote é gravado em disco quando atinge 'batch_size'."""
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Grava o lote atual em todos os formatos incrementais."""
+        if not len(self._buffer):
+            return
+        with metrics.timer("olx_export_duration_seconds", stage="flush"):
+            self._flush_batch()
+
+    def _flush_batch(self):
+        batch, self._buffer = self._buffer, ColumnarAccumulator()
+        # As colunas do lote vão direto para o DataFrame, sem passar por uma lista de dicts
+        frame = normalize_frame(pd.DataFrame(batch.columns())) if self.normalize else None
+        if frame is not None:
+            # Separação de cidade/estado/CEP calculada em lote
+            for column in LOCATION_COLUMNS:
+                if column in frame:
+                    batch.set_column(column, frame[column].astype(object).where(frame[column].notna(), None))
+
+        known_columns = set(self.columns)
+        new_columns = [column for column in batch.column_names if column not in known_columns]
+        self.columns.extend(new_columns)
+
+        for record in batch.iter_dicts():
+            self._spool_file.write(json.dumps(record, ensure_ascii=False))
+            self._spool_file.write("\n")
+        self._spool_file.flush()
+
+        if self.csv_filename:
+            self._append_csv(batch)
+        if self.parquet_folder:
+            self._write_parquet(batch, frame)
+        if self.query_store:
+            self.query_store.upsert(batch.iter_dicts())
+
+        self.rows_written += len(batch)
+        logging.info(f"{self.rows_written} anúncios exportados até agora.")
+
+    def _open_csv(self, mode):
+        self._csv_file = open(self.csv_filename, mode, newline="", encoding="utf-8-sig")
+        # Cópia das colunas: as que surgirem depois são ignoradas aqui e entram na reescrita final
+        self._csv_writer = csv.DictWriter(self._csv_file, fieldnames=list(self.columns), restval="", extrasaction="ignore")
+        if mode == "w":
+            self._csv_writer.writeheader()
+
+    def _append_csv(self, batch):
+        if self._csv_file is None:
+            self._open_csv("w")
+        self._csv_writer.writerows(batch.iter_dicts())
+        self._csv_file.flush()
+
+    def _rewrite_csv(self):
+        """Reescreve o CSV com o cabeçalho completo, lendo as linhas do spool uma a uma (uma vez, no fechamento)."""
+        logging.info(f"Novas colunas encontradas durante a coleta; reescrevendo '{self.csv_filename}' com {len(self.columns)} colunas.")
+        self._csv_file.close()
+        self._open_csv("w")
+        for record in self._iter_spool():
+            self._csv_writer.writerow(record)
+        self._csv_file.flush()
+
+    def _iter_spool(self):
+        with open(self._spool_filename, "r", encoding="utf-8") as spool:
+            for line in spool:
+                yield json.loads(line)
+
+    @staticmethod
+    def _conform_table(table, schema):
+        """Ajusta 'table' ao 'schema': converte os tipos e completa com nulos as colunas ausentes."""
+        columns = [
+            table.column(field.name).cast(field.type) if field.name in table.column_names else pa.nulls(len(table), field.type)
+            for field in schema
+        ]
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    def _typed_table(self, frame):
+        """
+        Tabela Arrow com os tipos compactos do DataFrame normalizado. Categorias viram dictionary<int32, string>
+        (os índices do pandas variam de int8 a int32 conforme o lote) e colunas ausentes no lote, nulos.
+        """
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        arrays = []
+        for column in self.columns:
+            if column not in table.column_names:
+                arrays.append(pa.nulls(len(table)))
+                continue
+            array = table.column(column)
+            if pa.types.is_dictionary(array.type):
+                array = array.cast(pa.dictionary(pa.int32(), array.type.value_type))
+            arrays.append(array)
+        return pa.Table.from_arrays(arrays, names=self.columns)
+
+    def _write_parquet(self, batch, frame=None):
+        if frame is not None:
+            table = self._typed_table(frame)
+        else:
+            table = pa.Table.from_pydict(batch.columns(self.columns))
+        if self._parquet_schema is not None:
+            try:
+                merged_schema = pa.unify_schemas([self._parquet_schema, table.schema], promote_options="permissive")
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                merged_schema = None
+            if merged_schema is not None and merged_schema.equals(self._parquet_schema):
+                # Mesmo schema: grava o lote como um novo row group do arquivo atual
+                self._parquet_writer.write_table(self._conform_table(table, self._parquet_schema))
+                return
+            self._parquet_writer.close()
+            self._parquet_part += 1
+
+        self._parquet_schema = table.schema
+        self._parquet_writer = pq.ParquetWriter(self._parquet_part_filename(self._parquet_part), self._parquet_schema)
+        self._parquet_writer.write_table(table)
+
+    def _parquet_part_filename(self, part):
+        return os.path.join(self.parquet_folder, f"part-{part:05d}.parquet")
+
+    def _consolidate_parquet(self):
+        """
+        Junta as partes (geradas a cada ampliação do schema) em um único arquivo '<base>.parquet'
+        com o schema unificado, copiando um row group por vez para manter a memória constante.
+        """
+        part_filenames = [self._parquet_part_filename(part) for part in range(self._parquet_part + 1)]
+        parquet_filename = f"{self.parquet_folder[:-len('_parquet')]}.parquet"
+        try:
+            schema = pa.unify_schemas([pq.read_schema(f) for f in part_filenames], promote_options="permissive")
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            logging.error(f"Não foi possível unificar o schema das partes Parquet em '{self.parquet_folder}': {e}. As partes foram mantidas.")
+            return self.parquet_folder
+
+        with pq.ParquetWriter(parquet_filename, schema) as writer:
+            for part_filename in part_filenames:
+                part = pq.ParquetFile(part_filename)
+                for row_group in range(part.num_row_groups):
+                    writer.write_table(self._conform_table(part.read_row_group(row_group), schema))
+        for part_filename in part_filenames:
+            os.remove(part_filename)
+        os.rmdir(self.parquet_folder)
+        return parquet_filename
+
+    def _write_xlsx(self):
+        """Gera o XLSX em modo write-only (memória constante), a partir do spool."""
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(self.columns)
+        for record in self._iter_spool():
+            sheet.append([record.get(column) for column in self.columns])
+        workbook.save(self.xlsx_filename)
+
+    def close(self):
+        """Grava o último lote, finaliza os arquivos e remove o spool temporário. Retorna (csv, xlsx)."""
+        if self._spool_file.closed:
+            return self.csv_filename, self.xlsx_filename
+        close_start = time.perf_counter()
+        try:
+            self.flush()
+            self._spool_file.close()
+            if self._csv_file:
+                if len(self._csv_writer.fieldnames) < len(self.columns):
+                    self._rewrite_csv()
+                self._csv_file.close()
+                logging.info(f"Dados salvos em: {self.csv_filename}")
+            if self._parquet_writer:
+                self._parquet_writer.close()
+                logging.info(f"Dados salvos em: {self._consolidate_parquet()}")
+            if self.xlsx_filename and self.rows_written:
+                self._write_xlsx()
+                logging.info(f"Dados salvos em: {self.xlsx_filename}")
+            if self.query_store:
+                logging.info(f"Dados salvos em: {self.query_store.path} ({self.query_store.count()} anúncios na base de consulta)")
+        finally:
+            if self.query_store:
+                self.query_store.close()
+            if not self._spool_file.closed:
+                self._spool_file.close()
+            if os.path.exists(self._spool_filename):
+                os.remove(self._spool_filename)
+            metrics.observe("olx_export_duration_seconds", time.perf_counter() - close_start, stage="close")
+        if not self.rows_written:
+            logging.warning("Nenhum dado para salvar.")
+            return None, None
+        return self.csv_filename, self.xlsx_filename
+
 if __name__ == '__main__':
     # Exemplo de uso (para teste)
     logging.basicConfig(level=logging.INFO)
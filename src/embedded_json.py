@@ -0,0 +1,168 @@
+"""
+Extração rápida dos dados do anúncio a partir do JSON embutido na página, sem parsear o HTML.
+As páginas de anúncio da OLX trazem o modelo completo do anúncio em <script id="__NEXT_DATA__">
+(ou, em layouts mais antigos, no atributo data-json de <script id="initial-data">) e no dataLayer.
+O blob é localizado com buscas simples nos bytes e só ele é decodificado.
+"""
+import html
+import json
+import logging
+
+from .utils import clean_text, extract_price, normalize_detail_value, normalize_publication_date
+
+_DECODER = json.JSONDecoder()
+
+# Chaves que identificam o objeto do anúncio dentro do JSON da página
+_AD_TITLE_KEYS = ("subject", "title")
+_AD_MARKER_KEYS = ("listId", "adId", "priceValue", "properties")
+
+
+def _script_body(content, marker):
+    """Retorna os bytes entre o '>' da tag que contém 'marker' e o '</script>' seguinte."""
+    marker_pos = content.find(marker)
+    if marker_pos == -1:
+        return None
+    start = content.find(b">", marker_pos)
+    end = content.find(b"</script>", start)
+    if start == -1 or end == -1:
+        return None
+    return content[start + 1:end]
+
+
+def _decode_at(text, start):
+    """Decodifica o valor JSON que começa em 'start', sem precisar saber onde ele termina."""
+    try:
+        value, _ = _DECODER.raw_decode(text, start)
+        return value
+    except ValueError:
+        return None
+
+
+def find_embedded_json_blobs(content):
+    """Localiza e decodifica os blobs JSON conhecidos da página (NEXT_DATA, initial-data e dataLayer)."""
+    blobs = []
+
+    next_data = _script_body(content, b'id="__NEXT_DATA__"')
+    if next_data:
+        try:
+            blobs.append(json.loads(next_data))
+        except ValueError:
+            logging.warning("Blob __NEXT_DATA__ encontrado, mas não é um JSON válido.")
+
+    initial_data_pos = content.find(b'id="initial-data"')
+    if initial_data_pos != -1:
+        attr_pos = content.find(b'data-json="', initial_data_pos)
+        attr_end = content.find(b'"', attr_pos + len(b'data-json="')) if attr_pos != -1 else -1
+        if attr_end != -1:
+            raw_json = content[attr_pos + len(b'data-json="'):attr_end].decode("utf-8", errors="replace")
+            value = _decode_at(html.unescape(raw_json), 0)
+            if value is not None:
+                blobs.append(value)
+
+    data_layer_pos = content.find(b"dataLayer")
+    if data_layer_pos != -1:
+        array_start = content.find(b"[", data_layer_pos, data_layer_pos + 64)
+        if array_start != -1:
+            value = _decode_at(content[array_start:array_start + 2_000_000].decode("utf-8", errors="replace"), 0)
+            if value is not None:
+                blobs.append(value)
+
+    return blobs
+
+
+def _find_ad_object(value, depth=0):
+    """Procura, em profundidade, o dict que representa o anúncio (tem título e algum campo típico de anúncio)."""
+    if depth > 12:
+        return None
+    if isinstance(value, dict):
+        if any(isinstance(value.get(key), str) for key in _AD_TITLE_KEYS) and any(key in value for key in _AD_MARKER_KEYS):
+            return value
+        children = value.values()
+    elif isinstance(value, list):
+        children = value
+    else:
+        return None
+    for child in children:
+        if isinstance(child, (dict, list)):
+            found = _find_ad_object(child, depth + 1)
+            if found is not None:
+                return found
+    return None
+
+
+def _first(mapping, *keys):
+    for key in keys:
+        value = mapping.get(key)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _text(value):
+    """Texto limpo de um valor do JSON (que pode trazer entidades HTML), ou None."""
+    if value is None:
+        return None
+    return clean_text(html.unescape(str(value)))
+
+
+def _image_url(image):
+    if isinstance(image, str):
+        return image
+    if isinstance(image, dict):
+        return _first(image, "original", "originalImage", "url", "src", "thumbnail")
+    return None
+
+
+def extract_ad_details(ad_url, content):
+    """
+    Monta o dict de detalhes (mesmas chaves de scraper.extract_ad_details) a partir do JSON embutido.
+    Inclui também 'imagens_urls', com as URLs de todas as imagens da galeria separadas por espaço.
+    Retorna None se a página não tiver um blob com o anúncio, para que o chamador use os seletores.
+    """
+    ad = None
+    for blob in find_embedded_json_blobs(content):
+        ad = _find_ad_object(blob)
+        if ad is not None:
+            break
+    if ad is None:
+        return None
+
+    details = {"url_anuncio": ad_url}
+    details["titulo"] = _text(_first(ad, *_AD_TITLE_KEYS))
+
+    price_value = _first(ad, "priceValue", "price")
+    price_text = _text(price_value) if isinstance(price_value, str) else None
+    details["preco_str"] = price_text
+    details["preco"] = float(price_value) if isinstance(price_value, (int, float)) else extract_price(price_text)
+
+    description = _first(ad, "body", "description")
+    details["descricao"] = _text(description) if isinstance(description, str) else None
+
+    location = ad.get("location") or {}
+    details["local_bairro"] = _text(_first(location, "neighbourhood", "neighborhood"))
+    city_state_cep = [_first(location, "municipality", "city"), _first(location, "uf", "state"), _first(location, "zipcode", "cep")]
+    details["local_cidade_estado_cep"] = ", ".join(str(part) for part in city_state_cep if part) or None
+
+    list_time = _first(ad, "listTime", "origListTime", "date")
+    details["data_publicacao"] = normalize_publication_date(list_time, ad_url) # Mesmo formato ISO do caminho por seletores
+
+    user = ad.get("user") or {}
+    seller_name = _first(user, "name") if isinstance(user, dict) else None
+    details["nome_vendedor"] = _text(seller_name or ad.get("sellerName"))
+
+    # Mesmas chaves (labels em minúsculas) e conversões da seção de detalhes do caminho por seletores
+    for prop in ad.get("properties") or []:
+        if not isinstance(prop, dict):
+            continue
+        label_text = _text(_first(prop, "label", "name"))
+        label_text = label_text.lower() if label_text else None
+        value_text = _text(_first(prop, "value"))
+        if label_text and value_text:
+            details[label_text] = normalize_detail_value(label_text, value_text)
+
+    image_urls = [url for url in (_image_url(image) for image in ad.get("images") or []) if url]
+    details["imagem_principal_url"] = image_urls[0] if image_urls else None
+    details["imagens_urls"] = " ".join(image_urls) or None # Separadas por espaço, para caber em uma célula do CSV/XLSX
+
+    logging.info(f"Detalhes extraídos (JSON embutido) para: {(details.get('titulo') or ad_url)[:50]}...", extra={"url": ad_url, "stage": "extract"})
+    return details
@@ -0,0 +1,219 @@
+import logging
+from bs4 import BeautifulSoup
+from urllib.parse import urljoin
+
+from .config import (
+    BASE_URL_OLX,
+    SELECTORS_LISTING_PAGE,
+    SELECTORS_AD_PAGE,
+    PARSER_BACKEND,
+    USE_EMBEDDED_JSON
+)
+from . import embedded_json, metrics
+from .records import as_record
+if PARSER_BACKEND == "lxml":
+    from . import lxml_extractor
+from .utils import clean_text, extract_price, normalize_detail_value, normalize_publication_date, listing_card_details
+
+# Funções de parsing e extração, sem dependência da camada de rede (scraper.py).
+# Podem ser importadas isoladamente, por exemplo pelos processos do parse_pool.
+
+def parse_page(content):
+    """Parseia o HTML com o backend configurado em PARSER_BACKEND: BeautifulSoup ('bs4') ou árvore lxml ('lxml')."""
+    with metrics.timer("olx_parse_duration_seconds", backend=PARSER_BACKEND):
+        if PARSER_BACKEND == "lxml":
+            return lxml_extractor.parse_document(content)
+        return BeautifulSoup(content, 'lxml')
+
+def extract_ad_links_from_listing_page(soup):
+    """Extrai os links dos anúncios de uma página de listagem."""
+    if PARSER_BACKEND == "lxml":
+        return lxml_extractor.extract_ad_links_from_listing_page(soup)
+    ad_links = []
+    if not soup:
+        return ad_links
+
+    # ATENÇÃO: VERIFIQUE O SELETOR 'ad_card' EM config.py!
+    ad_cards = soup.select(SELECTORS_LISTING_PAGE["ad_card"])
+    metrics.record_selector("listing", "ad_card", ad_cards)
+    if not ad_cards:
+        logging.warning(f"Nenhum card de anúncio encontrado com o seletor '{SELECTORS_LISTING_PAGE['ad_card']}'. Verifique o seletor e a página HTML.", extra={"stage": "listing", "selector": "ad_card"})
+        # Logar um trecho do HTML pode ajudar a depurar:
+        # logging.debug(f"HTML da página de listagem (início): {soup.prettify()[:2000]}")
+        return ad_links
+
+    for card_index, card in enumerate(ad_cards):
+        # ATENÇÃO: VERIFIQUE O SELETOR 'ad_link' EM config.py!
+        link_tag = card.select_one(SELECTORS_LISTING_PAGE["ad_link"])
+        metrics.record_selector("listing", "ad_link", link_tag is not None and link_tag.has_attr('href'))
+        if link_tag and link_tag.has_attr('href'):
+            ad_url = urljoin(BASE_URL_OLX, link_tag['href'])
+            ad_links.append(ad_url)
+        else:
+            logging.warning(f"Link do anúncio não encontrado no card #{card_index + 1} usando o seletor '{SELECTORS_LISTING_PAGE['ad_link']}'.", extra={"stage": "listing", "selector": "ad_link"})
+    logging.info(f"{len(ad_links)} links de anúncios extraídos desta página.")
+    return ad_links
+
+def _card_text(card, key):
+    tag = card.select_one(SELECTORS_LISTING_PAGE[key])
+    metrics.record_selector("listing", key, tag is not None)
+    return tag.get_text() if tag else None
+
+def extract_ad_cards_from_listing_page(soup):
+    """
+    Extrai um anúncio de cada card da página de listagem (modo LISTING_CARD_MODE), com os seletores
+    'listing_*' de config.py: título, preço, localização, data, resumo dos detalhes e imagem.
+    Cards sem link são ignorados, como em extract_ad_links_from_listing_page.
+    """
+    if PARSER_BACKEND == "lxml":
+        return lxml_extractor.extract_ad_cards_from_listing_page(soup)
+    ads = []
+    if not soup:
+        return ads
+
+    ad_cards = soup.select(SELECTORS_LISTING_PAGE["ad_card"])
+    metrics.record_selector("listing", "ad_card", ad_cards)
+    if not ad_cards:
+        logging.warning(f"Nenhum card de anúncio encontrado com o seletor '{SELECTORS_LISTING_PAGE['ad_card']}'. Verifique o seletor e a página HTML.", extra={"stage": "listing", "selector": "ad_card"})
+        return ads
+
+    for card_index, card in enumerate(ad_cards):
+        link_tag = card.select_one(SELECTORS_LISTING_PAGE["ad_link"])
+        metrics.record_selector("listing", "ad_link", link_tag is not None and link_tag.has_attr('href'))
+        if not (link_tag and link_tag.has_attr('href')):
+            logging.warning(f"Link do anúncio não encontrado no card #{card_index + 1} usando o seletor '{SELECTORS_LISTING_PAGE['ad_link']}'.", extra={"stage": "listing", "selector": "ad_link"})
+            continue
+
+        summary_tag = card.select_one(SELECTORS_LISTING_PAGE["listing_details_summary"])
+        metrics.record_selector("listing", "listing_details_summary", summary_tag is not None)
+        detail_texts = [item.get_text() for item in summary_tag.select(SELECTORS_LISTING_PAGE["listing_detail_item"])] if summary_tag else []
+
+        image_tag = card.select_one(SELECTORS_LISTING_PAGE["listing_image_url"])
+        metrics.record_selector("listing", "listing_image_url", image_tag is not None)
+        image_url = (image_tag.get('src') or image_tag.get('data-src')) if image_tag else None
+
+        ads.append(as_record(listing_card_details(
+            urljoin(BASE_URL_OLX, link_tag['href']),
+            _card_text(card, "listing_title"),
+            _card_text(card, "listing_price"),
+            _card_text(card, "listing_location"),
+            _card_text(card, "listing_date"),
+            detail_texts,
+            image_url,
+        )))
+    logging.info(f"{len(ads)} anúncios extraídos dos cards desta página.")
+    return ads
+
+def extract_ad_details(ad_url, soup):
+    """Extrai os detalhes de uma página de anúncio individual usando os seletores fornecidos."""
+    if PARSER_BACKEND == "lxml":
+        return lxml_extractor.extract_ad_details(ad_url, soup)
+    details = {"url_anuncio": ad_url}
+    if not soup:
+        logging.warning(f"Não foi possível parsear a página do anúncio (soup vazio): {ad_url}", extra={"url": ad_url, "stage": "parse"})
+        return details
+
+    # Título
+    title_tag = soup.select_one(SELECTORS_AD_PAGE["title"])
+    metrics.record_selector("ad", "title", title_tag is not None)
+    details["titulo"] = clean_text(title_tag.get_text()) if title_tag else None
+
+    # Preço
+    price_tag = soup.select_one(SELECTORS_AD_PAGE["price"])
+    metrics.record_selector("ad", "price", price_tag is not None)
+    price_text = clean_text(price_tag.get_text()) if price_tag else None
+    details["preco_str"] = price_text # Salva o texto original do preço
+    details["preco"] = extract_price(price_text)
+
+    # Descrição
+    description_tag = soup.select_one(SELECTORS_AD_PAGE["description"])
+    metrics.record_selector("ad", "description", description_tag is not None)
+    details["descricao"] = clean_text(description_tag.get_text(separator=' ', strip=True)) if description_tag else None
+
+    # Localização (Bairro e Cidade/Estado/CEP separados)
+    loc_neighborhood_tag = soup.select_one(SELECTORS_AD_PAGE["location_neighborhood"])
+    metrics.record_selector("ad", "location_neighborhood", loc_neighborhood_tag is not None)
+    details["local_bairro"] = clean_text(loc_neighborhood_tag.get_text()) if loc_neighborhood_tag else None
+
+    loc_city_state_cep_tag = soup.select_one(SELECTORS_AD_PAGE["location_city_state_cep"])
+    metrics.record_selector("ad", "location_city_state_cep", loc_city_state_cep_tag is not None)
+    details["local_cidade_estado_cep"] = clean_text(loc_city_state_cep_tag.get_text()) if loc_city_state_cep_tag else None
+
+    # Data de Publicação
+    date_posted_tag = soup.select_one(SELECTORS_AD_PAGE["date_posted"])
+    metrics.record_selector("ad", "date_posted", date_posted_tag is not None)
+    details["data_publicacao"] = normalize_publication_date(clean_text(date_posted_tag.get_text()), ad_url) if date_posted_tag else None
+    
+    # Nome do Vendedor
+    seller_name_tag = soup.select_one(SELECTORS_AD_PAGE["seller_name"])
+    metrics.record_selector("ad", "seller_name", seller_name_tag is not None)
+    details["nome_vendedor"] = clean_text(seller_name_tag.get_text()) if seller_name_tag else None
+
+    # Extração de Detalhes da Seção 'details_section_container'
+    details_extracted_from_section = {}
+    details_section_el = soup.select_one(SELECTORS_AD_PAGE["details_section_container"])
+    metrics.record_selector("ad", "details_section_container", details_section_el is not None)
+    if details_section_el:
+        item_containers = details_section_el.select(SELECTORS_AD_PAGE["detail_item_container"])
+        metrics.record_selector("ad", "detail_item_container", item_containers)
+        if not item_containers:
+            logging.warning(f"Nenhum 'detail_item_container' encontrado dentro de 'details_section_container' para {ad_url} usando seletor '{SELECTORS_AD_PAGE['detail_item_container']}'", extra={"url": ad_url, "stage": "extract", "selector": "detail_item_container"})
+
+        for item_container in item_containers:
+            label_tag = item_container.select_one(SELECTORS_AD_PAGE["detail_item_label_relative"])
+            metrics.record_selector("ad", "detail_item_label_relative", label_tag is not None)
+            label_text = clean_text(label_tag.get_text().lower()) if label_tag else None # Label em minúsculas para chave
+
+            if label_text:
+                value_text = None
+                # Tenta cada seletor para o valor
+                for value_selector in SELECTORS_AD_PAGE["detail_item_value_relative"]:
+                    value_tag = item_container.select_one(value_selector)
+                    if value_tag:
+                        value_text = clean_text(value_tag.get_text())
+                        break # Para no primeiro seletor de valor que funcionar
+                metrics.record_selector("ad", "detail_item_value_relative", value_text)
+
+                if value_text:
+                    # Tenta converter para número se for um campo numérico conhecido
+                    details_extracted_from_section[label_text] = normalize_detail_value(label_text, value_text)
+                else:
+                    logging.warning(f"Valor não encontrado para a label '{label_text}' no anúncio {ad_url} usando seletores '{SELECTORS_AD_PAGE['detail_item_value_relative']}'", extra={"url": ad_url, "stage": "extract", "selector": "detail_item_value_relative"})
+            else:
+                logging.warning(f"Label não encontrada em 'detail_item_container' no anúncio {ad_url} usando seletor '{SELECTORS_AD_PAGE['detail_item_label_relative']}'", extra={"url": ad_url, "stage": "extract", "selector": "detail_item_label_relative"})
+        details.update(details_extracted_from_section) # Adiciona os detalhes extraídos ao dict principal
+    else:
+        logging.warning(f"Seção de detalhes ('{SELECTORS_AD_PAGE['details_section_container']}') não encontrada para o anúncio: {ad_url}", extra={"url": ad_url, "stage": "extract", "selector": "details_section_container"})
+
+    # Imagens: todas as da galeria (dentro de 'image_gallery_container', ou na página inteira se o container não as tiver)
+    gallery_tag = soup.select_one(SELECTORS_AD_PAGE["image_gallery_container"])
+    metrics.record_selector("ad", "image_gallery_container", gallery_tag is not None)
+    image_tags = (gallery_tag.select(SELECTORS_AD_PAGE["image_in_gallery"]) if gallery_tag else []) or soup.select(SELECTORS_AD_PAGE["image_in_gallery"])
+    metrics.record_selector("ad", "image_in_gallery", image_tags)
+    if image_tags:
+        details["imagem_principal_url"] = image_tags[0].get('src') or image_tags[0].get('data-src')
+        image_urls = dict.fromkeys(tag.get('src') or tag.get('data-src') for tag in image_tags)
+        details["imagens_urls"] = " ".join(url for url in image_urls if url) or None # Separadas por espaço, como no JSON embutido
+    else:
+        details["imagem_principal_url"] = None
+        logging.warning(f"Nenhuma imagem encontrada com seletor '{SELECTORS_AD_PAGE['image_in_gallery']}' para {ad_url}", extra={"url": ad_url, "stage": "extract", "selector": "image_in_gallery"})
+
+
+    logging.info(f"Detalhes extraídos para: {(details.get('titulo') or ad_url)[:50]}...", extra={"url": ad_url, "stage": "extract"}) # Log do título truncado
+    return details
+
+def extract_ad_record(ad_url, content):
+    """
+    Extrai os detalhes de um anúncio a partir do HTML bruto.
+    Com USE_EMBEDDED_JSON, tenta primeiro o JSON embutido na página (sem parsear o HTML);
+    os seletores só são usados quando o blob não existe.
+    """
+    if USE_EMBEDDED_JSON:
+        with metrics.timer("olx_extract_duration_seconds", method="embedded_json"):
+            details = embedded_json.extract_ad_details(ad_url, content)
+        if details is not None:
+            return as_record(details)
+        logging.info(f"JSON embutido não encontrado em {ad_url}; usando os seletores.", extra={"url": ad_url, "stage": "extract"})
+    soup = parse_page(content)
+    with metrics.timer("olx_extract_duration_seconds", method="selectors"):
+        return as_record(extract_ad_details(ad_url, soup))
@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+# Parâmetros de rastreamento que não mudam o conteúdo da página e não devem separar entradas do cache
+_IGNORED_QUERY_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "lis", "gclid", "fbclid"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url):
+    """
+    Normaliza uma URL para servir de chave do cache: esquema e host em minúsculas,
+    sem porta padrão, sem fragmento, sem parâmetros de rastreamento e com a query ordenada.
+    """
+    parsed = urlparse(url)
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if parsed.port and parsed.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parsed.port}"
+    query_params = sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in _IGNORED_QUERY_PARAMS
+    )
+    path = parsed.path or "/"
+    return parsed._replace(scheme=scheme, netloc=host, path=path, query=urlencode(query_params), fragment="").geturl()
+
+
+class CacheEntry:
+    """Metadados de uma resposta guardada no cache."""
+
+    __slots__ = ("key", "url", "kind", "filename", "size", "etag", "last_modified", "stored_at")
+
+    def __init__(self, key, url, kind, filename, size, etag, last_modified, stored_at):
+        self.key = key
+        self.url = url
+        self.kind = kind
+        self.filename = filename
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+
+class HttpCache:
+    """
+    Cache em disco das respostas HTTP.
+    Os corpos ficam comprimidos (zlib) em arquivos nomeados pelo hash da URL canônica e
+    os metadados (validadores, datas de acesso) em um índice SQLite, usado para o controle
+    de validade por tipo de página e para a remoção LRU quando o limite de bytes é atingido.
+    """
+
+    def __init__(self, folder, max_bytes, ttl_seconds_by_kind):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl_seconds_by_kind = ttl_seconds_by_kind
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(folder, "index.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _path(self, filename):
+        return os.path.join(self.folder, filename[:2], filename)
+
+    def lookup(self, url):
+        """Retorna a CacheEntry da URL (fresca ou não) ou None se não estiver no cache."""
+        key = hashlib.sha256(canonicalize_url(url).encode("utf-8")).hexdigest()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT key, url, kind, filename, size, etag, last_modified, stored_at FROM entries WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if not row:
+            return None
+        entry = CacheEntry(*row)
+        if not os.path.exists(self._path(entry.filename)):
+            self._delete(entry.key)
+            return None
+        return entry
+
+    def is_fresh(self, entry, kind):
+        ttl = self.ttl_seconds_by_kind.get(kind, 0)
+        return (time.time() - entry.stored_at) < ttl
+
+    def read(self, entry):
+        """Lê e descomprime o corpo guardado, atualizando o último acesso (para a política LRU)."""
+        with open(self._path(entry.filename), "rb") as f:
+            body = zlib.decompress(f.read())
+        with self._lock:
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), entry.key))
+            self._db.commit()
+        return body
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Cabeçalhos de revalidação (If-None-Match / If-Modified-Since) para uma entrada vencida."""
+        headers = {}
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def refresh(self, entry, response_headers):
+        """Renova a validade de uma entrada após uma resposta 304 (Not Modified)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE entries SET stored_at = ?, last_access = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (now, now, response_headers.get("ETag"), response_headers.get("Last-Modified"), entry.key),
+            )
+            self._db.commit()
+
+    def store(self, url, kind, body, response_headers):
+        """Guarda o corpo de uma resposta 200 e remove as entradas menos usadas se o limite for ultrapassado."""
+        canonical_url = canonicalize_url(url)
+        key = hashlib.sha256(canonical_url.encode("utf-8")).hexdigest()
+        compressed = zlib.compress(body, 6)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp_path, path) # Escrita atômica: leitores nunca veem um arquivo pela metade
+
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries (key, url, kind, filename, size, etag, last_modified, stored_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, canonical_url, kind, key, len(compressed), response_headers.get("ETag"), response_headers.get("Last-Modified"), now, now),
+            )
+            self._db.commit()
+            self._total_bytes += len(compressed) - (previous[0] if previous else 0)
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _delete(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._db.commit()
+            if row:
+                self._total_bytes -= row[0]
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        """Remove as entradas acessadas há mais tempo até ficar abaixo de 90% do limite."""
+        target = self.max_bytes * 0.9
+        with self._lock:
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall()
+        removed = 0
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            self._delete(key)
+            removed += 1
+        logging.info(f"Cache HTTP: {removed} entradas removidas (LRU). Tamanho atual: {self._total_bytes / 1_048_576:.1f} MB.")
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def record_revalidated(self):
+        with self._lock:
+            self.revalidated += 1
+
+    def summary(self):
+        return (
+            f"Cache HTTP: {self.hits} acertos, {self.revalidated} revalidados (304), {self.misses} downloads. "
+            f"Tamanho em disco: {self._total_bytes / 1_048_576:.1f} MB."
+        )
@@ -0,0 +1,198 @@
+"""
+Etapa opcional de download das imagens dos anúncios (IMAGES_ENABLED).
+
+- Todas as imagens da galeria de cada anúncio ('imagens_urls', ou 'imagem_principal_url' na falta dela) são
+  baixadas em paralelo, com um rate limiter próprio (o CDN de imagens não divide o limite com as páginas).
+- O armazenamento é endereçado pelo conteúdo: cada arquivo é gravado como <sha256>.<extensão>, em subpastas
+  pelos primeiros caracteres do hash. A mesma foto em um anúncio republicado ocupa um único arquivo.
+- Um índice SQLite (url -> arquivo) evita baixar de novo uma URL já armazenada.
+- O download é feito em blocos direto para um arquivo temporário, calculando o hash no caminho; a memória
+  usada não depende do tamanho das imagens, e o número de anúncios aguardando downloads é limitado.
+A exportação recebe a coluna 'imagens_locais', com os caminhos dos arquivos separados por espaço.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .rate_limiter import HostRateLimiter
+
+_CHUNK_SIZE = 64 * 1024
+_DEFAULT_EXTENSION = ".img"
+
+
+def image_urls(ad_data):
+    """URLs das imagens de um anúncio, sem repetições: 'imagens_urls' (separadas por espaço) ou a imagem principal."""
+    urls = (ad_data.get("imagens_urls") or "").split() or [ad_data.get("imagem_principal_url")]
+    return [url for url in dict.fromkeys(urls) if url]
+
+
+def _extension(url, content_type):
+    extension = os.path.splitext(urlparse(url).path)[1].lower()
+    if extension in (".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"):
+        return extension
+    guessed = mimetypes.guess_extension((content_type or "").split(";")[0].strip())
+    return guessed or _DEFAULT_EXTENSION
+
+
+class ImageStore:
+    """Arquivos de imagem endereçados pelo sha256 do conteúdo, com um índice url -> caminho em SQLite."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._temp_folder = os.path.join(folder, ".tmp")
+        os.makedirs(self._temp_folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(folder, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS images (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, path TEXT NOT NULL, size INTEGER)")
+        self._db.commit()
+
+    def lookup(self, url):
+        """Caminho já armazenado para a URL (se o arquivo ainda existir), ou None."""
+        with self._lock:
+            row = self._db.execute("SELECT path FROM images WHERE url = ?", (url,)).fetchone()
+        if row and os.path.exists(os.path.join(self.folder, row[0])):
+            return os.path.join(self.folder, row[0])
+        return None
+
+    def temp_file(self):
+        """Arquivo temporário, na mesma partição do armazenamento (para o os.replace ser atômico)."""
+        return tempfile.NamedTemporaryFile(dir=self._temp_folder, delete=False)
+
+    def commit(self, url, temp_path, sha256, size, extension):
+        """
+        Move o arquivo baixado para <sha256><extensão>; se o mesmo conteúdo já existe, descarta o temporário.
+        Registra a URL no índice e retorna (caminho, True se o conteúdo já existia).
+        """
+        relative_path = os.path.join(sha256[:2], sha256[2:4], sha256 + extension)
+        final_path = os.path.join(self.folder, relative_path)
+        duplicate = os.path.exists(final_path)
+        if duplicate:
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(temp_path, final_path)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO images (url, sha256, path, size) VALUES (?, ?, ?, ?)", (url, sha256, relative_path, size))
+            self._db.commit()
+        return final_path, duplicate
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class ImageDownloader:
+    """
+    Baixa as imagens dos anúncios em 'workers' threads, respeitando 'rate' requisições por segundo por host.
+    'process(ads)' é um gerador: devolve os anúncios na mesma ordem, cada um com a coluna 'imagens_locais',
+    mantendo no máximo 'max_pending_ads' anúncios aguardando os seus downloads.
+    """
+
+    def __init__(self, folder, workers=8, rate=5, burst=5, max_bytes=10 * 1024 * 1024, max_per_ad=None,
+                 max_pending_ads=50, headers=None, timeout=30):
+        self.store = ImageStore(folder)
+        self.rate_limiter = HostRateLimiter(rate, burst)
+        self.max_bytes = max_bytes
+        self.max_per_ad = max_per_ad
+        self.max_pending_ads = max(1, max_pending_ads)
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, workers))
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image-download")
+        self._in_progress = {} # url -> Future, para não baixar a mesma URL duas vezes ao mesmo tempo
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def _download(self, url):
+        """Baixa uma imagem para o armazenamento. Retorna o caminho local ou None em caso de falha."""
+        self.rate_limiter.acquire(url)
+        temp_file = self.store.temp_file()
+        try:
+            with temp_file, self._session.get(url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                digest = hashlib.sha256()
+                size = 0
+                for chunk in response.iter_content(_CHUNK_SIZE):
+                    size += len(chunk)
+                    if self.max_bytes and size > self.max_bytes:
+                        raise ValueError(f"imagem maior que {self.max_bytes} bytes")
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                content_type = response.headers.get("Content-Type")
+            path, duplicate = self.store.commit(url, temp_file.name, digest.hexdigest(), size, _extension(url, content_type))
+        except (requests.exceptions.RequestException, ValueError, OSError) as e:
+            if os.path.exists(temp_file.name):
+                os.remove(temp_file.name)
+            metrics.inc("olx_image_downloads_total", result="failed")
+            logging.warning(f"Falha ao baixar a imagem {url}: {e}")
+            return None
+        metrics.inc("olx_image_downloads_total", result="duplicate" if duplicate else "downloaded")
+        metrics.inc("olx_image_bytes_total", 0 if duplicate else size)
+        return path
+
+    def _fetch(self, url):
+        try:
+            path = self.store.lookup(url)
+            if path:
+                metrics.inc("olx_image_downloads_total", result="cached")
+                return path
+            return self._download(url)
+        finally: # Em todos os caminhos, para o dicionário não crescer com as URLs já armazenadas
+            with self._lock:
+                self._in_progress.pop(url, None)
+
+    def submit(self, url):
+        """Future com o caminho local da imagem (reaproveita o download em andamento da mesma URL)."""
+        with self._lock:
+            future = self._in_progress.get(url)
+            if future is None:
+                future = self._in_progress[url] = self._executor.submit(self._fetch, url)
+            return future
+
+    def process(self, ads, skip_statuses=("removido",)):
+        """
+        Passa os anúncios pela etapa de imagens (gerador). Anúncios com 'status_alteracao' em 'skip_statuses'
+        seguem sem downloads.
+        """
+        window = deque()
+        for ad_data in ads:
+            urls = [] if ad_data.get("status_alteracao") in skip_statuses else image_urls(ad_data)
+            if self.max_per_ad:
+                urls = urls[: self.max_per_ad]
+            window.append((ad_data, [self.submit(url) for url in urls]))
+            while window and (len(window) >= self.max_pending_ads or all(future.done() for future in window[0][1])):
+                yield self._attach(*window.popleft())
+        while window:
+            yield self._attach(*window.popleft())
+
+    @staticmethod
+    def _attach(ad_data, futures):
+        paths = [path for path in (future.result() for future in futures) if path]
+        ad_data["imagens_locais"] = " ".join(paths) or None # Separados por espaço, como 'imagens_urls'
+        return ad_data
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._session.close()
+        self.store.close()
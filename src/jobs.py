@@ -0,0 +1,215 @@
+"""
+Modo job: coleta várias buscas da OLX (estados, cidades, categorias) de uma vez, dividida em shards.
+
+Cada busca é fatiada em shards de JOB_PAGES_PER_SHARD páginas de listagem (parâmetro 'o', o mesmo
+que get_next_page_url usa). Os shards ficam em uma fila compartilhada (work_queue.py); workers em um
+ou vários processos, e em uma ou várias máquinas, alugam shards, coletam os anúncios e gravam os
+resultados na própria fila. Um anúncio que aparece em buscas sobrepostas é baixado uma única vez.
+No final, export_job_results junta tudo em uma única exportação.
+"""
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs, urlencode
+
+from .config import (
+    MAX_CONCURRENT_REQUESTS,
+    JOB_PAGES_PER_SHARD,
+    JOB_MAX_PAGES_PER_QUERY,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_SHARD_ATTEMPTS,
+    BASE_URL_OLX,
+    SESSION_WARMUP,
+    LISTING_CARD_MODE,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_DELAY_SECONDS,
+)
+from . import metrics, scraper
+from .adaptive import RetryableFetchError, backoff_delay
+from .extraction import extract_ad_links_from_listing_page, extract_ad_cards_from_listing_page
+from .log_setup import configure_worker_logging, worker_log_queue
+from .scraper import fetch_page_content, process_ad, resolve_listing_cards, get_session_pool
+from .work_queue import open_work_queue
+
+
+class ShardError(Exception):
+    """Falha ao coletar um shard (por exemplo, uma página de listagem que não pôde ser baixada)."""
+
+
+def listing_page_url(query_url, page):
+    """URL da página 'page' (1 = primeira) de uma busca, no mesmo formato do fallback de get_next_page_url."""
+    parsed_url = urlparse(query_url)
+    query_params = parse_qs(parsed_url.query)
+    query_params.pop('o', None)
+    if page > 1: # A primeira página da OLX não tem o parâmetro 'o'
+        query_params['o'] = [str(page)]
+    return parsed_url._replace(query=urlencode(query_params, doseq=True)).geturl()
+
+
+def build_shards(search_urls, pages_per_shard=JOB_PAGES_PER_SHARD, max_pages=JOB_MAX_PAGES_PER_QUERY):
+    """Divide cada busca em faixas de páginas: [(query_url, page_start, page_end), ...]."""
+    pages_per_shard = max(1, pages_per_shard)
+    shards = []
+    for query_url in search_urls:
+        for page_start in range(1, max_pages + 1, pages_per_shard):
+            shards.append((query_url, page_start, min(page_start + pages_per_shard - 1, max_pages)))
+    return shards
+
+
+def create_job(queue_location, search_urls, pages_per_shard=JOB_PAGES_PER_SHARD, max_pages=JOB_MAX_PAGES_PER_QUERY):
+    """Cadastra os shards das buscas na fila. Pode ser chamado de novo com mais buscas; shards repetidos são ignorados."""
+    work_queue = open_work_queue(queue_location, JOB_MAX_SHARD_ATTEMPTS)
+    try:
+        added = work_queue.add_shards(build_shards(search_urls, pages_per_shard, max_pages))
+        logging.info(f"{added} shards adicionados à fila '{queue_location}' ({len(search_urls)} busca(s), até {max_pages} páginas cada).")
+        return added
+    finally:
+        work_queue.close()
+
+
+def _fetch_ad(ad_link):
+    """Busca e extrai um anúncio, tentando de novo (com backoff) as falhas temporárias. Retorna o dict ou None."""
+    max_attempts = max(1, RETRY_MAX_ATTEMPTS) # Como em fetch_page_content: a primeira tentativa é sempre feita
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return process_ad(ad_link)
+        except RetryableFetchError as err:
+            if attempt == max_attempts:
+                logging.warning(f"Não foi possível obter/processar detalhes do anúncio: {ad_link} ({err.reason})", extra={"url": ad_link, "stage": "ad", "reason": err.reason})
+                return None
+            metrics.inc("olx_retries_total", reason=err.reason)
+            time.sleep(backoff_delay(attempt, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS, err.retry_after))
+        except Exception as e:
+            logging.error(f"Erro inesperado ao processar o anúncio {ad_link}: {e}", exc_info=True)
+            return None
+
+
+def crawl_shard(work_queue, shard, owner, executor):
+    """
+    Coleta as páginas de listagem do shard e os anúncios ainda não reservados por outro shard.
+    Retorna a lista [(ad_url, ad_data), ...]. Para na primeira página sem anúncios (fim da busca).
+    O limite de páginas do modo job é o de create_job (--max-pages / JOB_MAX_PAGES_PER_QUERY), já aplicado
+    na divisão em shards; MAX_PAGES_TO_SCRAPE vale só para a coleta normal.
+    Com LISTING_CARD_MODE, os anúncios saem dos cards e só os cards incompletos têm a página de detalhes buscada
+    (o histórico de mudanças só é consultado na exportação do job).
+    """
+    results = []
+    for page in range(shard.page_start, shard.page_end + 1):
+        page_url = listing_page_url(shard.query_url, page)
+        listing_soup = fetch_page_content(page_url, page_kind="listing")
+        if listing_soup is None:
+            raise ShardError(f"Falha ao obter a página de listagem {page_url}")
+        metrics.inc("olx_listing_pages_total", result="ok")
+
+        cards = extract_ad_cards_from_listing_page(listing_soup) if LISTING_CARD_MODE else None
+        ad_links = [card["url_anuncio"] for card in cards] if LISTING_CARD_MODE else extract_ad_links_from_listing_page(listing_soup)
+        if not ad_links:
+            logging.info(f"Nenhum anúncio em {page_url}; fim da busca neste shard.")
+            break
+        new_links = [ad_link for ad_link in dict.fromkeys(ad_links) if work_queue.claim_ad(ad_link, shard)]
+        logging.info(f"{shard}: página {page} com {len(ad_links)} anúncios, {len(new_links)} ainda não vistos.")
+        if LISTING_CARD_MODE:
+            new_links_set = set(new_links)
+            card_ads, new_links = resolve_listing_cards([card for card in cards if card["url_anuncio"] in new_links_set])
+            for ad_data in card_ads:
+                metrics.inc("olx_ads_total", result="ok")
+                results.append((ad_data["url_anuncio"], ad_data))
+
+        for ad_link, ad_data in zip(new_links, executor.map(_fetch_ad, new_links)):
+            metrics.inc("olx_ads_total", result="ok" if ad_data else "failed")
+            if ad_data:
+                results.append((ad_link, ad_data))
+            else:
+                work_queue.release_ad(ad_link)
+        work_queue.renew(shard, owner, JOB_LEASE_SECONDS) # Ainda vivo: mantém o aluguel do shard
+    return results
+
+
+def run_job_worker(queue_location, worker_name=None, stop_event=None):
+    """Aluga e coleta shards até a fila esvaziar (ou 'stop_event' ser sinalizado). Retorna o número de shards concluídos."""
+    owner = worker_name or f"{socket.gethostname()}-{os.getpid()}"
+    stop_event = stop_event or threading.Event()
+    work_queue = open_work_queue(queue_location, JOB_MAX_SHARD_ATTEMPTS)
+    completed = 0
+    if SESSION_WARMUP:
+        get_session_pool().warm_up(BASE_URL_OLX, scraper.rate_limiter.acquire)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, MAX_CONCURRENT_REQUESTS), thread_name_prefix="job-ad") as executor:
+            while not stop_event.is_set():
+                shard = work_queue.lease(owner, JOB_LEASE_SECONDS)
+                if shard is None:
+                    break
+                logging.info(f"[{owner}] Iniciando {shard} (tentativa {shard.attempts}).")
+                try:
+                    results = crawl_shard(work_queue, shard, owner, executor)
+                except Exception as e:
+                    status = work_queue.fail(shard, owner, e)
+                    if status is None:
+                        logging.warning(f"[{owner}] Falha no {shard}: {e}. O aluguel já havia vencido; o shard segue com outro worker.")
+                    else:
+                        logging.error(f"[{owner}] Falha no {shard}: {e}. Shard {'devolvido à fila' if status == 'pending' else 'descartado'}.")
+                    continue
+                if not work_queue.complete(shard, owner, results):
+                    logging.warning(f"[{owner}] O aluguel do {shard} venceu antes da conclusão; {len(results)} anúncios descartados (o shard segue com outro worker).")
+                    continue
+                completed += 1
+                logging.info(f"[{owner}] {shard} concluído com {len(results)} anúncios novos. Progresso: {work_queue.progress()}")
+    finally:
+        work_queue.close()
+        get_session_pool().save()
+    logging.info(f"[{owner}] Nenhum shard pendente. {completed} shard(s) concluído(s) por este worker.")
+    return completed
+
+
+def _job_worker_process(queue_location, worker_index, log_queue=None):
+    configure_worker_logging(log_queue) # Os registros seguem para o processo principal, que grava o log
+    run_job_worker(queue_location, f"{socket.gethostname()}-{os.getpid()}-w{worker_index}")
+
+
+def run_job_workers(queue_location, processes=1):
+    """Roda 'processes' workers nesta máquina (processos separados quando mais de um)."""
+    if processes <= 1:
+        return run_job_worker(queue_location)
+    context = multiprocessing.get_context("spawn") # Mesmo motivo do parse_pool: não herdar threads/locks do pai
+    workers = [
+        context.Process(target=_job_worker_process, args=(queue_location, index + 1, worker_log_queue()), name=f"job-worker-{index + 1}")
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    logging.info(f"{processes} processos de job finalizados.")
+
+
+def export_job_results(queue_location, exporter, change_tracker=None, only_changes=True, image_downloader=None):
+    """
+    Grava no 'exporter' (StreamingExporter) os anúncios de todos os shards concluídos. Retorna o progresso da fila.
+    Com 'change_tracker', os anúncios passam pelo histórico e só as mudanças são exportadas (ver ChangeTracker.track);
+    os removidos só são apurados se todos os shards terminaram com sucesso (sem pendentes, em andamento ou com falha),
+    pois os anúncios das páginas de um shard que falhou seriam dados como removidos.
+    Com 'image_downloader' (ImageDownloader), as imagens dos anúncios exportados são baixadas antes da gravação.
+    """
+    work_queue = open_work_queue(queue_location, JOB_MAX_SHARD_ATTEMPTS)
+    try:
+        progress = work_queue.progress()
+        ads = work_queue.iter_results()
+        if change_tracker is not None:
+            complete = not (progress.get("pending") or progress.get("leased") or progress.get("failed"))
+            ads = change_tracker.track(ads, only_changes, detect_removed=complete)
+        if image_downloader is not None:
+            ads = image_downloader.process(ads)
+        for ad_data in ads:
+            exporter.write(ad_data)
+    finally:
+        work_queue.close()
+    if progress.get("pending") or progress.get("leased"):
+        logging.warning(f"Exportação parcial: ainda há shards pendentes ou em andamento ({progress}).")
+    elif progress.get("failed"):
+        logging.warning(f"Exportação parcial: {progress['failed']} shard(s) falharam; anúncios removidos não foram apurados ({progress}).")
+    return progress
@@ -0,0 +1,199 @@
+"""
+Configuração dos logs da coleta.
+
+- As threads da coleta só montam o registro e o colocam em uma fila (QueueHandler); a formatação e a
+  escrita no arquivo e no terminal ficam com uma thread própria (QueueListener).
+- No arquivo (LOG_FORMAT = 'json'), cada evento é uma linha JSON com campos fixos, passados com 'extra':
+  url, stage (fetch, cache, listing, extract...), selector (chave de config.py), status, duration_ms, reason.
+- Avisos repetidos de um mesmo seletor são amostrados: as primeiras LOG_SAMPLE_FIRST ocorrências de cada
+  (stage, selector) vão para o log e as demais só são contadas, em um resumo periódico e no encerramento.
+- Processos filhos (parse_pool, workers do modo job) enviam os registros por uma fila multiprocessing
+  ao processo principal, onde passam pelos mesmos handlers e pela mesma amostragem.
+
+Uso:
+    setup_logging()                                        # no ponto de entrada (main.py)
+    logging.warning("...", extra={"url": url, "stage": "extract", "selector": "image_in_gallery"})
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+import time
+from datetime import datetime
+
+from .config import LOG_FILE, LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_FIRST, LOG_SAMPLE_SUMMARY_SECONDS
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Atributos passados em 'extra' que viram campos do JSON
+LOG_FIELDS = ("url", "stage", "selector", "status", "duration_ms", "reason", "count")
+
+_listener = None
+_sampler = None
+_worker_queue = None
+_worker_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro: ts, level, logger, thread, message e os campos de LOG_FIELDS presentes."""
+
+    def format(self, record):
+        event = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.processName != "MainProcess":
+            event["process"] = record.processName
+        for field in LOG_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                event[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event["exc"] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+class SelectorWarningSampler(logging.Filter):
+    """
+    Deixa passar só as 'first' primeiras ocorrências de cada aviso com o campo 'selector' (por stage e selector)
+    e conta as demais. A cada 'summary_seconds' (e em 'flush'), registra um resumo das ocorrências omitidas.
+    """
+
+    def __init__(self, first=5, summary_seconds=60):
+        super().__init__()
+        self.first = first
+        self.summary_seconds = summary_seconds
+        self._counts = {} # (stage, selector) -> [total, omitidas desde o último resumo]
+        self._lock = threading.Lock()
+        self._last_summary = time.monotonic()
+
+    def filter(self, record):
+        selector = getattr(record, "selector", None)
+        if selector is None or record.levelno < logging.WARNING or getattr(record, "count", None) is not None:
+            return True
+        key = (getattr(record, "stage", None), selector)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0, 0])
+            counts[0] += 1
+            keep = counts[0] <= self.first
+            if not keep:
+                counts[1] += 1
+            summary_due = time.monotonic() - self._last_summary >= self.summary_seconds
+        if summary_due:
+            self.flush()
+        return keep
+
+    def flush(self):
+        """Registra (fora do lock) um resumo para cada seletor com ocorrências omitidas desde o último resumo."""
+        with self._lock:
+            self._last_summary = time.monotonic()
+            pending = [(key, counts[0], counts[1]) for key, counts in self._counts.items() if counts[1]]
+            for key, _, _ in pending:
+                self._counts[key][1] = 0
+        for (stage, selector), total, omitted in pending:
+            logging.getLogger(__name__).warning(
+                f"Seletor '{selector}' ({stage}): {total} ocorrências até agora, {omitted} omitidas do log desde o último resumo.",
+                extra={"stage": stage, "selector": selector, "count": total},
+            )
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que guarda a mensagem final e o traceback já formatados, mas não a linha de log inteira:
+    cada handler do listener aplica o seu próprio formato (texto ou JSON) e os campos de 'extra' seguem no registro.
+    O registro é alterado no lugar, sem a cópia do QueueHandler padrão: este é o único handler do logger raiz.
+    """
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class _ForwardHandler(logging.Handler):
+    """Reencaminha os registros recebidos dos processos filhos aos handlers do processo principal."""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+def setup_logging(log_file=LOG_FILE, level=LOG_LEVEL, log_format=LOG_FORMAT, sample_first=LOG_SAMPLE_FIRST,
+                  sample_summary_seconds=LOG_SAMPLE_SUMMARY_SECONDS):
+    """Instala o QueueHandler no logger raiz e inicia o listener (arquivo + terminal). Chamadas repetidas não fazem nada."""
+    global _listener, _sampler
+    if _listener is not None:
+        return _listener
+
+    file_handler = logging.FileHandler(log_file, mode='a', encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    _sampler = SelectorWarningSampler(sample_first, sample_summary_seconds)
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(_sampler)
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    # Nenhum formato usa arquivo/linha de origem nem o PID: evita percorrer a pilha a cada registro
+    # (otimizações descritas no HOWTO do módulo logging)
+    logging._srcfile = None
+    logging.logProcesses = False
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def flush_sampled_warnings():
+    """Registra agora o resumo dos avisos amostrados (ex: ao fim de cada coleta do daemon)."""
+    if _sampler is not None:
+        _sampler.flush()
+
+
+def worker_log_queue():
+    """
+    Fila multiprocessing para os processos filhos (spawn) enviarem os seus registros ao processo principal
+    (ver configure_worker_logging), ou None se setup_logging não foi chamado neste processo.
+    """
+    global _worker_queue, _worker_listener
+    if _listener is None:
+        return None
+    if _worker_queue is None:
+        _worker_queue = multiprocessing.get_context("spawn").Queue()
+        _worker_listener = logging.handlers.QueueListener(_worker_queue, _ForwardHandler())
+        _worker_listener.start()
+    return _worker_queue
+
+
+def configure_worker_logging(log_queue, level=LOG_LEVEL):
+    """Em um processo filho: envia os registros para 'log_queue' (de worker_log_queue), se houver."""
+    root = logging.getLogger()
+    root.setLevel(level)
+    if log_queue is not None:
+        root.handlers = [_QueueHandler(log_queue)]
+
+
+def shutdown_logging():
+    """Registra o resumo dos avisos amostrados e espera a thread do listener gravar tudo o que está na fila."""
+    global _listener, _worker_listener
+    if _worker_listener is not None:
+        _worker_listener.stop()
+        _worker_listener = None
+    if _listener is not None:
+        flush_sampled_warnings()
+        _listener.stop()
+        logging.getLogger().handlers = list(_listener.handlers) # Registros posteriores são gravados diretamente
+        _listener = None
@@ -0,0 +1,225 @@
+"""
+Backend de extração baseado em lxml.html, alternativo ao BeautifulSoup.
+Todos os seletores CSS de config.py são convertidos para XPath e compilados uma única vez,
+na importação do módulo; cada página é parseada direto com o lxml, sem a árvore do BeautifulSoup.
+Produz exatamente o mesmo dict de detalhes que scraper.extract_ad_details.
+Ative com PARSER_BACKEND = "lxml" em config.py.
+"""
+import logging
+import re
+from urllib.parse import urljoin
+
+from cssselect import HTMLTranslator
+from lxml import etree, html as lxml_html
+
+from .config import BASE_URL_OLX, SELECTORS_LISTING_PAGE, SELECTORS_AD_PAGE
+from . import metrics
+from .records import as_record
+from .utils import clean_text, extract_price, normalize_detail_value, normalize_publication_date, listing_card_details
+
+_translator = HTMLTranslator()
+
+# Mesmos textos que o get_text() do BeautifulSoup considera: ignora comentários, <script>, <style> e <template>
+_TEXT_NODES = etree.XPath(".//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
+
+
+def compile_selector(css_selector):
+    """
+    Converte um seletor CSS em um XPath compilado.
+    O prefixo 'descendant::' reproduz o select() do BeautifulSoup, que busca apenas nos descendentes do elemento.
+    """
+    return etree.XPath(_translator.css_to_xpath(css_selector, prefix="descendant::"))
+
+
+def _compile_selectors(selectors):
+    compiled = {}
+    for key, css_selector in selectors.items():
+        if isinstance(css_selector, (list, tuple)):
+            compiled[key] = [compile_selector(s) for s in css_selector]
+        elif css_selector:
+            compiled[key] = compile_selector(css_selector)
+    return compiled
+
+
+LISTING_XPATHS = _compile_selectors(SELECTORS_LISTING_PAGE)
+AD_XPATHS = _compile_selectors(SELECTORS_AD_PAGE)
+
+
+# Sem <meta charset>, o libxml2 assume latin-1; as páginas da OLX são UTF-8 (o BeautifulSoup detecta isso sozinho)
+_META_CHARSET = re.compile(rb"<meta[^>]+charset", re.IGNORECASE)
+_UTF8_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+
+
+def parse_document(content):
+    """Parseia o HTML (bytes) e retorna a árvore do documento."""
+    parser = None if _META_CHARSET.search(content, 0, 4096) else _UTF8_PARSER
+    return lxml_html.document_fromstring(content, parser=parser).getroottree()
+
+
+def select_one(node, xpath):
+    matches = xpath(node)
+    return matches[0] if matches else None
+
+
+def get_text(element, separator="", strip=False):
+    """Equivalente ao Tag.get_text() do BeautifulSoup."""
+    texts = _TEXT_NODES(element)
+    if strip:
+        texts = [text.strip() for text in texts]
+        texts = [text for text in texts if text]
+    return separator.join(texts)
+
+
+def extract_ad_links_from_listing_page(tree):
+    """Extrai os links dos anúncios de uma página de listagem."""
+    ad_links = []
+    if tree is None:
+        return ad_links
+
+    ad_cards = LISTING_XPATHS["ad_card"](tree)
+    metrics.record_selector("listing", "ad_card", ad_cards)
+    if not ad_cards:
+        logging.warning(f"Nenhum card de anúncio encontrado com o seletor '{SELECTORS_LISTING_PAGE['ad_card']}'. Verifique o seletor e a página HTML.", extra={"stage": "listing", "selector": "ad_card"})
+        return ad_links
+
+    for card_index, card in enumerate(ad_cards):
+        link_tag = select_one(card, LISTING_XPATHS["ad_link"])
+        metrics.record_selector("listing", "ad_link", link_tag is not None and "href" in link_tag.attrib)
+        if link_tag is not None and "href" in link_tag.attrib:
+            ad_links.append(urljoin(BASE_URL_OLX, link_tag.get("href")))
+        else:
+            logging.warning(f"Link do anúncio não encontrado no card #{card_index + 1} usando o seletor '{SELECTORS_LISTING_PAGE['ad_link']}'.", extra={"stage": "listing", "selector": "ad_link"})
+    logging.info(f"{len(ad_links)} links de anúncios extraídos desta página.")
+    return ad_links
+
+
+def _card_text(card, key):
+    tag = select_one(card, LISTING_XPATHS[key])
+    metrics.record_selector("listing", key, tag is not None)
+    return get_text(tag) if tag is not None else None
+
+
+def extract_ad_cards_from_listing_page(tree):
+    """Extrai um anúncio de cada card da página de listagem (mesmos campos de extraction.extract_ad_cards_from_listing_page)."""
+    ads = []
+    if tree is None:
+        return ads
+
+    ad_cards = LISTING_XPATHS["ad_card"](tree)
+    metrics.record_selector("listing", "ad_card", ad_cards)
+    if not ad_cards:
+        logging.warning(f"Nenhum card de anúncio encontrado com o seletor '{SELECTORS_LISTING_PAGE['ad_card']}'. Verifique o seletor e a página HTML.", extra={"stage": "listing", "selector": "ad_card"})
+        return ads
+
+    for card_index, card in enumerate(ad_cards):
+        link_tag = select_one(card, LISTING_XPATHS["ad_link"])
+        metrics.record_selector("listing", "ad_link", link_tag is not None and "href" in link_tag.attrib)
+        if link_tag is None or "href" not in link_tag.attrib:
+            logging.warning(f"Link do anúncio não encontrado no card #{card_index + 1} usando o seletor '{SELECTORS_LISTING_PAGE['ad_link']}'.", extra={"stage": "listing", "selector": "ad_link"})
+            continue
+
+        summary_tag = select_one(card, LISTING_XPATHS["listing_details_summary"])
+        metrics.record_selector("listing", "listing_details_summary", summary_tag is not None)
+        detail_texts = [get_text(item) for item in LISTING_XPATHS["listing_detail_item"](summary_tag)] if summary_tag is not None else []
+
+        image_tag = select_one(card, LISTING_XPATHS["listing_image_url"])
+        metrics.record_selector("listing", "listing_image_url", image_tag is not None)
+        image_url = (image_tag.get("src") or image_tag.get("data-src")) if image_tag is not None else None
+
+        ads.append(as_record(listing_card_details(
+            urljoin(BASE_URL_OLX, link_tag.get("href")),
+            _card_text(card, "listing_title"),
+            _card_text(card, "listing_price"),
+            _card_text(card, "listing_location"),
+            _card_text(card, "listing_date"),
+            detail_texts,
+            image_url,
+        )))
+    logging.info(f"{len(ads)} anúncios extraídos dos cards desta página.")
+    return ads
+
+
+def find_next_page_href(tree):
+    """Retorna o href do link de próxima página (seletor 'next_page_link'), ou None."""
+    xpath = LISTING_XPATHS.get("next_page_link")
+    if xpath is None or tree is None:
+        return None
+    next_page_tag = select_one(tree, xpath)
+    if next_page_tag is not None and "href" in next_page_tag.attrib:
+        return next_page_tag.get("href")
+    return None
+
+
+def _text_of(tree, key, **get_text_kwargs):
+    tag = select_one(tree, AD_XPATHS[key])
+    metrics.record_selector("ad", key, tag is not None)
+    return clean_text(get_text(tag, **get_text_kwargs)) if tag is not None else None
+
+
+def extract_ad_details(ad_url, tree):
+    """Extrai os detalhes de uma página de anúncio individual usando os seletores pré-compilados."""
+    details = {"url_anuncio": ad_url}
+    if tree is None:
+        logging.warning(f"Não foi possível parsear a página do anúncio (documento vazio): {ad_url}", extra={"url": ad_url, "stage": "parse"})
+        return details
+
+    details["titulo"] = _text_of(tree, "title")
+
+    price_text = _text_of(tree, "price")
+    details["preco_str"] = price_text # Salva o texto original do preço
+    details["preco"] = extract_price(price_text)
+
+    details["descricao"] = _text_of(tree, "description", separator=" ", strip=True)
+    details["local_bairro"] = _text_of(tree, "location_neighborhood")
+    details["local_cidade_estado_cep"] = _text_of(tree, "location_city_state_cep")
+    details["data_publicacao"] = normalize_publication_date(_text_of(tree, "date_posted"), ad_url)
+    details["nome_vendedor"] = _text_of(tree, "seller_name")
+
+    # Extração de Detalhes da Seção 'details_section_container'
+    details_extracted_from_section = {}
+    details_section_el = select_one(tree, AD_XPATHS["details_section_container"])
+    metrics.record_selector("ad", "details_section_container", details_section_el is not None)
+    if details_section_el is not None:
+        item_containers = AD_XPATHS["detail_item_container"](details_section_el)
+        metrics.record_selector("ad", "detail_item_container", item_containers)
+        if not item_containers:
+            logging.warning(f"Nenhum 'detail_item_container' encontrado dentro de 'details_section_container' para {ad_url} usando seletor '{SELECTORS_AD_PAGE['detail_item_container']}'", extra={"url": ad_url, "stage": "extract", "selector": "detail_item_container"})
+
+        for item_container in item_containers:
+            label_tag = select_one(item_container, AD_XPATHS["detail_item_label_relative"])
+            metrics.record_selector("ad", "detail_item_label_relative", label_tag is not None)
+            label_text = clean_text(get_text(label_tag).lower()) if label_tag is not None else None # Label em minúsculas para chave
+
+            if label_text:
+                value_text = None
+                for value_xpath in AD_XPATHS["detail_item_value_relative"]:
+                    value_tag = select_one(item_container, value_xpath)
+                    if value_tag is not None:
+                        value_text = clean_text(get_text(value_tag))
+                        break # Para no primeiro seletor de valor que funcionar
+                metrics.record_selector("ad", "detail_item_value_relative", value_text)
+
+                if value_text:
+                    details_extracted_from_section[label_text] = normalize_detail_value(label_text, value_text)
+                else:
+                    logging.warning(f"Valor não encontrado para a label '{label_text}' no anúncio {ad_url} usando seletores '{SELECTORS_AD_PAGE['detail_item_value_relative']}'", extra={"url": ad_url, "stage": "extract", "selector": "detail_item_value_relative"})
+            else:
+                logging.warning(f"Label não encontrada em 'detail_item_container' no anúncio {ad_url} usando seletor '{SELECTORS_AD_PAGE['detail_item_label_relative']}'", extra={"url": ad_url, "stage": "extract", "selector": "detail_item_label_relative"})
+        details.update(details_extracted_from_section)
+    else:
+        logging.warning(f"Seção de detalhes ('{SELECTORS_AD_PAGE['details_section_container']}') não encontrada para o anúncio: {ad_url}", extra={"url": ad_url, "stage": "extract", "selector": "details_section_container"})
+
+    gallery_tag = select_one(tree, AD_XPATHS["image_gallery_container"])
+    metrics.record_selector("ad", "image_gallery_container", gallery_tag is not None)
+    image_tags = (AD_XPATHS["image_in_gallery"](gallery_tag) if gallery_tag is not None else []) or AD_XPATHS["image_in_gallery"](tree)
+    metrics.record_selector("ad", "image_in_gallery", image_tags)
+    if image_tags:
+        details["imagem_principal_url"] = image_tags[0].get("src") or image_tags[0].get("data-src")
+        image_urls = dict.fromkeys(tag.get("src") or tag.get("data-src") for tag in image_tags)
+        details["imagens_urls"] = " ".join(url for url in image_urls if url) or None
+    else:
+        details["imagem_principal_url"] = None
+        logging.warning(f"Nenhuma imagem encontrada com seletor '{SELECTORS_AD_PAGE['image_in_gallery']}' para {ad_url}", extra={"url": ad_url, "stage": "extract", "selector": "image_in_gallery"})
+
+    logging.info(f"Detalhes extraídos para: {(details.get('titulo') or ad_url)[:50]}...", extra={"url": ad_url, "stage": "extract"})
+    return details
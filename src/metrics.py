@@ -0,0 +1,309 @@
+"""
+Métricas internas da coleta: contadores, gauges e histogramas com labels, guardados em memória.
+Expostas em formato texto do Prometheus por um endpoint HTTP local (METRICS_PORT) e
+resumidas em um JSON gravado ao lado das exportações.
+
+Uso nos pontos instrumentados:
+    metrics.inc("olx_ads_total", result="ok")
+    metrics.observe("olx_parse_duration_seconds", elapsed, backend="lxml")
+    with metrics.timer("olx_extract_duration_seconds", method="selectors"):
+        ...
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites superiores (em segundos) dos buckets dos histogramas
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Descrição de cada métrica (linha # HELP do Prometheus); métricas sem entrada aqui também são aceitas
+METRIC_HELP = {
+    "olx_fetch_duration_seconds": "Duração das requisições HTTP, por tipo de página e status.",
+    "olx_downloaded_bytes_total": "Bytes de HTML baixados, por tipo de página.",
+    "olx_rate_limit_sleep_seconds_total": "Tempo total esperando o rate limiter.",
+    "olx_http_cache_requests_total": "Consultas ao cache HTTP, por resultado.",
+    "olx_blocked_responses_total": "Páginas de bloqueio/desafio do Cloudflare recebidas.",
+    "olx_parse_duration_seconds": "Duração do parsing do HTML, por backend.",
+    "olx_extract_duration_seconds": "Duração da extração dos detalhes de um anúncio, por método.",
+    "olx_selector_lookups_total": "Buscas dos seletores de config.py, por página, chave e resultado.",
+    "olx_listing_pages_total": "Páginas de listagem processadas.",
+    "olx_listing_cards_total": "Cards da listagem no modo LISTING_CARD_MODE, por resultado (anúncio tirado do card ou página de detalhes buscada).",
+    "olx_ads_total": "Anúncios processados, por resultado.",
+    "olx_image_downloads_total": "Imagens de anúncios processadas, por resultado (baixada, conteúdo duplicado, já armazenada, falha).",
+    "olx_image_bytes_total": "Bytes de imagens novas gravados no armazenamento.",
+    "olx_export_duration_seconds": "Duração das gravações da exportação, por etapa.",
+    "olx_retries_total": "URLs reagendadas após uma falha temporária, por motivo.",
+    "olx_adaptive_rate": "Limite atual de requisições por segundo definido pelo controle adaptativo, por host.",
+    "olx_adaptive_concurrency": "Limite atual de requisições simultâneas definido pelo controle adaptativo.",
+    "olx_session_evictions_total": "Sessões do cloudscraper descartadas e substituídas, por motivo.",
+}
+
+
+def _series_key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape_label_value(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """
+    Registro thread-safe de contadores, gauges e histogramas.
+    Cada série é identificada por (nome, labels). 'drain()' devolve e zera as séries, para que
+    os processos do parse_pool enviem o que mediram ao processo principal, que as soma com 'merge()'.
+    'start_run()' marca o início de uma coleta: o endpoint do Prometheus segue com os totais acumulados do
+    processo, e 'summary()' (o JSON de cada coleta, com ads_per_second) descreve só o que foi medido desde então.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.started_at = time.time()
+        self.run_started_at = self.started_at
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {} # série -> [contagens por bucket (+Inf no final), soma, total]
+        self._run_baseline = None # Snapshot no início da coleta atual (start_run)
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = _series_key(name, labels)
+        bucket_index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bucket_index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def timer(self, name, **labels):
+        """Context manager que observa a duração do bloco no histograma 'name'."""
+        return _Timer(self, name, labels)
+
+    def snapshot(self):
+        """Cópia (serializável com pickle) de todas as séries."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": {key: [list(counts), total, count] for key, (counts, total, count) in self._histograms.items()},
+            }
+
+    def drain(self):
+        """Devolve as séries acumuladas e zera o registro."""
+        with self._lock:
+            snapshot = {"counters": self._counters, "gauges": self._gauges, "histograms": self._histograms}
+            self._counters = {}
+            self._gauges = {}
+            self._histograms = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Soma ao registro as séries de um snapshot (por exemplo, vindo de outro processo)."""
+        if not snapshot:
+            return
+        with self._lock:
+            for key, value in snapshot["counters"].items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            self._gauges.update(snapshot.get("gauges", {}))
+            for key, (counts, total, count) in snapshot["histograms"].items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = [list(counts), total, count]
+                    continue
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+                histogram[2] += count
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self._run_baseline = None
+            self.started_at = self.run_started_at = time.time()
+
+    def start_run(self):
+        """Início de uma coleta (ex: cada execução do daemon): summary() passa a contar a partir daqui."""
+        baseline = self.snapshot()
+        with self._lock:
+            self._run_baseline = baseline
+            self.run_started_at = time.time()
+
+    def run_snapshot(self):
+        """Como snapshot(), mas com contadores e histogramas só da coleta atual (desde start_run); gauges com o valor atual."""
+        snapshot = self.snapshot()
+        baseline = self._run_baseline
+        if baseline is None:
+            return snapshot
+        counters = {}
+        for key, value in snapshot["counters"].items():
+            delta = value - baseline["counters"].get(key, 0)
+            if delta:
+                counters[key] = delta
+        histograms = {}
+        for key, (counts, total, count) in snapshot["histograms"].items():
+            base_counts, base_total, base_count = baseline["histograms"].get(key, (None, 0.0, 0))
+            if count - base_count:
+                counts = [a - b for a, b in zip(counts, base_counts)] if base_counts else counts
+                histograms[key] = [counts, total - base_total, count - base_count]
+        return {"counters": counters, "gauges": snapshot["gauges"], "histograms": histograms}
+
+    def to_prometheus(self):
+        """Todas as séries no formato texto de exposição do Prometheus."""
+        snapshot = self.snapshot()
+        lines = []
+        described = set()
+
+        def describe(name, metric_type):
+            if name not in described:
+                described.add(name)
+                if name in METRIC_HELP:
+                    lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, labels), value in sorted(snapshot["counters"].items()):
+            describe(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), value in sorted(snapshot["gauges"].items()):
+            describe(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in sorted(snapshot["histograms"].items()):
+            describe(name, "histogram")
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(upper_bound))])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        uptime = time.time() - self.started_at
+        lines.append("# TYPE olx_uptime_seconds gauge")
+        lines.append(f"olx_uptime_seconds {uptime:.3f}")
+        return "\n".join(lines) + "\n"
+
+    def _quantile(self, counts, count, fraction):
+        """Estimativa do quantil pelo limite superior do bucket em que ele cai."""
+        target = count * fraction
+        cumulative = 0
+        for upper_bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return upper_bound
+        return None # Acima do maior bucket
+
+    def summary(self):
+        """Resumo legível (dict serializável em JSON) das séries da coleta atual (ver start_run), com a vazão de anúncios."""
+        snapshot = self.run_snapshot()
+        elapsed = time.time() - self.run_started_at
+        counters = {}
+        for (name, labels), value in sorted(snapshot["counters"].items()):
+            counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        gauges = {}
+        for (name, labels), value in sorted(snapshot["gauges"].items()):
+            gauges.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        histograms = {}
+        for (name, labels), (counts, total, count) in sorted(snapshot["histograms"].items()):
+            histograms.setdefault(name, []).append({
+                "labels": dict(labels),
+                "count": count,
+                "sum_s": round(total, 6),
+                "mean_ms": round(total / count * 1000, 3) if count else None,
+                "p50_le_s": self._quantile(counts, count, 0.50),
+                "p90_le_s": self._quantile(counts, count, 0.90),
+                "p99_le_s": self._quantile(counts, count, 0.99),
+            })
+        ads_ok = sum(value for (name, labels), value in snapshot["counters"].items() if name == "olx_ads_total" and ("result", "ok") in labels)
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "ads_per_second": round(ads_ok / elapsed, 3) if elapsed else None,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+    def write_summary(self, filename):
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, ensure_ascii=False)
+        logging.info(f"Resumo das métricas salvo em: {filename}")
+        return filename
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "labels", "start")
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+# Registro global do processo, usado por todos os módulos instrumentados
+registry = MetricsRegistry()
+inc = registry.inc
+set_gauge = registry.set_gauge
+observe = registry.observe
+timer = registry.timer
+
+
+def record_selector(page, key, found):
+    """Conta uma busca do seletor 'key' (de SELECTORS_AD_PAGE ou SELECTORS_LISTING_PAGE) e se ela encontrou algo."""
+    registry.inc("olx_selector_lookups_total", page=page, key=key, result="hit" if found else "miss")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = registry.to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # As consultas do Prometheus não devem poluir o scraper.log
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Sobe o endpoint /metrics em uma thread daemon. Retorna o servidor, ou None se a porta estiver ocupada."""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logging.warning(f"Não foi possível abrir o endpoint de métricas em {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logging.info(f"Métricas disponíveis em http://{host}:{server.server_address[1]}/metrics")
+    return server
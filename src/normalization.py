@@ -0,0 +1,162 @@
+"""
+Normalização em lote dos campos coletados.
+
+Em vez de chamar extract_price/extract_number/clean_text campo a campo, anúncio a anúncio, recebe as
+colunas de muitos anúncios de uma vez. Cada coluna é fatorada (pd.factorize, em C): as funções de
+utils.py, com as expressões pré-compiladas, rodam uma única vez por valor distinto, e o resultado é
+espalhado para todas as linhas com um 'take' do NumPy. Como preço, quartos, área, bairro e cidade se
+repetem muito em uma coleta grande, o trabalho em Python cai para uma fração do número de linhas.
+Título e descrição são quase sempre únicos: neles a fatoração só somaria o custo de hashear cada texto,
+então clean_text é aplicado direto, valor a valor. Os métodos '.str' do pandas (extract/replace/split com
+as mesmas expressões) foram medidos e ficam mais lentos que os dois caminhos, pois também percorrem os
+textos em Python, valor a valor, com mais sobrecarga.
+
+A saída é um DataFrame com tipos compactos: preço em float32, contagens e áreas em inteiros anuláveis
+(Int16/Int32), bairro/cidade/estado como categorias e 'local_cidade_estado_cep' separado em
+local_cidade, local_estado e local_cep.
+
+Uso:
+    frame = normalize_records(anuncios)      # lista de dicts (saída de extract_ad_details)
+    frame = read_export("data/olx_...csv")   # pós-processamento de uma exportação
+"""
+import numpy as np
+import pandas as pd
+
+from .utils import (
+    COUNT_DETAIL_KEYWORDS,
+    AREA_DETAIL_KEYWORDS,
+    clean_text,
+    extract_number,
+    extract_price,
+    split_city_state_cep as _split_one,
+)
+
+TEXT_COLUMNS = ("titulo", "descricao", "local_bairro", "local_cidade_estado_cep", "nome_vendedor")
+# Colunas de texto com (quase) um valor distinto por anúncio: limpas sem pd.factorize
+UNIQUE_TEXT_COLUMNS = ("titulo", "descricao")
+CATEGORY_COLUMNS = ("local_bairro", "local_cidade", "local_estado", "status_alteracao")
+LOCATION_COLUMNS = ("local_cidade", "local_estado", "local_cep")
+
+
+def _parse_distinct(values, parse, dtype=object, missing=None):
+    """
+    Aplica 'parse' uma vez por valor distinto de 'values' e devolve um array do NumPy (dtype 'dtype')
+    com o resultado de cada linha. Valores ausentes (None/NaN) viram 'missing' sem chamar 'parse'.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    parsed = np.empty(len(uniques) + 1, dtype=dtype)
+    parsed[:-1] = [parse(value) for value in uniques]
+    parsed[-1] = missing # O código -1 (valor ausente) cai na última posição
+    return parsed[codes]
+
+
+def _as_number(parse):
+    """Adapta extract_price/extract_number a colunas que já podem ter números (convertidos pelo extrator)."""
+    def parse_value(value):
+        if isinstance(value, (int, float)):
+            return value
+        try:
+            return float(value) # Números gravados no CSV (ex: '350000.0'), que extract_price leria como 3500000
+        except ValueError:
+            pass
+        result = parse(str(value))
+        return np.nan if result is None else result
+    return parse_value
+
+
+def _clean_value(value):
+    return clean_text(value if isinstance(value, str) else str(value))
+
+
+def clean_texts(values, distinct=True):
+    """
+    clean_text em lote: junta espaços e quebras de linha; textos vazios viram <NA>.
+    Com distinct=False (colunas de valores únicos, como a descrição), não fatora a coluna antes.
+    """
+    if distinct:
+        cleaned = _parse_distinct(values, _clean_value)
+    else:
+        cleaned = [None if pd.isna(value) else _clean_value(value) for value in values.to_numpy(dtype=object)]
+    cleaned = pd.Series(cleaned, index=values.index, dtype="string")
+    return cleaned.mask(cleaned == "") # Só espaços
+
+
+def parse_prices(values):
+    """extract_price em lote ('R$ 1.250,50' -> 1250.5), em float32."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype("float32")
+    prices = _parse_distinct(values, _as_number(extract_price), dtype="float32", missing=np.nan)
+    return pd.Series(prices, index=values.index)
+
+
+def parse_numbers(values, dtype="Int32"):
+    """extract_number em lote ('120 m²' -> 120), em inteiro anulável 'dtype'."""
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.Series(_parse_distinct(values, _as_number(extract_number), dtype="float64", missing=np.nan), index=values.index)
+    return values.round().astype(dtype)
+
+
+def split_city_state_cep(values):
+    """utils.split_city_state_cep em lote: DataFrame com local_cidade, local_estado e local_cep."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    parts = [_split_one(str(value)) for value in uniques] + [(None, None, None)]
+    return pd.DataFrame(
+        {column: np.array([part[position] for part in parts], dtype=object)[codes] for position, column in enumerate(LOCATION_COLUMNS)},
+        index=values.index,
+        dtype="string",
+    )
+
+
+def _detail_dtype(column):
+    """Dtype inteiro das colunas numéricas da seção de detalhes (mesmas labels de normalize_detail_value), ou None."""
+    if any(keyword in column for keyword in COUNT_DETAIL_KEYWORDS):
+        return "Int16"
+    if any(keyword in column for keyword in AREA_DETAIL_KEYWORDS):
+        return "Int32"
+    return None
+
+
+def normalize_frame(frame):
+    """
+    Converte as colunas de 'frame' (um anúncio por linha) para os tipos compactos. Retorna um novo DataFrame;
+    colunas que não são reconhecidas ficam como estão.
+    """
+    frame = frame.copy()
+    for column in TEXT_COLUMNS:
+        if column in frame:
+            frame[column] = clean_texts(frame[column], distinct=column not in UNIQUE_TEXT_COLUMNS)
+
+    if "preco" in frame or "preco_str" in frame:
+        prices = parse_prices(frame["preco"]) if "preco" in frame else pd.Series(np.nan, index=frame.index, dtype="float32")
+        if "preco_str" in frame and prices.isna().any():
+            prices = prices.fillna(parse_prices(frame["preco_str"])) # Preço ainda não convertido: usa o texto original
+        frame["preco"] = prices
+
+    for column in frame.columns:
+        dtype = _detail_dtype(column) if isinstance(column, str) else None
+        if dtype:
+            frame[column] = parse_numbers(frame[column], dtype)
+
+    if "local_cidade_estado_cep" in frame:
+        location = split_city_state_cep(frame["local_cidade_estado_cep"])
+        for column in LOCATION_COLUMNS:
+            if column in frame:
+                frame[column] = frame[column].astype("string").fillna(location[column]) # Mantém o que o extrator já separou
+            else:
+                frame[column] = location[column]
+
+    for column in CATEGORY_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].astype("category")
+    return frame
+
+
+def normalize_records(records, columns=None):
+    """DataFrame tipado a partir de uma lista de dicts (um por anúncio); 'columns' fixa a ordem/conjunto de colunas."""
+    return normalize_frame(pd.DataFrame.from_records(records, columns=columns))
+
+
+def read_export(csv_filename, **read_csv_kwargs):
+    """Lê uma exportação CSV como texto e a normaliza, sem a inferência de tipos (lenta e cara em memória) do pandas."""
+    frame = pd.read_csv(csv_filename, dtype="string", encoding="utf-8-sig", **read_csv_kwargs)
+    return normalize_frame(frame)
@@ -0,0 +1,66 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from . import metrics
+from .log_setup import configure_worker_logging, worker_log_queue
+
+
+def _init_worker(log_queue=None):
+    """
+    Executado uma vez em cada processo: importa o módulo de extração, o que carrega a configuração
+    de seletores (e, no backend lxml, já os compila para XPath), evitando esse custo por página.
+    Os avisos são enviados por 'log_queue' ao processo principal (mesmo arquivo de log e mesma amostragem).
+    """
+    from . import extraction # noqa: F401
+    configure_worker_logging(log_queue, logging.WARNING) # Os logs INFO por anúncio ficam no processo principal
+
+
+def _noop():
+    return None
+
+
+def _parse_ad_page(ad_url, content):
+    """Extrai o anúncio e devolve, junto, as métricas medidas neste processo desde a última chamada."""
+    from . import metrics
+    from .extraction import extract_ad_record
+    return extract_ad_record(ad_url, content), metrics.registry.drain()
+
+
+class ParsePool:
+    """
+    Pool de processos para o parsing e a extração das páginas de anúncio, que assim escalam
+    com o número de núcleos em vez de disputar o GIL com as threads de download.
+    As threads de download enviam os bytes brutos da resposta (um único objeto 'bytes',
+    serializado sem cópias intermediárias) e recebem de volta o dict do anúncio.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        # 'spawn': os processos não herdam as threads (e locks) do downloader, e o comportamento é o mesmo em qualquer SO
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(worker_log_queue(),),
+        )
+        # Sobe todos os processos agora, antes de a coleta começar, em vez de sob demanda
+        wait([self._executor.submit(_noop) for _ in range(self.workers)])
+        logging.info(f"Pool de parsing iniciado com {self.workers} processos.")
+
+    def parse(self, ad_url, content):
+        """Extrai o anúncio em um dos processos do pool, bloqueando apenas a thread chamadora."""
+        ad_data, worker_metrics = self._executor.submit(_parse_ad_page, ad_url, content).result()
+        metrics.registry.merge(worker_metrics) # Parse/extração/seletores medidos no processo filho
+        return ad_data
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
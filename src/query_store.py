@@ -0,0 +1,274 @@
+"""
+Base local de consulta dos anúncios exportados (formato de exportação 'sqlite').
+
+Em vez de carregar no pandas um CSV/XLSX por coleta, os anúncios são acumulados em um único arquivo
+SQLite (QUERY_STORE_PATH), com uma linha por anúncio (chave: ID da OLX), atualizada a cada nova coleta:
+- colunas tipadas e indexadas para os filtros mais comuns: cidade, bairro, quartos, preço e data de publicação
+  (em 'publicado_em', sempre em ISO 8601, mesmo para exportações antigas com o texto da página);
+- título e descrição em um índice de texto completo FTS5 (sem diferenciar acentos), mantido por triggers;
+- gravação em lotes (um upsert por lote da exportação, em uma única transação).
+
+Uso:
+    store = QueryStore("data/anuncios.sqlite3")
+    store.search(texto="piscina", bairro="Moema", quartos=3, max_preco=400000)
+
+Ou pela linha de comando: python main.py query --bairro Moema --quartos 3 --max-preco 400000 --texto piscina
+"""
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from .utils import extract_ad_id, extract_number, extract_price, parse_publication_date, split_city_state_cep
+
+# Colunas da tabela 'ads' preenchidas a partir de cada anúncio (além de ad_id e do JSON completo em 'data')
+_COLUMNS = (
+    "url", "titulo", "descricao", "preco", "quartos", "banheiros", "vagas", "area", "categoria",
+    "bairro", "cidade", "estado", "cep", "data_publicacao", "publicado_em", "status_alteracao",
+)
+# Labels da seção de detalhes (em minúsculas) que alimentam as colunas numéricas, na ordem de preferência
+_DETAIL_COLUMNS = {
+    "quartos": ("quartos", "quarto"),
+    "banheiros": ("banheiros", "banheiro"),
+    "vagas": ("vagas na garagem", "vaga"),
+    "area": ("área útil", "área construída", "área", "tamanho"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ads (
+    ad_id TEXT PRIMARY KEY,
+    url TEXT,
+    titulo TEXT,
+    descricao TEXT,
+    preco REAL,
+    quartos INTEGER,
+    banheiros INTEGER,
+    vagas INTEGER,
+    area INTEGER,
+    categoria TEXT,
+    bairro TEXT COLLATE NOCASE,
+    cidade TEXT COLLATE NOCASE,
+    estado TEXT COLLATE NOCASE,
+    cep TEXT,
+    data_publicacao TEXT,
+    publicado_em TEXT,
+    status_alteracao TEXT,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ads_bairro ON ads (bairro, quartos, preco);
+CREATE INDEX IF NOT EXISTS idx_ads_cidade ON ads (cidade, bairro);
+CREATE INDEX IF NOT EXISTS idx_ads_preco ON ads (preco);
+CREATE INDEX IF NOT EXISTS idx_ads_quartos ON ads (quartos, preco);
+"""
+# Separado de _SCHEMA: em bases criadas antes da coluna 'publicado_em', ela é incluída primeiro (_migrate)
+_PUBLISHED_INDEX = "CREATE INDEX IF NOT EXISTS idx_ads_publicado_em ON ads (publicado_em)"
+
+# Índice FTS5 com conteúdo externo (sem duplicar os textos), sincronizado com 'ads' pelos triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5(
+    titulo, descricao, content='ads', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS ads_fts_insert AFTER INSERT ON ads BEGIN
+    INSERT INTO ads_fts (rowid, titulo, descricao) VALUES (new.rowid, new.titulo, new.descricao);
+END;
+CREATE TRIGGER IF NOT EXISTS ads_fts_delete AFTER DELETE ON ads BEGIN
+    INSERT INTO ads_fts (ads_fts, rowid, titulo, descricao) VALUES ('delete', old.rowid, old.titulo, old.descricao);
+END;
+CREATE TRIGGER IF NOT EXISTS ads_fts_update AFTER UPDATE OF titulo, descricao ON ads BEGIN
+    INSERT INTO ads_fts (ads_fts, rowid, titulo, descricao) VALUES ('delete', old.rowid, old.titulo, old.descricao);
+    INSERT INTO ads_fts (rowid, titulo, descricao) VALUES (new.rowid, new.titulo, new.descricao);
+END;
+"""
+
+_UPSERT = f"""
+INSERT INTO ads (ad_id, {", ".join(_COLUMNS)}, first_seen, last_seen, data)
+VALUES (?, {", ".join("?" for _ in _COLUMNS)}, ?, ?, ?)
+ON CONFLICT (ad_id) DO UPDATE SET
+    {", ".join(f"{column} = excluded.{column}" for column in _COLUMNS)},
+    last_seen = excluded.last_seen,
+    data = excluded.data
+"""
+
+
+def _number(value, parse=extract_number):
+    """Número de uma coluna que pode vir já convertida (extrator) ou como texto (CSV)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value) # Números gravados pelo csv.DictWriter (ex: '350000.0')
+    except ValueError:
+        return parse(str(value))
+
+
+def _detail_number(record, labels):
+    for label in labels:
+        if record.get(label) not in (None, ""):
+            return _number(record[label])
+    return None
+
+
+def _location(record):
+    """(bairro, cidade, estado, cep): as colunas já separadas pela normalização ou 'local_cidade_estado_cep'."""
+    city, state, cep = record.get("local_cidade"), record.get("local_estado"), record.get("local_cep")
+    if not (city or state or cep):
+        city, state, cep = split_city_state_cep(record.get("local_cidade_estado_cep"))
+    return record.get("local_bairro") or None, city or None, state or None, cep or None
+
+
+def _row(record, now):
+    url = record.get("url_anuncio")
+    bairro, cidade, estado, cep = _location(record)
+    preco = _number(record.get("preco"), extract_price)
+    if preco is None:
+        preco = _number(record.get("preco_str"), extract_price)
+    values = {
+        "url": url,
+        "titulo": record.get("titulo") or None,
+        "descricao": record.get("descricao") or None,
+        "preco": preco,
+        "categoria": record.get("categoria") or None,
+        "bairro": bairro,
+        "cidade": cidade,
+        "estado": estado,
+        "cep": cep,
+        "data_publicacao": record.get("data_publicacao") or None,
+        "publicado_em": parse_publication_date(record.get("data_publicacao")),
+        "status_alteracao": record.get("status_alteracao") or None,
+    }
+    for column, labels in _DETAIL_COLUMNS.items():
+        values[column] = _detail_number(record, labels)
+    data = json.dumps({key: value for key, value in record.items() if value not in (None, "")}, ensure_ascii=False, default=str)
+    return (extract_ad_id(url), *(values[column] for column in _COLUMNS), now, now, data)
+
+
+class QueryStore:
+    """Anúncios em SQLite com índices nos filtros comuns e busca de texto completo (FTS5, se disponível)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._migrate()
+        self._db.execute(_PUBLISHED_INDEX)
+        try:
+            self._db.executescript(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError as e: # SQLite compilado sem FTS5: a busca de texto cai para LIKE
+            logging.warning(f"FTS5 indisponível neste SQLite ({e}); a busca por texto em '{path}' será feita com LIKE, bem mais lenta.")
+            self.fts = False
+        self._db.commit()
+
+    def _migrate(self):
+        """Bases antigas: cria 'publicado_em' a partir do texto de 'data_publicacao' e troca o índice de data."""
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(ads)")}
+        if "publicado_em" in columns:
+            return
+        with self._db:
+            self._db.execute("ALTER TABLE ads ADD COLUMN publicado_em TEXT")
+            self._db.execute("DROP INDEX IF EXISTS idx_ads_data_publicacao")
+            rows = self._db.execute("SELECT ad_id, data_publicacao FROM ads WHERE data_publicacao IS NOT NULL").fetchall()
+            self._db.executemany(
+                "UPDATE ads SET publicado_em = ? WHERE ad_id = ?",
+                [(parse_publication_date(row["data_publicacao"]), row["ad_id"]) for row in rows],
+            )
+        logging.info(f"Base de consulta '{self.path}' atualizada: coluna 'publicado_em' preenchida em {len(rows)} anúncios.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def upsert(self, records):
+        """Insere ou atualiza os anúncios (AdRecord ou dicts) em uma única transação. Retorna quantos foram gravados."""
+        now = datetime.now().isoformat(timespec="seconds")
+        rows = [_row(record, now) for record in records if record.get("url_anuncio")]
+        with self._lock:
+            with self._db:
+                self._db.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def import_csv(self, csv_filename, batch_size=5000):
+        """Carrega uma exportação CSV antiga na base, em lotes. Retorna o número de anúncios."""
+        total = 0
+        with open(csv_filename, newline="", encoding="utf-8-sig") as csv_file:
+            batch = []
+            for record in csv.DictReader(csv_file):
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    total += self.upsert(batch)
+                    batch = []
+            total += self.upsert(batch)
+        logging.info(f"{total} anúncios de '{csv_filename}' carregados em '{self.path}'.")
+        return total
+
+    def search(self, texto=None, bairro=None, cidade=None, estado=None, categoria=None, quartos=None, min_quartos=None,
+               min_preco=None, max_preco=None, publicado_desde=None, incluir_removidos=False, limit=50):
+        """
+        Anúncios que atendem a todos os filtros informados, do mais barato ao mais caro.
+        'texto' usa a sintaxe do FTS5 sobre título e descrição (ex: 'piscina', 'piscina AND churrasqueira', 'academ*').
+        'publicado_desde' aceita os formatos de parse_publication_date (ex: '2024-06-01' ou '01/06/2024').
+        """
+        if publicado_desde is not None:
+            since = parse_publication_date(publicado_desde)
+            if since is None:
+                raise ValueError(f"Data de publicação inválida: '{publicado_desde}'. Use AAAA-MM-DD ou DD/MM/AAAA.")
+            publicado_desde = since
+        conditions, params = [], []
+        if texto:
+            if self.fts:
+                # Como subconsulta (e não JOIN), o SQLite segue usando os índices dos demais filtros
+                conditions.append("ads.rowid IN (SELECT rowid FROM ads_fts WHERE ads_fts MATCH ?)")
+                params.append(texto)
+            else:
+                conditions.append("(ads.titulo LIKE ? OR ads.descricao LIKE ?)")
+                params += [f"%{texto}%"] * 2
+        for column, value in (("bairro", bairro), ("cidade", cidade), ("estado", estado), ("quartos", quartos)):
+            if value is not None:
+                conditions.append(f"ads.{column} = ?")
+                params.append(value)
+        for condition, value in (
+            ("ads.quartos >= ?", min_quartos),
+            ("ads.preco >= ?", min_preco),
+            ("ads.preco <= ?", max_preco),
+            ("ads.publicado_em >= ?", publicado_desde),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        if categoria:
+            conditions.append("ads.categoria LIKE ?") # Prefixo: 'Apartamento' encontra 'Apartamentos'
+            params.append(f"{categoria}%")
+        if not incluir_removidos:
+            conditions.append("ads.status_alteracao IS NOT 'removido'")
+
+        sql = f"SELECT ads.ad_id, ads.{', ads.'.join(_COLUMNS)}, ads.first_seen, ads.last_seen FROM ads"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY ads.preco NULLS LAST LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._db.execute(sql, params)]
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM ads").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
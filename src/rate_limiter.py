@@ -0,0 +1,76 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """
+    Token bucket simples e thread-safe.
+    'rate' é a quantidade de tokens repostos por segundo e 'capacity' o máximo
+    acumulado (rajada). Cada requisição consome um token.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if now <= self._last_refill: # Ainda dentro de uma pausa (ver pause())
+            return
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+
+    def acquire(self):
+        """Bloqueia até haver um token disponível. Retorna o tempo (s) que ficou esperando."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                pause_left = max(0.0, self._last_refill - time.monotonic())
+                wait_time = pause_left + (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
+
+    def set_rate(self, rate):
+        """Altera a taxa de reposição; os tokens acumulados até agora são mantidos."""
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+
+    def pause(self, seconds):
+        """Não libera nenhum token nos próximos 'seconds' segundos (por exemplo, para honrar um Retry-After)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+            self._last_refill = max(self._last_refill, time.monotonic() + seconds)
+
+
+class HostRateLimiter:
+    """Mantém um TokenBucket por host, para respeitar o limite de cada servidor separadamente."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.capacity)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url):
+        """Aguarda a vez de requisitar 'url' respeitando o limite do seu host."""
+        return self.bucket_for(url).acquire()
@@ -0,0 +1,219 @@
+"""
+Representação compacta dos anúncios.
+
+- AdRecord: os campos fixos de extract_ad_details ficam em __slots__ (sem o dict por instância);
+  os detalhes variáveis (labels da seção de detalhes, em minúsculas) ficam em duas tuplas, chaves e
+  valores. As tuplas de chaves são internadas: todos os anúncios com as mesmas labels compartilham
+  o mesmo objeto. AdRecord se comporta como um dict (MutableMapping), então o restante do código
+  (rastreador de mudanças, checkpoint, exportação) continua usando .get, [] e dict(record).
+- ColumnarAccumulator: junta os anúncios em listas por coluna, que vão direto para o pandas/Arrow
+  na exportação, sem uma lista intermediária de dicts.
+"""
+import sys
+from collections.abc import MutableMapping
+
+try: # Arrow é opcional (o mesmo pyarrow da exportação Parquet)
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+FIXED_FIELDS = (
+    "url_anuncio",
+    "titulo",
+    "preco_str",
+    "preco",
+    "descricao",
+    "local_bairro",
+    "local_cidade_estado_cep",
+    "data_publicacao",
+    "nome_vendedor",
+    "imagem_principal_url",
+    "imagens_urls",
+)
+_FIXED_FIELD_SET = frozenset(FIXED_FIELDS)
+
+# Tupla canônica de chaves de detalhes -> ela mesma, para que layouts iguais compartilhem um único objeto
+_interned_key_tuples = {}
+
+
+def _intern_keys(keys):
+    keys = tuple(sys.intern(key) for key in keys)
+    return _interned_key_tuples.setdefault(keys, keys)
+
+
+def _restore_record(fixed_values, detail_keys, detail_values):
+    record = AdRecord.__new__(AdRecord)
+    for name, value in zip(FIXED_FIELDS, fixed_values):
+        setattr(record, name, value)
+    record._detail_keys = _intern_keys(detail_keys)
+    record._detail_values = detail_values
+    return record
+
+
+class AdRecord(MutableMapping):
+    """Um anúncio: campos fixos em __slots__ e detalhes variáveis em tuplas com chaves internadas."""
+
+    __slots__ = FIXED_FIELDS + ("_detail_keys", "_detail_values")
+
+    def __init__(self, details=(), **fields):
+        for name in FIXED_FIELDS:
+            setattr(self, name, fields.pop(name, None))
+        self._detail_keys = ()
+        self._detail_values = ()
+        extra = dict(details)
+        extra.update(fields)
+        if extra:
+            self._detail_keys = _intern_keys(extra)
+            self._detail_values = tuple(extra.values())
+
+    @classmethod
+    def from_dict(cls, data):
+        """Converte o dict de extract_ad_details (ou um AdRecord, devolvido como está)."""
+        if isinstance(data, cls):
+            return data
+        record = cls.__new__(cls)
+        for name in FIXED_FIELDS:
+            setattr(record, name, data.get(name))
+        detail_keys = [key for key in data if key not in _FIXED_FIELD_SET]
+        record._detail_keys = _intern_keys(detail_keys)
+        record._detail_values = tuple(data[key] for key in detail_keys)
+        return record
+
+    def items(self):
+        """Pares (chave, valor), sem passar pelo __getitem__ de cada chave como o items() genérico do Mapping."""
+        fixed = zip(FIXED_FIELDS, [getattr(self, name) for name in FIXED_FIELDS])
+        return list(fixed) + list(zip(self._detail_keys, self._detail_values))
+
+    def to_dict(self):
+        return dict(self.items())
+
+    @property
+    def details(self):
+        """Os detalhes variáveis, como dict."""
+        return dict(zip(self._detail_keys, self._detail_values))
+
+    def __getitem__(self, key):
+        if key in _FIXED_FIELD_SET:
+            return getattr(self, key)
+        try:
+            return self._detail_values[self._detail_keys.index(key)]
+        except ValueError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key in _FIXED_FIELD_SET:
+            setattr(self, key, value)
+            return
+        try:
+            index = self._detail_keys.index(key)
+        except ValueError:
+            self._detail_keys = _intern_keys(self._detail_keys + (key,))
+            self._detail_values = self._detail_values + (value,)
+            return
+        self._detail_values = self._detail_values[:index] + (value,) + self._detail_values[index + 1:]
+
+    def __delitem__(self, key):
+        if key in _FIXED_FIELD_SET:
+            setattr(self, key, None) # Campos fixos sempre existem; remover equivale a limpar
+            return
+        try:
+            index = self._detail_keys.index(key)
+        except ValueError:
+            raise KeyError(key) from None
+        self._detail_keys = _intern_keys(self._detail_keys[:index] + self._detail_keys[index + 1:])
+        self._detail_values = self._detail_values[:index] + self._detail_values[index + 1:]
+
+    def __iter__(self):
+        yield from FIXED_FIELDS
+        yield from self._detail_keys
+
+    def __len__(self):
+        return len(FIXED_FIELDS) + len(self._detail_keys)
+
+    def __contains__(self, key):
+        return key in _FIXED_FIELD_SET or key in self._detail_keys
+
+    def __reduce__(self):
+        # Pickle compacto (parse_pool); as chaves voltam a ser internadas no processo que recebe
+        return _restore_record, (tuple(getattr(self, name) for name in FIXED_FIELDS), self._detail_keys, self._detail_values)
+
+    def __repr__(self):
+        return f"AdRecord({self.to_dict()!r})"
+
+
+def as_record(data):
+    """AdRecord a partir de um dict (ou o próprio AdRecord); None continua None."""
+    if data is None:
+        return None
+    return AdRecord.from_dict(data)
+
+
+class ColumnarAccumulator:
+    """
+    Acumula anúncios (AdRecord ou dicts) em uma lista por coluna. As colunas aparecem na ordem em que
+    são vistas; anúncios sem uma coluna ficam com None nela.
+
+    Uso:
+        accumulator = ColumnarAccumulator()
+        for ad in anuncios:
+            accumulator.append(ad)
+        frame = pd.DataFrame(accumulator.columns())
+    """
+
+    def __init__(self):
+        self._columns = {}
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def append(self, record):
+        length = self._length
+        columns = self._columns
+        for key, value in record.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * length
+            elif len(column) < length:
+                column.extend([None] * (length - len(column)))
+            column.append(value)
+        self._length = length + 1
+
+    @property
+    def column_names(self):
+        return list(self._columns)
+
+    def column(self, name):
+        """Valores da coluna 'name', um por anúncio (None onde ela não existe)."""
+        column = self._columns.get(name)
+        if column is None:
+            return [None] * self._length
+        if len(column) < self._length:
+            column.extend([None] * (self._length - len(column)))
+        return column
+
+    def set_column(self, name, values):
+        values = list(values)
+        if len(values) != self._length:
+            raise ValueError(f"A coluna '{name}' tem {len(values)} valores; esperado {self._length}.")
+        self._columns[name] = values
+
+    def columns(self, names=None):
+        """Dict coluna -> lista de valores (todas as colunas, ou só 'names', nessa ordem)."""
+        return {name: self.column(name) for name in (self._columns if names is None else names)}
+
+    def iter_dicts(self, names=None):
+        """Percorre os anúncios como dicts, criados um de cada vez (sem montar a lista inteira)."""
+        names = list(self._columns) if names is None else list(names)
+        for row in zip(*(self.column(name) for name in names)):
+            yield dict(zip(names, row))
+
+    def to_arrow(self, names=None):
+        """Tabela Arrow com as colunas acumuladas (requer pyarrow)."""
+        if pa is None:
+            raise RuntimeError("pyarrow não está instalado.")
+        return pa.Table.from_pydict(self.columns(names))
+
+    def clear(self):
+        self._columns = {}
+        self._length = 0
@@ -1,182 +1,240 @@
 import requests
 import cloudscraper
-from bs4 import BeautifulSoup
-import time
 import logging
+import queue
+import threading
+import time
 from urllib.parse import urljoin, urlparse, parse_qs, urlencode
 
 from .config import (
     BASE_URL_OLX,
     HTTP_HEADERS,
     REQUEST_DELAY_SECONDS,
+    REQUESTS_PER_SECOND_PER_HOST,
+    RATE_LIMIT_BURST,
+    MAX_CONCURRENT_REQUESTS,
+    AD_QUEUE_MAX_SIZE,
+    HTTP_CACHE_ENABLED,
+    HTTP_CACHE_FOLDER,
+    HTTP_CACHE_MAX_BYTES,
+    HTTP_CACHE_TTL_SECONDS,
+    CRAWL_STATE_DB_PATH,
+    CHECKPOINT_BATCH_SIZE,
     SELECTORS_LISTING_PAGE,
-    SELECTORS_AD_PAGE,
-    MAX_PAGES_TO_SCRAPE
-)
-from .utils import clean_text, extract_price, extract_number # get_detail_value_by_label não será mais usado diretamente assim
-
-# Configuração básica do logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(module)s - %(message)s',
-    handlers=[
-        logging.FileHandler("scraper.log", mode='w'), # mode='w' para sobrescrever o log a cada execução
-        logging.StreamHandler()
-    ]
-)
-
-# Cria uma instância do scraper do cloudscraper
-scraper_instance = cloudscraper.create_scraper(
-    browser={ # Simula um navegador mais de perto
-        'browser': 'chrome',
-        'platform': 'windows',
-        'mobile': False
-    },
-    delay=REQUEST_DELAY_SECONDS # Adiciona um delay entre os desafios JS do cloudflare
+    MAX_PAGES_TO_SCRAPE,
+    PARSER_BACKEND,
+    PARSE_WORKERS,
+    LISTING_CARD_MODE,
+    LISTING_CARD_REQUIRED_FIELDS,
+    ADAPTIVE_THROTTLING_ENABLED,
+    ADAPTIVE_MIN_RATE,
+    ADAPTIVE_MAX_RATE,
+    ADAPTIVE_RATE_INCREASE,
+    ADAPTIVE_SUCCESS_WINDOW,
+    ADAPTIVE_DECREASE_FACTOR,
+    ADAPTIVE_MIN_CONCURRENCY,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_DELAY_SECONDS,
+    SESSION_POOL_SIZE,
+    SESSION_MAX_IN_FLIGHT,
+    SESSION_STATE_PATH,
+    SESSION_MAX_AGE_SECONDS,
+    SESSION_MAX_CHALLENGES,
+    SESSION_WARMUP
 )
+from . import metrics
+from .adaptive import AdaptiveController, ConcurrencyLimiter, RetryScheduler, RetryableFetchError, backoff_delay, parse_retry_after
+from .rate_limiter import HostRateLimiter
+from .http_cache import HttpCache
+from .session_pool import SessionPool
+from .state_store import CrawlStateStore
+from .parse_pool import ParsePool
+from .change_tracker import content_hash
+from .extraction import parse_page, extract_ad_links_from_listing_page, extract_ad_cards_from_listing_page, extract_ad_details, extract_ad_record
+if PARSER_BACKEND == "lxml":
+    from . import lxml_extractor
+
+# O logging é configurado pelo ponto de entrada (main.py); importar este módulo não mexe nos handlers
+
+# Pool de sessões do cloudscraper, com os cookies de liberação do Cloudflare reaproveitados entre execuções.
+# Criado só na primeira requisição (get_session_pool), para que importar o módulo seja barato.
+session_pool = None
+_session_pool_lock = threading.Lock()
+
+def get_session_pool():
+    """Devolve o pool de sessões do processo, criando-o (e restaurando as sessões de SESSION_STATE_PATH) na primeira chamada."""
+    global session_pool
+    with _session_pool_lock:
+        if session_pool is None:
+            session_pool = SessionPool(
+                SESSION_POOL_SIZE,
+                SESSION_MAX_IN_FLIGHT,
+                state_path=SESSION_STATE_PATH,
+                max_age_seconds=SESSION_MAX_AGE_SECONDS,
+                max_challenges=SESSION_MAX_CHALLENGES,
+                browser={ # Simula um navegador mais de perto
+                    'browser': 'chrome',
+                    'platform': 'windows',
+                    'mobile': False
+                },
+                delay=REQUEST_DELAY_SECONDS, # Adiciona um delay entre os desafios JS do cloudflare
+                headers=HTTP_HEADERS,
+            )
+        return session_pool
+
+def configure_limits(requests_per_second=REQUESTS_PER_SECOND_PER_HOST, burst=RATE_LIMIT_BURST,
+                     max_concurrent_requests=MAX_CONCURRENT_REQUESTS, adaptive=ADAPTIVE_THROTTLING_ENABLED):
+    """
+    (Re)cria juntos o limitador por host, o limite de requisições simultâneas e o controle adaptativo,
+    que guardam referências uns aos outros. Use esta função (e não a troca de um só atributo do módulo)
+    para mudar os limites depois da importação, como faz o benchmark. As taxas mínima e máxima do controle
+    adaptativo mantêm a mesma proporção de ADAPTIVE_MIN_RATE/ADAPTIVE_MAX_RATE em relação à taxa configurada.
+    """
+    global rate_limiter, concurrency_limiter, adaptive_controller, MAX_CONCURRENT_REQUESTS
+    MAX_CONCURRENT_REQUESTS = max_concurrent_requests
+    # Limitador por host: substitui as pausas fixas (time.sleep) entre requisições
+    rate_limiter = HostRateLimiter(requests_per_second, burst)
+    # Requisições simultâneas: começa na metade do máximo e o controle adaptativo (AIMD) ajusta conforme as respostas
+    concurrency_limiter = ConcurrencyLimiter(max(ADAPTIVE_MIN_CONCURRENCY, max_concurrent_requests // 2) if adaptive else max_concurrent_requests)
+    adaptive_controller = AdaptiveController(
+        rate_limiter,
+        concurrency_limiter,
+        min_rate=ADAPTIVE_MIN_RATE * requests_per_second / REQUESTS_PER_SECOND_PER_HOST,
+        max_rate=ADAPTIVE_MAX_RATE * requests_per_second / REQUESTS_PER_SECOND_PER_HOST,
+        min_concurrency=ADAPTIVE_MIN_CONCURRENCY,
+        max_concurrency=max_concurrent_requests,
+        rate_increase=ADAPTIVE_RATE_INCREASE,
+        decrease_factor=ADAPTIVE_DECREASE_FACTOR,
+        success_window=ADAPTIVE_SUCCESS_WINDOW,
+    ) if adaptive else None
+
+rate_limiter = concurrency_limiter = adaptive_controller = None
+configure_limits()
+
+# Cache em disco das respostas (opcional), para não baixar de novo páginas que não mudaram
+http_cache = HttpCache(HTTP_CACHE_FOLDER, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_TTL_SECONDS) if HTTP_CACHE_ENABLED else None
+
+def _temporary_failure(url, reason, raise_retryable, retry_after=None, throttle=True):
+    """
+    Trata uma falha temporária: avisa o controle adaptativo (ou, sem ele, apenas honra o Retry-After)
+    e levanta RetryableFetchError se o chamador vai tentar de novo; caso contrário retorna None.
+    """
+    if throttle and adaptive_controller:
+        adaptive_controller.on_throttle(url, reason, retry_after)
+    elif retry_after:
+        rate_limiter.bucket_for(url).pause(retry_after)
+    if raise_retryable:
+        raise RetryableFetchError(url, reason, retry_after)
+    return None
 
-def fetch_page_content(url):
-    """Busca o conteúdo HTML de uma URL usando cloudscraper."""
+def fetch_page_bytes(url, page_kind="ad", raise_retryable=False):
+    """
+    Busca o HTML bruto (bytes) de uma URL usando cloudscraper, passando pelo cache HTTP quando habilitado.
+    'page_kind' ('listing' ou 'ad') define o tempo de validade da página no cache.
+    Falhas temporárias (429, 5xx, desafio do Cloudflare, timeout, conexão) retornam None ou, com
+    'raise_retryable', levantam RetryableFetchError para que o chamador tente de novo mais tarde.
+    """
+    cached_entry = http_cache.lookup(url) if http_cache else None
+    if cached_entry and http_cache.is_fresh(cached_entry, page_kind):
+        http_cache.record_hit()
+        metrics.inc("olx_http_cache_requests_total", result="hit")
+        logging.info(f"Página lida do cache: {url}", extra={"url": url, "stage": "cache"})
+        return http_cache.read(cached_entry)
+
+    request_headers = None # Os cabeçalhos de HTTP_HEADERS já estão nas sessões do pool
+    if cached_entry: # Entrada vencida: pede ao servidor apenas se ela mudou
+        request_headers = http_cache.conditional_headers(cached_entry)
+
+    # Aguarda a vez deste host, respeitando o limite de requisições por segundo
+    metrics.inc("olx_rate_limit_sleep_seconds_total", rate_limiter.acquire(url))
+    status = "error" # Rótulo da métrica de latência quando não há resposta (timeout, conexão)
+    request_start = time.perf_counter()
+    request_seconds = None
+    pool = get_session_pool()
+    pooled = None
     try:
-        # Usa a instância do cloudscraper para fazer a requisição GET
-        response = scraper_instance.get(url, headers=HTTP_HEADERS, timeout=30) # Timeout aumentado
-        logging.info(f"Página buscada: {url} (Status: {response.status_code})")
+        # Usa uma das sessões do pool do cloudscraper para fazer a requisição GET
+        with concurrency_limiter, pool.session() as pooled:
+            response = pooled.session.get(url, headers=request_headers, timeout=30) # Timeout aumentado
+        request_seconds = time.perf_counter() - request_start
+        status = response.status_code
+        metrics.inc("olx_downloaded_bytes_total", len(response.content), kind=page_kind)
+        fetch_log = {"url": url, "stage": "fetch", "status": status, "duration_ms": round(request_seconds * 1000, 1)}
+        logging.info(f"Página buscada: {url} (Status: {response.status_code})", extra=fetch_log)
+        if response.status_code == 429 or response.status_code >= 500:
+            logging.error(f"Erro HTTP {response.status_code} ao buscar {url}.", extra=fetch_log)
+            return _temporary_failure(url, f"HTTP {response.status_code}", raise_retryable, parse_retry_after(response.headers.get("Retry-After")))
+        if response.status_code == 304 and cached_entry:
+            if adaptive_controller:
+                adaptive_controller.on_success(url)
+            http_cache.record_revalidated()
+            metrics.inc("olx_http_cache_requests_total", result="revalidated")
+            http_cache.refresh(cached_entry, response.headers)
+            return http_cache.read(cached_entry)
         # Cloudscraper já lida com muitos erros 403 do Cloudflare, mas vamos verificar o status.
         # Se o conteúdo ainda for uma página de bloqueio do Cloudflare, o parsing falhará em encontrar os dados.
         if "cloudflare" in response.text.lower() and "Sorry, you have been blocked" in response.text:
-            logging.error(f"Cloudflare ainda está bloqueando o acesso a {url} mesmo com cloudscraper. HTML: {response.text[:500]}")
-            return None
+            metrics.inc("olx_blocked_responses_total", kind=page_kind)
+            logging.error(f"Cloudflare ainda está bloqueando o acesso a {url} mesmo com cloudscraper ({len(response.content)} bytes).", extra={**fetch_log, "reason": "bloqueio"})
+            pool.report_challenge(pooled)
+            return _temporary_failure(url, "bloqueio do Cloudflare", raise_retryable)
         if "Attention Required! | Cloudflare" in response.text:
-            logging.error(f"Página de CAPTCHA/desafio do Cloudflare recebida em {url}. HTML: {response.text[:500]}")
-            return None
+            metrics.inc("olx_blocked_responses_total", kind=page_kind)
+            logging.error(f"Página de CAPTCHA/desafio do Cloudflare recebida em {url} ({len(response.content)} bytes).", extra={**fetch_log, "reason": "desafio"})
+            pool.report_challenge(pooled)
+            return _temporary_failure(url, "desafio do Cloudflare", raise_retryable)
 
         response.raise_for_status() # Levanta um erro para status ruins (4xx ou 5xx) não pegos acima
-        # A pausa principal agora está no construtor do scraper_instance ou será adicionada manualmente entre chamadas se necessário
-        # time.sleep(REQUEST_DELAY_SECONDS) # Movido para o construtor do scraper ou usado entre chamadas de alto nível
-        return BeautifulSoup(response.content, 'lxml')
+        pool.report_success(pooled) # Só respostas válidas zeram a contagem de desafios seguidos da sessão
+        if adaptive_controller:
+            adaptive_controller.on_success(url)
+        if http_cache:
+            http_cache.record_miss()
+            metrics.inc("olx_http_cache_requests_total", result="miss")
+            http_cache.store(url, page_kind, response.content, response.headers)
+        return response.content
     except cloudscraper.exceptions.CloudflareChallengeError as cf_err:
-        logging.error(f"Desafio do Cloudflare não resolvido para {url}: {cf_err}. HTML: {cf_err.response.text[:500] if cf_err.response else 'N/A'}")
+        metrics.inc("olx_blocked_responses_total", kind=page_kind)
+        logging.error(f"Desafio do Cloudflare não resolvido para {url}: {cf_err}", extra={"url": url, "stage": "fetch", "reason": "desafio"})
+        if pooled:
+            pool.report_challenge(pooled)
+        return _temporary_failure(url, "desafio do Cloudflare", raise_retryable)
     except requests.exceptions.HTTPError as http_err: # cloudscraper usa exceções do requests
-        logging.error(f"Erro HTTP ao buscar {url}: {http_err}. HTML: {http_err.response.text[:500] if http_err.response else 'N/A'}")
+        logging.error(f"Erro HTTP ao buscar {url}: {http_err}", extra={"url": url, "stage": "fetch", "status": status})
     except requests.exceptions.ConnectionError as conn_err:
-        logging.error(f"Erro de conexão ao buscar {url}: {conn_err}")
+        logging.error(f"Erro de conexão ao buscar {url}: {conn_err}", extra={"url": url, "stage": "fetch", "reason": "conexao"})
+        return _temporary_failure(url, "erro de conexão", raise_retryable, throttle=False)
     except requests.exceptions.Timeout as timeout_err:
-        logging.error(f"Timeout ao buscar {url}: {timeout_err}")
+        logging.error(f"Timeout ao buscar {url}: {timeout_err}", extra={"url": url, "stage": "fetch", "reason": "timeout"})
+        return _temporary_failure(url, "timeout", raise_retryable)
     except requests.exceptions.RequestException as req_err:
-        logging.error(f"Erro geral de requisição ao buscar {url}: {req_err}")
-    time.sleep(REQUEST_DELAY_SECONDS * 2) # Pausa maior em caso de erro persistente
+        logging.error(f"Erro geral de requisição ao buscar {url}: {req_err}", extra={"url": url, "stage": "fetch"})
+    finally:
+        if request_seconds is None:
+            request_seconds = time.perf_counter() - request_start
+        metrics.observe("olx_fetch_duration_seconds", request_seconds, kind=page_kind, status=status)
     return None
 
-def extract_ad_links_from_listing_page(soup):
-    """Extrai os links dos anúncios de uma página de listagem."""
-    ad_links = []
-    if not soup:
-        return ad_links
-
-    # ATENÇÃO: VERIFIQUE O SELETOR 'ad_card' EM config.py!
-    ad_cards = soup.select(SELECTORS_LISTING_PAGE["ad_card"])
-    if not ad_cards:
-        logging.warning(f"Nenhum card de anúncio encontrado com o seletor '{SELECTORS_LISTING_PAGE['ad_card']}'. Verifique o seletor e a página HTML.")
-        # Logar um trecho do HTML pode ajudar a depurar:
-        # logging.debug(f"HTML da página de listagem (início): {soup.prettify()[:2000]}")
-        return ad_links
-
-    for card_index, card in enumerate(ad_cards):
-        # ATENÇÃO: VERIFIQUE O SELETOR 'ad_link' EM config.py!
-        link_tag = card.select_one(SELECTORS_LISTING_PAGE["ad_link"])
-        if link_tag and link_tag.has_attr('href'):
-            ad_url = urljoin(BASE_URL_OLX, link_tag['href'])
-            ad_links.append(ad_url)
-        else:
-            logging.warning(f"Link do anúncio não encontrado no card #{card_index + 1} usando o seletor '{SELECTORS_LISTING_PAGE['ad_link']}'. Card HTML (início): {str(card)[:300]}...")
-    logging.info(f"{len(ad_links)} links de anúncios extraídos desta página.")
-    return ad_links
-
-def extract_ad_details(ad_url, soup):
-    """Extrai os detalhes de uma página de anúncio individual usando os seletores fornecidos."""
-    details = {"url_anuncio": ad_url}
-    if not soup:
-        logging.warning(f"Não foi possível parsear a página do anúncio (soup vazio): {ad_url}")
-        return details
-
-    # Título
-    title_tag = soup.select_one(SELECTORS_AD_PAGE["title"])
-    details["titulo"] = clean_text(title_tag.get_text()) if title_tag else None
-
-    # Preço
-    price_tag = soup.select_one(SELECTORS_AD_PAGE["price"])
-    price_text = clean_text(price_tag.get_text()) if price_tag else None
-    details["preco_str"] = price_text # Salva o texto original do preço
-    details["preco"] = extract_price(price_text)
-
-    # Descrição
-    description_tag = soup.select_one(SELECTORS_AD_PAGE["description"])
-    details["descricao"] = clean_text(description_tag.get_text(separator=' ', strip=True)) if description_tag else None
-
-    # Localização (Bairro e Cidade/Estado/CEP separados)
-    loc_neighborhood_tag = soup.select_one(SELECTORS_AD_PAGE["location_neighborhood"])
-    details["local_bairro"] = clean_text(loc_neighborhood_tag.get_text()) if loc_neighborhood_tag else None
-
-    loc_city_state_cep_tag = soup.select_one(SELECTORS_AD_PAGE["location_city_state_cep"])
-    details["local_cidade_estado_cep"] = clean_text(loc_city_state_cep_tag.get_text()) if loc_city_state_cep_tag else None
-
-    # Data de Publicação
-    date_posted_tag = soup.select_one(SELECTORS_AD_PAGE["date_posted"])
-    details["data_publicacao"] = clean_text(date_posted_tag.get_text()) if date_posted_tag else None
-    
-    # Nome do Vendedor
-    seller_name_tag = soup.select_one(SELECTORS_AD_PAGE["seller_name"])
-    details["nome_vendedor"] = clean_text(seller_name_tag.get_text()) if seller_name_tag else None
-
-    # Extração de Detalhes da Seção 'details_section_container'
-    details_extracted_from_section = {}
-    details_section_el = soup.select_one(SELECTORS_AD_PAGE["details_section_container"])
-    if details_section_el:
-        item_containers = details_section_el.select(SELECTORS_AD_PAGE["detail_item_container"])
-        if not item_containers:
-            logging.warning(f"Nenhum 'detail_item_container' encontrado dentro de 'details_section_container' para {ad_url} usando seletor '{SELECTORS_AD_PAGE['detail_item_container']}'")
-
-        for item_container in item_containers:
-            label_tag = item_container.select_one(SELECTORS_AD_PAGE["detail_item_label_relative"])
-            label_text = clean_text(label_tag.get_text().lower()) if label_tag else None # Label em minúsculas para chave
-
-            if label_text:
-                value_text = None
-                # Tenta cada seletor para o valor
-                for value_selector in SELECTORS_AD_PAGE["detail_item_value_relative"]:
-                    value_tag = item_container.select_one(value_selector)
-                    if value_tag:
-                        value_text = clean_text(value_tag.get_text())
-                        break # Para no primeiro seletor de valor que funcionar
-                
-                if value_text:
-                    # Tenta converter para número se for um campo numérico conhecido
-                    if any(kw in label_text for kw in ["quarto", "banheiro", "vaga", "andar"]):
-                        details_extracted_from_section[label_text] = extract_number(value_text)
-                    elif "área" in label_text or "tamanho" in label_text:
-                        details_extracted_from_section[label_text] = extract_number(value_text) # Poderia ser float também
-                    else:
-                        details_extracted_from_section[label_text] = value_text
-                else:
-                    logging.warning(f"Valor não encontrado para a label '{label_text}' no anúncio {ad_url} usando seletores '{SELECTORS_AD_PAGE['detail_item_value_relative']}'")
-            else:
-                logging.warning(f"Label não encontrada em 'detail_item_container' no anúncio {ad_url} usando seletor '{SELECTORS_AD_PAGE['detail_item_label_relative']}'")
-        details.update(details_extracted_from_section) # Adiciona os detalhes extraídos ao dict principal
-    else:
-        logging.warning(f"Seção de detalhes ('{SELECTORS_AD_PAGE['details_section_container']}') não encontrada para o anúncio: {ad_url}")
-
-    # Imagens (exemplo: coletar a primeira URL de imagem da galeria)
-    # Pode-se expandir para coletar todas se necessário
-    first_image_tag = soup.select_one(SELECTORS_AD_PAGE["image_in_gallery"])
-    if first_image_tag:
-        details["imagem_principal_url"] = first_image_tag.get('src') or first_image_tag.get('data-src')
-    else:
-        details["imagem_principal_url"] = None
-        logging.warning(f"Nenhuma imagem encontrada com seletor '{SELECTORS_AD_PAGE['image_in_gallery']}' para {ad_url}")
-
-
-    logging.info(f"Detalhes extraídos para: {details.get('titulo', ad_url)[:50]}...") # Log do título truncado
-    return details
+def fetch_page_content(url, page_kind="ad"):
+    """
+    Busca o conteúdo HTML de uma URL e o retorna parseado pelo backend configurado (ou None em caso de falha).
+    Falhas temporárias são tentadas de novo aqui mesmo, até RETRY_MAX_ATTEMPTS vezes, com backoff exponencial.
+    """
+    max_attempts = max(1, RETRY_MAX_ATTEMPTS) # 0 (ou menos) desliga as novas tentativas, mas a primeira é sempre feita
+    content = None
+    for attempt in range(1, max_attempts + 1):
+        try:
+            content = fetch_page_bytes(url, page_kind, raise_retryable=attempt < max_attempts)
+            break
+        except RetryableFetchError as err:
+            delay = backoff_delay(attempt, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS, err.retry_after)
+            metrics.inc("olx_retries_total", reason=err.reason)
+            logging.info(f"Nova tentativa de {url} em {delay:.1f}s (tentativa {attempt + 1}/{max_attempts}, motivo: {err.reason}).", extra={"url": url, "stage": "retry", "reason": err.reason})
+            time.sleep(delay)
+    if content is None:
+        return None
+    return parse_page(content)
 
 def get_next_page_url(current_url, soup):
     """
@@ -193,9 +251,13 @@ def get_next_page_url(current_url, soup):
     # 1. Tentar encontrar a próxima página usando o seletor CSS
     if next_page_selector_str:  # Apenas tenta se o seletor for uma string não vazia
         logging.info(f"Tentando encontrar próxima página para {current_url} usando seletor: '{next_page_selector_str}'")
-        next_page_tag = soup.select_one(next_page_selector_str)
-        if next_page_tag and next_page_tag.has_attr('href'):
-            potential_next_url = urljoin(current_url, next_page_tag['href'])
+        if PARSER_BACKEND == "lxml":
+            next_page_href = lxml_extractor.find_next_page_href(soup)
+        else:
+            next_page_tag = soup.select_one(next_page_selector_str)
+            next_page_href = next_page_tag['href'] if next_page_tag and next_page_tag.has_attr('href') else None
+        if next_page_href:
+            potential_next_url = urljoin(current_url, next_page_href)
             
             # Verifica se a URL encontrada é realmente uma "próxima" página válida
             if potential_next_url != current_url and not potential_next_url.endswith("?o=0") and not (current_url.endswith("?o=1") and potential_next_url.endswith("?o=1")): # Evita loops e voltar para o início
@@ -252,19 +314,92 @@ def get_next_page_url(current_url, soup):
     return None
 
 
-def run_scraper():
-    """Orquestra o processo de scraping."""
-    all_ads_data = []
-    current_page_url = BASE_URL_OLX
-    page_count = 0
+def process_ad(ad_link, parse_pool=None):
+    """
+    Busca e extrai um único anúncio. Retorna o dict de detalhes ou None em caso de falha.
+    Com um 'parse_pool', a thread só faz o download e a extração roda em outro processo.
+    """
+    content = fetch_page_bytes(ad_link, raise_retryable=True) # Falhas temporárias voltam para a fila (consume_ad_links)
+    if content is None:
+        logging.warning(f"Não foi possível obter/processar detalhes do anúncio: {ad_link}", extra={"url": ad_link, "stage": "ad"})
+        return None
+    if parse_pool:
+        return parse_pool.parse(ad_link, content)
+    return extract_ad_record(ad_link, content)
+
+def resolve_listing_cards(cards, change_tracker=None):
+    """
+    Modo LISTING_CARD_MODE: decide, para cada card da listagem, se o anúncio sai do próprio card ou
+    se a página de detalhes precisa ser buscada. Retorna (anúncios prontos, links para buscar).
+    - Com 'change_tracker': anúncios já conhecidos cujo card não mudou reaproveitam os dados gravados no
+      histórico, sem nenhuma requisição; os novos e os de card alterado têm a página de detalhes buscada.
+    - Sem ele: o card é o anúncio, e só os cards sem algum campo de LISTING_CARD_REQUIRED_FIELDS vão para os detalhes.
+    """
+    ready, detail_links = [], []
+    seen = set()
+    for card in cards:
+        ad_url = card["url_anuncio"]
+        if ad_url in seen: # O mesmo anúncio pode aparecer duas vezes na página (ex: destaque)
+            continue
+        seen.add(ad_url)
+        if change_tracker is None:
+            if all(card.get(field) not in (None, "") for field in LISTING_CARD_REQUIRED_FIELDS):
+                ready.append(card)
+            else:
+                detail_links.append(ad_url)
+            continue
+        card_hash = content_hash(card)
+        known_hash, known_ad = change_tracker.known_card(ad_url)
+        change_tracker.remember_card_hash(ad_url, card_hash)
+        if known_ad is not None and known_hash == card_hash:
+            known_ad["url_anuncio"] = ad_url
+            ready.append(known_ad)
+        else:
+            detail_links.append(ad_url)
+    metrics.inc("olx_listing_cards_total", len(ready), result="from_card")
+    metrics.inc("olx_listing_cards_total", len(detail_links), result="needs_details")
+    return ready, detail_links
+
+# Marca o fim das filas do pipeline (links para os workers e resultados para o consumidor)
+_END_OF_QUEUE = object()
 
-    while current_page_url and (MAX_PAGES_TO_SCRAPE is None or page_count < MAX_PAGES_TO_SCRAPE):
+def _put_unless_stopped(target_queue, item, stop_event):
+    """Coloca 'item' na fila limitada, desistindo se a coleta for interrompida enquanto espera espaço."""
+    while not stop_event.is_set():
+        try:
+            target_queue.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def produce_ad_links(ad_queue, state_store, stop_event, start_url, start_page_count=0, pending_links=(), change_tracker=None, results_queue=None):
+    """
+    Etapa produtora do pipeline: percorre as páginas de listagem e enfileira os links dos anúncios.
+    Como a fila é limitada, a próxima listagem é buscada assim que houver espaço,
+    enquanto os workers ainda processam os anúncios da página anterior.
+    Cada página de listagem é registrada no 'state_store' (links pendentes e cursor) antes de ser enfileirada.
+    'pending_links' são links de uma coleta retomada que ainda não foram concluídos.
+    Com LISTING_CARD_MODE, os anúncios resolvidos pelos cards (ver resolve_listing_cards) vão direto
+    para 'results_queue' e só os demais links são enfileirados para os workers.
+    Retorna o número de páginas de listagem visitadas.
+    """
+    for ad_link in pending_links:
+        if not _put_unless_stopped(ad_queue, ad_link, stop_event):
+            return start_page_count
+
+    current_page_url = start_url
+    page_count = start_page_count
+
+    while current_page_url and (MAX_PAGES_TO_SCRAPE is None or page_count < MAX_PAGES_TO_SCRAPE) and not stop_event.is_set():
         page_count += 1
         logging.info(f"--- Raspando Página {page_count} / {MAX_PAGES_TO_SCRAPE if MAX_PAGES_TO_SCRAPE else 'N/A'}: {current_page_url} ---")
 
-        listing_soup = fetch_page_content(current_page_url)
+        listing_soup = fetch_page_content(current_page_url, page_kind="listing")
 
         if not listing_soup:
+            metrics.inc("olx_listing_pages_total", result="failed")
+            state_store.mark_listing_failed()
             logging.error(f"Falha ao obter conteúdo da página de listagem: {current_page_url}. Tentando próxima página se houver.")
             # Mesmo com falha, tenta obter a próxima página para não parar tudo se for um erro temporário
             # Mas se MAX_PAGES_TO_SCRAPE for 1, isso vai parar.
@@ -273,44 +408,197 @@ def run_scraper():
             next_page_candidate_after_fail = get_next_page_url(current_page_url, listing_soup) # listing_soup será None aqui
             if next_page_candidate_after_fail == current_page_url: break
             current_page_url = next_page_candidate_after_fail
-            time.sleep(REQUEST_DELAY_SECONDS * 2) # Pausa extra após falha
             continue
 
 
-        ad_links_on_page = extract_ad_links_from_listing_page(listing_soup)
+        metrics.inc("olx_listing_pages_total", result="ok")
+        if LISTING_CARD_MODE:
+            cards_on_page = extract_ad_cards_from_listing_page(listing_soup)
+            ad_links_on_page = [card["url_anuncio"] for card in cards_on_page]
+        else:
+            ad_links_on_page = extract_ad_links_from_listing_page(listing_soup)
         if not ad_links_on_page:
             logging.info(f"Nenhum link de anúncio encontrado na página {current_page_url}. Verifique os seletores ou pode ser o fim das listagens.")
+            state_store.save_listing_page([], None, page_count)
+            state_store.mark_listing_exhausted()
             break 
 
-        for ad_link_index, ad_link in enumerate(ad_links_on_page):
-            logging.info(f"Processando anúncio {ad_link_index + 1}/{len(ad_links_on_page)}: {ad_link}")
-            ad_soup = fetch_page_content(ad_link)
-            if ad_soup:
-                ad_data = extract_ad_details(ad_link, ad_soup)
-                all_ads_data.append(ad_data)
-            else:
-                logging.warning(f"Não foi possível obter/processar detalhes do anúncio: {ad_link}")
-            time.sleep(REQUEST_DELAY_SECONDS / 2) # Pequena pausa entre anúncios individuais
-
         next_page_candidate = get_next_page_url(current_page_url, listing_soup)
         if next_page_candidate == current_page_url:
             logging.info("URL da próxima página é a mesma da atual. Encerrando paginação.")
-            break
-        current_page_url = next_page_candidate
-        
-        if not current_page_url:
+            next_page_candidate = None
+        elif not next_page_candidate:
             logging.info("Nenhuma URL de próxima página encontrada. Encerrando.")
-            break
-        time.sleep(REQUEST_DELAY_SECONDS) # Pausa entre páginas de listagem
 
-    if not all_ads_data:
+        new_ad_links = state_store.save_listing_page(ad_links_on_page, next_page_candidate, page_count)
+        if LISTING_CARD_MODE:
+            new_links_set = set(new_ad_links)
+            card_ads, new_ad_links = resolve_listing_cards([card for card in cards_on_page if card["url_anuncio"] in new_links_set], change_tracker)
+            for ad_data in card_ads:
+                metrics.inc("olx_ads_total", result="ok")
+                state_store.record_ad(ad_data["url_anuncio"], ad_data)
+                if not _put_unless_stopped(results_queue, ad_data, stop_event):
+                    break
+        for ad_link in new_ad_links:
+            if not _put_unless_stopped(ad_queue, ad_link, stop_event): # Bloqueia enquanto a fila estiver cheia
+                break
+
+        current_page_url = next_page_candidate
+        if current_page_url is None:
+            state_store.mark_listing_exhausted()
+
+    return page_count
+
+def consume_ad_links(ad_queue, results_queue, state_store, stop_event, parse_pool=None, retry_scheduler=None):
+    """
+    Etapa consumidora do pipeline: busca e extrai os anúncios da fila até receber o marcador de fim.
+    Anúncios com falha temporária são entregues ao 'retry_scheduler', que os devolve à fila após o backoff.
+    Cada item é marcado com task_done, exceto os reagendados (o agendador o faz ao recolocá-los na fila).
+    """
+    while True:
+        ad_link = ad_queue.get()
+        if ad_link is _END_OF_QUEUE:
+            ad_queue.task_done()
+            return
+        rescheduled = False
+        try:
+            if stop_event.is_set():
+                continue # Apenas esvazia a fila; os links continuam pendentes no state_store
+            ad_data = process_ad(ad_link, parse_pool)
+            metrics.inc("olx_ads_total", result="ok" if ad_data else "failed")
+            if retry_scheduler:
+                retry_scheduler.forget(ad_link)
+            if ad_data:
+                state_store.record_ad(ad_link, ad_data)
+                _put_unless_stopped(results_queue, ad_data, stop_event)
+        except RetryableFetchError as err:
+            rescheduled = bool(retry_scheduler) and retry_scheduler.schedule(ad_link, err.reason, err.retry_after)
+            if not rescheduled:
+                metrics.inc("olx_ads_total", result="failed")
+                logging.warning(f"Não foi possível obter/processar detalhes do anúncio: {ad_link}", extra={"url": ad_link, "stage": "ad"})
+        except Exception as e:
+            metrics.inc("olx_ads_total", result="error")
+            logging.error(f"Erro inesperado ao processar o anúncio {ad_link}: {e}", exc_info=True)
+        finally:
+            if not rescheduled:
+                ad_queue.task_done()
+
+def _wait_until_drained(ad_queue, stop_event):
+    """Espera até que todos os links enfileirados (inclusive as novas tentativas agendadas) tenham sido concluídos."""
+    with ad_queue.all_tasks_done:
+        while ad_queue.unfinished_tasks and not stop_event.is_set():
+            ad_queue.all_tasks_done.wait(0.5)
+
+def _coordinate_pipeline(ad_queue, results_queue, workers, state_store, stop_event, producer_args, errors):
+    """Roda a etapa produtora, encerra os workers quando a fila esvaziar e sinaliza o fim dos resultados."""
+    try:
+        page_count = produce_ad_links(ad_queue, state_store, stop_event, *producer_args, results_queue=results_queue)
+        logging.info(f"Descoberta de anúncios finalizada após {page_count} página(s) de listagem.")
+    except Exception as e:
+        errors.append(e)
+    finally:
+        # Só encerra os workers depois das novas tentativas: elas ainda podem voltar para a fila
+        _wait_until_drained(ad_queue, stop_event)
+        # Um marcador por worker; cada um encerra ao recebê-lo, depois de esvaziar a fila
+        for _ in workers:
+            ad_queue.put(_END_OF_QUEUE)
+        for worker in workers:
+            worker.join()
+        _put_unless_stopped(results_queue, _END_OF_QUEUE, stop_event)
+
+
+def run_scraper(resume=False, change_tracker=None):
+    """
+    Orquestra o processo de scraping como um pipeline e devolve os anúncios à medida que são extraídos (gerador).
+    Uma thread produtora descobre os links nas páginas de listagem e os coloca em uma fila limitada,
+    da qual MAX_CONCURRENT_REQUESTS workers consomem, buscando e extraindo os anúncios.
+    Anúncios com falha temporária voltam para a fila após o backoff (RetryScheduler).
+    O progresso é salvo em CRAWL_STATE_DB_PATH; com resume=True a coleta continua de onde
+    a execução anterior parou, sem buscar de novo os anúncios já concluídos (que são devolvidos primeiro).
+    Com LISTING_CARD_MODE, o 'change_tracker' (ChangeTracker) decide quais anúncios saem direto dos cards da listagem.
+    Ao final, o 'change_tracker' é avisado se a coleta percorreu a busca inteira (ver ChangeTracker.mark_listing_complete):
+    só nesse caso os anúncios não vistos contam para a detecção de removidos.
+    """
+    state_store = CrawlStateStore(CRAWL_STATE_DB_PATH, CHECKPOINT_BATCH_SIZE)
+    start_url, start_page_count, pending_links = BASE_URL_OLX, 0, []
+    ads_count = 0
+
+    stop_event = threading.Event()
+    ad_queue = queue.Queue(maxsize=AD_QUEUE_MAX_SIZE)
+    results_queue = queue.Queue(maxsize=AD_QUEUE_MAX_SIZE)
+    errors = []
+    coordinator = None
+    parse_pool = ParsePool(PARSE_WORKERS) if PARSE_WORKERS else None
+    retry_scheduler = RetryScheduler(ad_queue, stop_event, RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY_SECONDS, RETRY_MAX_DELAY_SECONDS)
+
+    try:
+        cursor = state_store.get_cursor() if resume else None
+        if cursor:
+            start_url, start_page_count = cursor
+            pending_links = state_store.pending_ad_urls()
+            logging.info(
+                f"Retomando coleta: {state_store.count_ads()} anúncios já concluídos, {len(pending_links)} pendentes, "
+                f"{start_page_count} página(s) de listagem visitadas. Próxima listagem: {start_url or 'nenhuma'}"
+            )
+            for ad_data in state_store.iter_ads():
+                ads_count += 1
+                yield ad_data
+        else:
+            if resume:
+                logging.warning(f"Nenhuma coleta anterior encontrada em '{CRAWL_STATE_DB_PATH}'. Iniciando do zero.")
+            state_store.reset()
+
+        if SESSION_WARMUP:
+            get_session_pool().warm_up(start_url or BASE_URL_OLX, rate_limiter.acquire)
+        retry_scheduler.start()
+        workers = [
+            threading.Thread(target=consume_ad_links, args=(ad_queue, results_queue, state_store, stop_event, parse_pool, retry_scheduler), name=f"ad-worker-{i + 1}", daemon=True)
+            for i in range(max(1, MAX_CONCURRENT_REQUESTS))
+        ]
+        for worker in workers:
+            worker.start()
+        coordinator = threading.Thread(
+            target=_coordinate_pipeline,
+            args=(ad_queue, results_queue, workers, state_store, stop_event, (start_url, start_page_count, pending_links, change_tracker), errors),
+            name="listing-producer",
+            daemon=True,
+        )
+        coordinator.start()
+
+        while True:
+            ad_data = results_queue.get()
+            if ad_data is _END_OF_QUEUE:
+                break
+            ads_count += 1
+            yield ad_data
+
+        coordinator.join()
+        if errors:
+            raise errors[0]
+        state_store.mark_finished()
+        if change_tracker and MAX_PAGES_TO_SCRAPE is None and state_store.is_complete():
+            change_tracker.mark_listing_complete()
+    finally:
+        # Se o consumidor parar antes do fim (ou houver erro), interrompe as etapas e salva o que já foi concluído
+        stop_event.set()
+        if coordinator:
+            coordinator.join()
+        if parse_pool:
+            parse_pool.close()
+        state_store.close()
+        if session_pool:
+            session_pool.save()
+
+    if not ads_count:
         logging.warning("Nenhum dado de anúncio foi coletado.")
     else:
-        logging.info(f"Coleta finalizada. Total de {len(all_ads_data)} anúncios processados.")
-
-    return all_ads_data
+        logging.info(f"Coleta finalizada. Total de {ads_count} anúncios processados.")
+    if http_cache:
+        logging.info(http_cache.summary())
 
 if __name__ == '__main__':
+    from .log_setup import setup_logging
+    setup_logging()
     logging.info("Iniciando teste direto do scraper.py...")
-    collected_data = run_scraper()
+    collected_data = list(run_scraper())
     # ... (resto do bloco if __name__ == '__main__' como antes)
\ No newline at end of file
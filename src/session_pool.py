@@ -0,0 +1,242 @@
+"""
+Pool de sessões do cloudscraper.
+
+Em vez de uma única sessão global, resolvendo o desafio JS do Cloudflare do zero a cada execução,
+o pool mantém várias sessões, cada uma com o próprio pool de conexões dimensionado para uso simultâneo:
+- os cookies de liberação (cf_clearance, __cf_bm...) e o User-Agent de cada sessão são gravados em
+  SESSION_STATE_PATH ao final da coleta e reaproveitados na próxima, enquanto não vencem;
+- as sessões sem liberação são aquecidas em segundo plano (uma visita à página inicial do site) no início da coleta;
+- uma sessão que recebe páginas de desafio/bloqueio seguidas é descartada e substituída por uma nova,
+  que resolve o desafio de novo.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import cloudscraper
+from requests.cookies import create_cookie
+
+from . import metrics
+
+# Cookie que o Cloudflare entrega depois que o desafio é resolvido
+CLEARANCE_COOKIE = "cf_clearance"
+
+
+class PooledSession:
+    """Uma sessão do cloudscraper e o seu estado no pool."""
+
+    __slots__ = ("session", "in_flight", "challenges", "evicted", "warming", "created_at")
+
+    def __init__(self, session, created_at=None):
+        self.session = session
+        self.in_flight = 0
+        self.challenges = 0 # Páginas de desafio/bloqueio seguidas
+        self.evicted = False
+        self.warming = False
+        self.created_at = created_at or time.time()
+
+    @property
+    def warm(self):
+        """True se a sessão tem um cookie de liberação do Cloudflare ainda válido."""
+        now = time.time()
+        return any(cookie.name == CLEARANCE_COOKIE and not cookie.is_expired(now) for cookie in self.session.cookies)
+
+
+class SessionPool:
+    """
+    Distribui as requisições entre 'size' sessões do cloudscraper, no máximo 'max_in_flight' por sessão.
+
+    Uso:
+        with session_pool.session() as pooled:
+            response = pooled.session.get(url, timeout=30)
+        session_pool.report_success(pooled)   # ou report_challenge(pooled), ao receber um desafio
+    """
+
+    def __init__(self, size, max_in_flight, state_path=None, max_age_seconds=None, max_challenges=2,
+                 browser=None, delay=None, headers=None):
+        self.size = max(1, size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.state_path = state_path
+        self.max_age_seconds = max_age_seconds
+        self.max_challenges = max(1, max_challenges)
+        self.browser = browser or {'browser': 'chrome', 'platform': 'windows', 'mobile': False}
+        self.delay = delay
+        # O User-Agent fica com o da própria sessão: a liberação do Cloudflare vale para o UA que resolveu o desafio
+        self.headers = {key: value for key, value in (headers or {}).items() if key.lower() != "user-agent"}
+        self._condition = threading.Condition()
+        self._sessions = [PooledSession(self._new_session()) for _ in range(self.size)]
+        self._load_state()
+
+    def _new_session(self):
+        session = cloudscraper.create_scraper(browser=self.browser, delay=self.delay)
+        session.headers.update(self.headers)
+        for adapter in session.adapters.values():
+            # Mantém o adaptador do cloudscraper (com a sua suíte de cifras) e só aumenta o pool de conexões
+            adapter._pool_maxsize = self.max_in_flight
+            adapter.init_poolmanager(adapter._pool_connections, self.max_in_flight, block=adapter._pool_block)
+        return session
+
+    def _load_state(self):
+        """Restaura User-Agent e cookies ainda válidos das sessões gravadas em 'state_path'."""
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, encoding="utf-8") as state_file:
+                saved_sessions = json.load(state_file).get("sessions", [])
+        except (OSError, ValueError) as e:
+            logging.warning(f"Não foi possível ler o estado das sessões em '{self.state_path}': {e}. Iniciando com sessões novas.")
+            return
+
+        now = time.time()
+        restored = 0
+        for pooled, saved in zip(self._sessions, saved_sessions):
+            created_at = saved.get("created_at") or 0
+            if self.max_age_seconds and now - created_at > self.max_age_seconds:
+                continue
+            cookies = [cookie for cookie in saved.get("cookies", []) if not cookie.get("expires") or cookie["expires"] > now]
+            if not cookies:
+                continue
+            if saved.get("user_agent"):
+                pooled.session.headers["User-Agent"] = saved["user_agent"]
+            for cookie in cookies:
+                pooled.session.cookies.set_cookie(create_cookie(**cookie))
+            pooled.created_at = created_at
+            restored += pooled.warm
+        if restored:
+            logging.info(f"{restored} sessão(ões) com liberação do Cloudflare restaurada(s) de '{self.state_path}'.")
+
+    def save(self):
+        """Grava User-Agent e cookies de cada sessão em 'state_path' (escrita atômica)."""
+        if not self.state_path:
+            return
+        with self._condition:
+            sessions = [pooled for pooled in self._sessions if not pooled.evicted]
+            state = {
+                "saved_at": time.time(),
+                "sessions": [
+                    {
+                        "user_agent": pooled.session.headers.get("User-Agent"),
+                        "created_at": pooled.created_at,
+                        "cookies": [
+                            {
+                                "name": cookie.name,
+                                "value": cookie.value,
+                                "domain": cookie.domain,
+                                "path": cookie.path,
+                                "expires": cookie.expires,
+                                "secure": cookie.secure,
+                            }
+                            for cookie in pooled.session.cookies
+                        ],
+                    }
+                    for pooled in sessions
+                ],
+            }
+        folder = os.path.dirname(self.state_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temp_path = f"{self.state_path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as state_file:
+                json.dump(state, state_file)
+            os.replace(temp_path, self.state_path)
+        except OSError as e:
+            logging.warning(f"Não foi possível gravar o estado das sessões em '{self.state_path}': {e}")
+
+    def _pick_locked(self):
+        candidates = [pooled for pooled in self._sessions if not pooled.evicted and not pooled.warming and pooled.in_flight < self.max_in_flight]
+        if not candidates:
+            return None
+        # Prefere as sessões já liberadas pelo Cloudflare e, entre elas, a menos ocupada
+        return min(candidates, key=lambda pooled: (not pooled.warm, pooled.in_flight))
+
+    def _replace_locked(self, pooled, reason):
+        index = self._sessions.index(pooled)
+        self._sessions[index] = PooledSession(self._new_session())
+        metrics.inc("olx_session_evictions_total", reason=reason)
+        logging.warning(f"Sessão {index + 1} do pool descartada ({reason}); uma nova sessão vai resolver o desafio do Cloudflare.")
+        return self._sessions[index]
+
+    @contextmanager
+    def session(self):
+        """Reserva uma sessão (bloqueando enquanto todas estiverem no limite) e a devolve ao pool no final."""
+        with self._condition:
+            pooled = self._pick_locked()
+            while pooled is None:
+                self._condition.wait()
+                pooled = self._pick_locked()
+            pooled.in_flight += 1
+        try:
+            yield pooled
+        finally:
+            with self._condition:
+                pooled.in_flight -= 1
+                if pooled.in_flight == 0 and pooled in self._sessions:
+                    if pooled.evicted:
+                        self._replace_locked(pooled, "desafio")
+                    elif self.max_age_seconds and time.time() - pooled.created_at > self.max_age_seconds:
+                        self._replace_locked(pooled, "idade")
+                self._condition.notify_all()
+
+    def report_success(self, pooled):
+        with self._condition:
+            pooled.challenges = 0
+
+    def report_challenge(self, pooled):
+        """
+        Registra uma página de desafio/bloqueio; após 'max_challenges' seguidas, a sessão é descartada.
+        Sem requisições em andamento (o caso de fetch_page_bytes, que já devolveu a sessão), ela é substituída
+        na hora; caso contrário, quando a última requisição terminar.
+        """
+        with self._condition:
+            pooled.challenges += 1
+            if pooled.challenges < self.max_challenges or pooled.evicted:
+                return
+            pooled.evicted = True
+            if pooled.in_flight == 0 and pooled in self._sessions:
+                self._replace_locked(pooled, "desafio")
+                self._condition.notify_all()
+
+    def warm_up(self, url, acquire=None):
+        """
+        Aquece em segundo plano as sessões sem liberação, visitando a página inicial do host de 'url'.
+        'acquire(url)' (o rate limiter) é chamado antes de cada visita. Retorna as threads iniciadas.
+        Cada sessão volta a ser usada assim que o seu aquecimento termina, e nunca todas ficam reservadas:
+        sem nenhuma sessão já liberada, uma das frias fica de fora e atende as primeiras requisições
+        (resolvendo o desafio nelas), para que a coleta não espere pelos aquecimentos.
+        """
+        parsed_url = urlparse(url)
+        home_url = f"{parsed_url.scheme}://{parsed_url.netloc}/"
+        with self._condition:
+            available = [pooled for pooled in self._sessions if not pooled.evicted and not pooled.warming]
+            cold = [pooled for pooled in available if not pooled.warm]
+            if cold and len(cold) == len(available):
+                cold = cold[1:]
+            for pooled in cold:
+                pooled.warming = True
+        threads = [
+            threading.Thread(target=self._warm_one, args=(pooled, home_url, acquire), name=f"session-warmup-{index + 1}", daemon=True)
+            for index, pooled in enumerate(cold)
+        ]
+        for thread in threads:
+            thread.start()
+        if threads:
+            logging.info(f"Aquecendo {len(threads)} sessão(ões) do pool em segundo plano.")
+        return threads
+
+    def _warm_one(self, pooled, home_url, acquire):
+        try:
+            if acquire:
+                acquire(home_url)
+            response = pooled.session.get(home_url, timeout=30)
+            logging.info(f"Sessão aquecida em {home_url} (Status: {response.status_code}, liberação do Cloudflare: {'sim' if pooled.warm else 'não'}).")
+        except Exception as e: # A sessão continua utilizável; o desafio será resolvido na primeira requisição
+            logging.warning(f"Falha ao aquecer uma sessão do pool em {home_url}: {e}")
+        finally:
+            with self._condition:
+                pooled.warming = False
+                self._condition.notify_all()
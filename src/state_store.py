@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from .records import as_record
+from .utils import extract_ad_id
+
+
+class CrawlStateStore:
+    """
+    Estado persistente de uma coleta, guardado em um arquivo SQLite local.
+    Registra o cursor das páginas de listagem, a fronteira de anúncios pendentes,
+    os anúncios concluídos e os dados extraídos, para que uma execução com --resume
+    continue exatamente de onde a anterior parou.
+    Os anúncios concluídos são gravados em lotes de 'batch_size' por transação.
+    """
+
+    def __init__(self, path, batch_size=50):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._pending_records = []
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS crawl_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS frontier (
+                ad_url TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'pending',
+                seq INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_frontier_status ON frontier (status, seq);
+            CREATE TABLE IF NOT EXISTS ads (
+                ad_id TEXT PRIMARY KEY,
+                ad_url TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            """
+        )
+        self._db.commit()
+
+    def reset(self):
+        """Apaga o estado de uma coleta anterior, para começar do zero."""
+        with self._lock:
+            self._pending_records.clear()
+            self._db.executescript("DELETE FROM crawl_state; DELETE FROM frontier; DELETE FROM ads;")
+            self._db.commit()
+
+    def _get(self, key):
+        row = self._db.execute("SELECT value FROM crawl_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key, value):
+        self._db.execute(
+            "INSERT OR REPLACE INTO crawl_state (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+    def get_cursor(self):
+        """
+        Retorna (próxima_url_de_listagem, páginas_já_visitadas) da coleta salva,
+        ou None se não houver coleta anterior. A URL é None quando a descoberta já terminou.
+        """
+        with self._lock:
+            cursor = self._get("listing_cursor")
+        if cursor is None:
+            return None
+        return cursor["next_url"], cursor["page_count"]
+
+    def is_finished(self):
+        with self._lock:
+            return bool(self._get("finished"))
+
+    def save_listing_page(self, ad_links, next_url, page_count):
+        """
+        Grava, em uma única transação, os links da página como pendentes e o avanço do cursor.
+        Retorna apenas os links que ainda não estavam na fronteira (os demais já foram vistos nesta coleta).
+        """
+        new_links = []
+        with self._lock:
+            next_seq = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM frontier").fetchone()[0] + 1
+            for ad_url in ad_links:
+                cursor = self._db.execute(
+                    "INSERT OR IGNORE INTO frontier (ad_url, status, seq) VALUES (?, 'pending', ?)",
+                    (ad_url, next_seq + len(new_links)),
+                )
+                if cursor.rowcount:
+                    new_links.append(ad_url)
+            self._set("listing_cursor", {"next_url": next_url, "page_count": page_count})
+            self._set("finished", False)
+            self._db.commit()
+        return new_links
+
+    def pending_ad_urls(self):
+        """Links já descobertos, mas ainda não concluídos, na ordem em que foram encontrados."""
+        with self._lock:
+            rows = self._db.execute("SELECT ad_url FROM frontier WHERE status = 'pending' ORDER BY seq").fetchall()
+        return [row[0] for row in rows]
+
+    def record_ad(self, ad_url, ad_data):
+        """Registra um anúncio concluído. A gravação em disco acontece a cada 'batch_size' anúncios."""
+        with self._lock:
+            self._pending_records.append((extract_ad_id(ad_url), ad_url, json.dumps(dict(ad_data), ensure_ascii=False)))
+            if len(self._pending_records) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending_records:
+            return
+        self._db.executemany("INSERT OR REPLACE INTO ads (ad_id, ad_url, data) VALUES (?, ?, ?)", self._pending_records)
+        self._db.executemany(
+            "UPDATE frontier SET status = 'done' WHERE ad_url = ?",
+            [(ad_url,) for _, ad_url, _ in self._pending_records],
+        )
+        self._db.commit()
+        logging.info(f"Checkpoint: {len(self._pending_records)} anúncios gravados em '{self.path}'.")
+        self._pending_records.clear()
+
+    def flush(self):
+        """Grava imediatamente os anúncios ainda em memória."""
+        with self._lock:
+            self._flush_locked()
+
+    def iter_ads(self, chunk_size=1000):
+        """Percorre os dados de todos os anúncios já concluídos, lendo do disco em blocos de 'chunk_size'."""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT rowid, data FROM ads WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, data in rows:
+                last_rowid = rowid
+                yield as_record(json.loads(data))
+
+    def count_ads(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM ads").fetchone()[0]
+
+    def mark_finished(self):
+        with self._lock:
+            self._flush_locked()
+            self._set("finished", True)
+            self._db.commit()
+
+    def mark_listing_failed(self):
+        """Registra que uma página de listagem não pôde ser baixada: a coleta não cobre a busca inteira."""
+        with self._lock:
+            self._set("listing_failed", True)
+            self._db.commit()
+
+    def mark_listing_exhausted(self):
+        """Registra que a paginação chegou ao fim da busca (e não ao limite MAX_PAGES_TO_SCRAPE ou a uma interrupção)."""
+        with self._lock:
+            self._set("listing_exhausted", True)
+            self._db.commit()
+
+    def is_complete(self):
+        """True se a coleta terminou e percorreu todas as páginas da busca, sem falhas de listagem (inclusive antes de um --resume)."""
+        with self._lock:
+            return bool(self._get("finished")) and bool(self._get("listing_exhausted")) and not self._get("listing_failed")
+
+    def close(self):
+        self.flush()
+        self._db.close()
@@ -0,0 +1,192 @@
+"""
+Comandos baratos da linha de comando: 'status' (situação da coleta, do histórico, da fila de jobs e das
+sessões) e 'dry-run' (o que seria coletado com a configuração atual).
+
+Os arquivos SQLite são abertos apenas para leitura e nada é criado; este módulo não importa pandas,
+cloudscraper nem o BeautifulSoup (só o dry-run com uma página salva carrega o backend de parsing).
+"""
+import json
+import os
+import sqlite3
+import time
+
+from .config import (
+    BASE_URL_OLX,
+    MAX_PAGES_TO_SCRAPE,
+    CRAWL_STATE_DB_PATH,
+    CHANGE_TRACKING_ENABLED,
+    CHANGE_TRACKER_DB_PATH,
+    EXPORT_ONLY_CHANGES,
+    EXPORT_FORMATS,
+    DATA_FOLDER,
+    SESSION_STATE_PATH,
+    PARSER_BACKEND,
+    USE_EMBEDDED_JSON,
+    LISTING_CARD_MODE,
+    MAX_CONCURRENT_REQUESTS,
+    REQUESTS_PER_SECOND_PER_HOST,
+    HTTP_CACHE_ENABLED,
+    SELECTORS_LISTING_PAGE,
+    SELECTORS_AD_PAGE,
+)
+
+
+def _open_read_only(path):
+    """Conexão somente leitura com um arquivo SQLite existente, ou None se ele não existir."""
+    if not os.path.exists(path):
+        return None
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def crawl_status(path=CRAWL_STATE_DB_PATH):
+    """Progresso da última coleta (checkpoint de CRAWL_STATE_DB_PATH), ou None se não houver."""
+    db = _open_read_only(path)
+    if db is None:
+        return None
+    try:
+        state = {key: json.loads(value) for key, value in db.execute("SELECT key, value FROM crawl_state")}
+        frontier = dict(db.execute("SELECT status, COUNT(*) FROM frontier GROUP BY status").fetchall())
+        cursor = state.get("listing_cursor") or {}
+        return {
+            "finalizada": bool(state.get("finished")),
+            "paginas_de_listagem": cursor.get("page_count", 0),
+            "proxima_listagem": cursor.get("next_url"),
+            "anuncios_concluidos": db.execute("SELECT COUNT(*) FROM ads").fetchone()[0],
+            "anuncios_pendentes": frontier.get("pending", 0),
+        }
+    except sqlite3.Error:
+        return None # Arquivo de outra versão ou ainda sem tabelas
+    finally:
+        db.close()
+
+
+def history_status(path=CHANGE_TRACKER_DB_PATH):
+    """Resumo do histórico de mudanças (ads_history.sqlite3) e da última execução registrada, ou None."""
+    db = _open_read_only(path)
+    if db is None:
+        return None
+    try:
+        active, removed = db.execute("SELECT COUNT(*) - COUNT(removed_at), COUNT(removed_at) FROM ads").fetchone()
+        last_run = db.execute(
+            "SELECT started_at, finished_at, new_ads, changed_ads, unchanged_ads, removed_ads FROM runs ORDER BY run_id DESC LIMIT 1"
+        ).fetchone()
+        return {
+            "anuncios_ativos": active,
+            "anuncios_removidos": removed,
+            "mudancas_de_preco": db.execute("SELECT COUNT(*) FROM price_history WHERE preco_anterior IS NOT NULL").fetchone()[0],
+            "ultima_execucao": dict(zip(("inicio", "fim", "novos", "alterados", "inalterados", "removidos"), last_run)) if last_run else None,
+        }
+    except sqlite3.Error:
+        return None
+    finally:
+        db.close()
+
+
+def job_status(queue_location):
+    """Shards por status e anúncios coletados da fila de jobs (só filas SQLite existentes; Redis exige conexão)."""
+    if queue_location.startswith(("redis://", "rediss://", "unix://")):
+        return None
+    db = _open_read_only(queue_location)
+    if db is None:
+        return None
+    try:
+        counts = dict(db.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+        counts["ads"] = db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return counts
+    except sqlite3.Error:
+        return None
+    finally:
+        db.close()
+
+
+def session_status(path=SESSION_STATE_PATH):
+    """Sessões gravadas em SESSION_STATE_PATH e quantas ainda têm a liberação do Cloudflare válida."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as state_file:
+            state = json.load(state_file)
+    except (OSError, ValueError):
+        return None
+    now = time.time()
+    sessions = state.get("sessions", [])
+    cleared = sum(
+        any(cookie.get("name") == "cf_clearance" and (not cookie.get("expires") or cookie["expires"] > now) for cookie in session.get("cookies", []))
+        for session in sessions
+    )
+    return {"sessoes": len(sessions), "com_liberacao_valida": cleared, "gravadas_ha_min": round((now - state.get("saved_at", now)) / 60, 1)}
+
+
+def collect_status(queue_location):
+    return {
+        "coleta": crawl_status(),
+        "historico": history_status() if CHANGE_TRACKING_ENABLED else None,
+        "fila_de_jobs": job_status(queue_location),
+        "sessoes": session_status(),
+    }
+
+
+def format_status(status):
+    """Texto legível do dict de collect_status, uma seção por linha de título."""
+    titles = {"coleta": "Coleta", "historico": "Histórico de mudanças", "fila_de_jobs": "Fila de jobs", "sessoes": "Sessões HTTP"}
+    lines = []
+    for key, title in titles.items():
+        section = status.get(key)
+        lines.append(f"{title}:")
+        if not section:
+            lines.append("  (nenhum dado)")
+            continue
+        for name, value in section.items():
+            lines.append(f"  {name}: {value}")
+    return "\n".join(lines)
+
+
+def dry_run_plan(sample_page=None):
+    """
+    O que uma coleta faria com a configuração atual, sem nenhuma requisição. Com 'sample_page'
+    (uma página de listagem salva em disco), também conta os links e cards que os seletores encontram nela.
+    """
+    plan = {
+        "url_base": BASE_URL_OLX,
+        "max_paginas": MAX_PAGES_TO_SCRAPE or "todas",
+        "modo_cards": LISTING_CARD_MODE,
+        "backend": PARSER_BACKEND,
+        "json_embutido": USE_EMBEDDED_JSON,
+        "requisicoes_simultaneas": MAX_CONCURRENT_REQUESTS,
+        "requisicoes_por_segundo": round(REQUESTS_PER_SECOND_PER_HOST, 3),
+        "cache_http": HTTP_CACHE_ENABLED,
+        "historico": CHANGE_TRACKER_DB_PATH if CHANGE_TRACKING_ENABLED else None,
+        "exporta_so_mudancas": CHANGE_TRACKING_ENABLED and EXPORT_ONLY_CHANGES,
+        "formatos": ", ".join(EXPORT_FORMATS),
+        "pasta_de_saida": DATA_FOLDER,
+        "coleta_retomavel": crawl_status() is not None,
+        "seletores_invalidos": invalid_selectors(),
+    }
+    if sample_page:
+        from .extraction import parse_page, extract_ad_links_from_listing_page, extract_ad_cards_from_listing_page
+
+        with open(sample_page, "rb") as page_file:
+            soup = parse_page(page_file.read())
+        plan["links_na_pagina"] = len(extract_ad_links_from_listing_page(soup))
+        cards = extract_ad_cards_from_listing_page(soup)
+        plan["cards_na_pagina"] = len(cards)
+        plan["cards_com_preco"] = sum(1 for card in cards if card.get("preco") is not None)
+    return plan
+
+
+def invalid_selectors():
+    """Seletores CSS de config.py que o cssselect não consegue compilar, como 'chave: erro'."""
+    from cssselect import GenericTranslator, SelectorError
+
+    translator = GenericTranslator()
+    errors = []
+    for selectors in (SELECTORS_LISTING_PAGE, SELECTORS_AD_PAGE):
+        for key, css_selectors in selectors.items():
+            for css_selector in css_selectors if isinstance(css_selectors, (list, tuple)) else [css_selectors]:
+                if not css_selector:
+                    continue
+                try:
+                    translator.css_to_xpath(css_selector)
+                except SelectorError as e:
+                    errors.append(f"{key}: {e}")
+    return errors
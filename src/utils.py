@@ -1,5 +1,28 @@
 import re
 import logging
+from datetime import datetime, timedelta, timezone
+
+# Expressões regulares pré-compiladas, compartilhadas com a normalização em lote (normalization.py)
+PRICE_PATTERN = re.compile(r'[\d\.,]+')
+NUMBER_PATTERN = re.compile(r'\d+')
+AD_ID_PATTERN = re.compile(r'-(\d+)/?(?:[?#]|$)')
+# "São Paulo, SP, 01001000", "São Paulo - SP, 01001-000" ou só "São Paulo, SP"
+CITY_STATE_CEP_PATTERN = re.compile(r'^\s*(?P<cidade>.+?)\s*(?:,|\s-\s)\s*(?P<estado>[A-Z]{2})\b(?:\s*,?\s*(?P<cep>\d{5}-?\d{3}))?')
+
+# Datas de publicação: "Publicado em 05/06 às 14:30" ou "05/06/2024 às 14:30" (página do anúncio),
+# "Hoje, 14:30", "Ontem, 09:05" e "5 de jun, 14:30" (cards da listagem)
+DATE_DAY_MONTH_PATTERN = re.compile(r'(?P<dia>\d{1,2})/(?P<mes>\d{1,2})(?:/(?P<ano>\d{2,4}))?')
+DATE_MONTH_NAME_PATTERN = re.compile(r'(?P<dia>\d{1,2})\s+(?:de\s+)?(?P<mes>[a-zç]{3})', re.IGNORECASE)
+TIME_PATTERN = re.compile(r'(?P<hora>\d{1,2})[:h](?P<minuto>\d{2})')
+MONTH_ABBREVIATIONS = ("jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez")
+# Horário exibido pela OLX (Brasília, sem horário de verão desde 2019)
+OLX_TIMEZONE = timezone(timedelta(hours=-3))
+
+# Labels (em minúsculas) da seção de detalhes cujos valores são números
+COUNT_DETAIL_KEYWORDS = ("quarto", "banheiro", "vaga", "andar")
+AREA_DETAIL_KEYWORDS = ("área", "tamanho")
+# Itens de resumo dos cards da listagem ("2 quartos", "50m²") -> mesma label da seção de detalhes do anúncio
+CARD_DETAIL_LABELS = (("quarto", "quartos"), ("banheiro", "banheiros"), ("vaga", "vagas na garagem"), ("m²", "área útil"), ("metros quadrados", "área útil"))
 
 def clean_text(text):
     """Remove espaços extras e quebras de linha de um texto."""
@@ -12,7 +35,7 @@ def extract_price(price_text):
     if not price_text:
         return None
     # Remove 'R$', pontos de milhar e substitui vírgula decimal por ponto.
-    match = re.search(r'[\d\.,]+', price_text)
+    match = PRICE_PATTERN.search(price_text)
     if match:
         try:
             # Remove pontos de milhar, substitui vírgula decimal por ponto
@@ -27,11 +50,142 @@ def extract_number(text_with_number):
     """Extrai o primeiro número encontrado em um texto (ex: '2 quartos')."""
     if not text_with_number:
         return None
-    match = re.search(r'\d+', text_with_number)
+    match = NUMBER_PATTERN.search(text_with_number)
     if match:
         return int(match.group(0))
     return None
 
+def normalize_detail_value(label_text, value_text):
+    """
+    Converte o valor de um item da seção de detalhes conforme a sua label (já em minúsculas):
+    quartos, banheiros, vagas, andar e áreas viram números; os demais ficam como texto.
+    """
+    if any(kw in label_text for kw in COUNT_DETAIL_KEYWORDS):
+        return extract_number(value_text)
+    if any(kw in label_text for kw in AREA_DETAIL_KEYWORDS):
+        return extract_number(value_text) # Poderia ser float também
+    return value_text
+
+def extract_ad_id(ad_url):
+    """
+    Extrai o ID estável do anúncio da URL da OLX, que termina com '-<id numérico>'
+    (ex: '.../apartamento-2-quartos-1234567890'). Retorna a própria URL se o padrão não for encontrado.
+    """
+    if not ad_url:
+        return None
+    match = AD_ID_PATTERN.search(ad_url)
+    if match:
+        return match.group(1)
+    return ad_url
+
+def parse_publication_date(value, now=None):
+    """
+    Converte a data de publicação de qualquer caminho de extração para o mesmo formato ISO 8601 no horário
+    de Brasília (ex: '2024-06-05T14:30:00-03:00'): timestamp do JSON embutido (segundos ou milissegundos),
+    texto ISO, "Publicado em 05/06 às 14:30", "Hoje, 14:30", "Ontem, 14:30" ou "5 de jun, 14:30".
+    Datas sem ano ficam no ano corrente (ou no anterior, se cairiam no futuro). Retorna None se não reconhecer.
+    """
+    if value is None or value == "":
+        return None
+    now = now or datetime.now(OLX_TIMEZONE)
+    if isinstance(value, (int, float)) or (isinstance(value, str) and value.isdigit()):
+        timestamp = float(value)
+        if timestamp > 1e11: # Milissegundos
+            timestamp /= 1000
+        return datetime.fromtimestamp(timestamp, OLX_TIMEZONE).isoformat()
+    text = clean_text(str(value))
+    if not text:
+        return None
+    try: # ISO ("2024-06-05T17:30:00.000Z", "2024-06-05 14:30:00")
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        parsed = parsed.replace(tzinfo=OLX_TIMEZONE) if parsed.tzinfo is None else parsed.astimezone(OLX_TIMEZONE)
+        return parsed.replace(microsecond=0).isoformat()
+    except ValueError:
+        pass
+
+    lowered = text.lower()
+    time_match = TIME_PATTERN.search(lowered)
+    hour, minute = (int(time_match.group("hora")), int(time_match.group("minuto"))) if time_match else (0, 0)
+    year_given = True
+    if "hoje" in lowered or "ontem" in lowered:
+        day = (now - timedelta(days=1) if "ontem" in lowered else now).date()
+        year, month, day = day.year, day.month, day.day
+    elif match := DATE_DAY_MONTH_PATTERN.search(lowered):
+        day, month = int(match.group("dia")), int(match.group("mes"))
+        year_given = match.group("ano") is not None
+        year = int(match.group("ano")) if year_given else now.year
+        year += 2000 if year < 100 else 0
+    elif (match := DATE_MONTH_NAME_PATTERN.search(lowered)) and match.group("mes") in MONTH_ABBREVIATIONS:
+        day, month, year, year_given = int(match.group("dia")), MONTH_ABBREVIATIONS.index(match.group("mes")) + 1, now.year, False
+    else:
+        return None
+    try:
+        parsed = datetime(year, month, day, hour, minute, tzinfo=OLX_TIMEZONE)
+        if not year_given and parsed > now + timedelta(days=1): # "05/12" lido em janeiro: dezembro do ano anterior
+            parsed = parsed.replace(year=year - 1)
+    except ValueError:
+        return None
+    return parsed.isoformat()
+
+def normalize_publication_date(value, ad_url=None):
+    """parse_publication_date para os extratores: avisa (com amostragem, pelo seletor 'date_posted') quando o formato não é reconhecido."""
+    published_at = parse_publication_date(value)
+    if published_at is None and value not in (None, ""):
+        logging.warning(f"Data de publicação em formato não reconhecido: '{value}'", extra={"url": ad_url, "stage": "extract", "selector": "date_posted", "reason": "formato"})
+    return published_at
+
+def split_city_state_cep(text):
+    """Separa 'Cidade, UF, CEP' (formato de 'local_cidade_estado_cep') em (cidade, estado, cep); partes ausentes viram None."""
+    if not text:
+        return None, None, None
+    match = CITY_STATE_CEP_PATTERN.search(text)
+    if not match:
+        return clean_text(text), None, None
+    cep = match.group("cep")
+    return match.group("cidade"), match.group("estado"), cep.replace("-", "") if cep else None
+
+def split_card_location(text):
+    """Separa a localização de um card da listagem ('Cidade, Bairro') em (cidade, bairro); partes ausentes viram None."""
+    text = clean_text(text)
+    if not text:
+        return None, None
+    city, _, neighborhood = text.partition(",")
+    return clean_text(city), clean_text(neighborhood)
+
+def card_detail_item(text):
+    """Converte um item de resumo do card ('2 quartos', '50m²') em (label, valor), com as labels da seção de detalhes; (None, None) se não reconhecido."""
+    text = clean_text(text)
+    if not text:
+        return None, None
+    lowered = text.lower()
+    for keyword, label in CARD_DETAIL_LABELS:
+        if keyword in lowered:
+            return label, normalize_detail_value(label, text)
+    return None, None
+
+def listing_card_details(ad_url, title, price_text, location, date_posted, detail_texts, image_url):
+    """
+    Monta o dict de um anúncio a partir dos textos de um card da listagem, com as mesmas chaves de
+    extract_ad_details (campos que o card não traz, como descrição e vendedor, ficam de fora).
+    """
+    city, neighborhood = split_card_location(location)
+    price_text = clean_text(price_text)
+    details = {
+        "url_anuncio": ad_url,
+        "titulo": clean_text(title),
+        "preco_str": price_text,
+        "preco": extract_price(price_text),
+        "local_bairro": neighborhood,
+        "local_cidade": city,
+        "data_publicacao": normalize_publication_date(clean_text(date_posted), ad_url),
+        "imagem_principal_url": image_url,
+    }
+    for text in detail_texts:
+        label, value = card_detail_item(text)
+        if label and value is not None:
+            details[label] = value
+    return details
+
 def get_detail_value_by_label(details_elements, label_keyword):
     """
     Tenta encontrar um elemento de detalhe que contenha a 'label_keyword' (ex: 'Quartos')
@@ -54,12 +208,12 @@ def get_detail_value_by_label(details_elements, label_keyword):
             if len(parts) > 1:
                 value_part = parts[1].strip()
                 # Tentar extrair número se for relevante
-                num_match = re.search(r'\d+', value_part)
+                num_match = NUMBER_PATTERN.search(value_part)
                 if num_match:
                     return int(num_match.group(0))
                 return clean_text(value_part) # Retorna o texto se não for um número claro
             # Se a label e o valor estiverem no mesmo texto mas sem separador claro:
-            num_match_direct = re.search(r'\d+', text_content) # Ex: "2 Quartos"
+            num_match_direct = NUMBER_PATTERN.search(text_content) # Ex: "2 Quartos"
             if num_match_direct:
                  return int(num_match_direct.group(0))
     return None
@@ -70,4 +224,7 @@ if __name__ == '__main__':
     print(f"Preço: {extract_price('R$ 1.250,50')}")
     print(f"Preço: {extract_price('Sob Consulta')}")
     print(f"Número: {extract_number('Área útil 120 m²')}")
+    print(f"ID: {extract_ad_id('https://sp.olx.com.br/sao-paulo-e-regiao/imoveis/apartamento-2-quartos-1234567890')}")
+    print(f"Local: {split_city_state_cep('São Paulo, SP, 01001-000')}")
+    print(f"Card: {card_detail_item('50m²')}, {split_card_location('São Paulo, Vila Mariana')}")
     print(f"Texto limpo: {clean_text('  Olá   mundo  \n  teste ')}")
\ No newline at end of file
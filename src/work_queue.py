@@ -0,0 +1,355 @@
+"""
+Fila de trabalho compartilhada do modo job (ver jobs.py).
+Guarda os shards (busca × faixa de páginas de listagem), os anúncios já vistos por qualquer worker
+(deduplicação global, pelo ID do anúncio) e os resultados de todos os shards, para uma exportação única.
+
+Dois backends com a mesma interface:
+- SQLiteWorkQueue: um arquivo SQLite (WAL), compartilhado por processos da mesma máquina ou via disco em rede.
+- RedisWorkQueue: um servidor compatível com Redis (Redis, Valkey, KeyDB...), para workers em várias máquinas.
+  Requer o pacote 'redis'.
+Use open_work_queue("jobs.sqlite3") ou open_work_queue("redis://localhost:6379/0").
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try: # Backend Redis é opcional
+    import redis
+except ImportError:
+    redis = None
+
+from .records import as_record
+from .utils import extract_ad_id
+
+
+class Shard:
+    """Uma fatia do trabalho: as páginas 'page_start'..'page_end' (inclusive) da busca 'query_url'."""
+
+    __slots__ = ("id", "query_url", "page_start", "page_end", "attempts")
+
+    def __init__(self, id, query_url, page_start, page_end, attempts=0):
+        self.id = id
+        self.query_url = query_url
+        self.page_start = page_start
+        self.page_end = page_end
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Shard(id={self.id}, páginas {self.page_start}-{self.page_end} de {self.query_url})"
+
+
+class SQLiteWorkQueue:
+    """
+    Fila de shards em um arquivo SQLite. Cada shard é 'alugado' (lease) por um worker por 'lease_seconds';
+    se o worker morrer sem concluí-lo, o aluguel vence e outro worker o assume.
+    Um shard que falha volta para a fila até 'max_attempts' tentativas.
+    """
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        # isolation_level=None: as transações são abertas explicitamente (BEGIN IMMEDIATE) para o lease ser atômico entre processos
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                query_url TEXT NOT NULL,
+                page_start INTEGER NOT NULL,
+                page_end INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                lease_owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                UNIQUE (query_url, page_start)
+            );
+            CREATE INDEX IF NOT EXISTS idx_shards_status ON shards (status, id);
+            CREATE TABLE IF NOT EXISTS seen_ads (
+                ad_id TEXT PRIMARY KEY,
+                ad_url TEXT NOT NULL,
+                shard_id INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                ad_id TEXT PRIMARY KEY,
+                ad_url TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            """
+        )
+
+    def add_shards(self, shards):
+        """Inclui os shards (query_url, page_start, page_end); os já existentes são ignorados. Retorna quantos entraram."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            cursor = self._db.executemany(
+                "INSERT OR IGNORE INTO shards (query_url, page_start, page_end) VALUES (?, ?, ?)",
+                shards,
+            )
+            self._db.execute("COMMIT")
+            return cursor.rowcount
+
+    def lease(self, owner, lease_seconds):
+        """Aluga o próximo shard pendente (ou com aluguel vencido) para 'owner'. Retorna o Shard ou None se não houver."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    """SELECT id, query_url, page_start, page_end, attempts FROM shards
+                       WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                       ORDER BY id LIMIT 1""",
+                    (now,),
+                ).fetchone()
+                if row:
+                    self._db.execute(
+                        "UPDATE shards SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                        (owner, now + lease_seconds, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return Shard(*row[:4], attempts=row[4] + 1) if row else None
+
+    def renew(self, shard, owner, lease_seconds):
+        """Estende o aluguel de um shard ainda em processamento."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE shards SET lease_expires = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (time.time() + lease_seconds, shard.id, owner),
+            )
+
+    def claim_ad(self, ad_url, shard):
+        """
+        Reserva um anúncio para o shard. Retorna False se outro shard (desta ou de outra busca) já o reservou,
+        evitando que buscas sobrepostas baixem o mesmo anúncio duas vezes.
+        """
+        ad_id = extract_ad_id(ad_url)
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO seen_ads (ad_id, ad_url, shard_id) VALUES (?, ?, ?)",
+                (ad_id, ad_url, shard.id),
+            )
+            if cursor.rowcount:
+                return True
+            # Um shard retomado (após falha ou aluguel vencido) pode refazer os anúncios que reservou e não concluiu
+            row = self._db.execute("SELECT shard_id, done FROM seen_ads WHERE ad_id = ?", (ad_id,)).fetchone()
+        return bool(row) and row[0] == shard.id and not row[1]
+
+    def release_ad(self, ad_url):
+        """Libera a reserva de um anúncio que não pôde ser baixado, para que outro shard possa tentar."""
+        with self._lock:
+            self._db.execute("DELETE FROM seen_ads WHERE ad_id = ? AND done = 0", (extract_ad_id(ad_url),))
+
+    def complete(self, shard, owner, results):
+        """
+        Grava os anúncios do shard e o marca como concluído, em uma única transação.
+        Só vale se 'owner' ainda tem o aluguel do shard e ele não venceu; caso contrário (o shard pode já estar
+        com outro worker) nada é gravado e retorna False.
+        """
+        rows = [(extract_ad_id(ad_url), ad_url, json.dumps(dict(ad_data), ensure_ascii=False)) for ad_url, ad_data in results]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._db.execute(
+                    """UPDATE shards SET status = 'done', lease_owner = NULL, lease_expires = NULL
+                       WHERE id = ? AND status = 'leased' AND lease_owner = ? AND lease_expires >= ?""",
+                    (shard.id, owner, time.time()),
+                )
+                if not cursor.rowcount: # Aluguel perdido: descarta o resultado
+                    self._db.execute("ROLLBACK")
+                    return False
+                self._db.executemany("INSERT OR REPLACE INTO results (ad_id, ad_url, data) VALUES (?, ?, ?)", rows)
+                self._db.executemany("UPDATE seen_ads SET done = 1 WHERE ad_id = ?", [(row[0],) for row in rows])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return True
+
+    def fail(self, shard, owner, error):
+        """
+        Devolve o shard à fila (ou o marca como 'failed' após max_attempts tentativas) e retorna o novo status.
+        Retorna None, sem alterar o shard, se 'owner' já perdeu o aluguel.
+        """
+        status = "failed" if shard.attempts >= self.max_attempts else "pending"
+        with self._lock:
+            cursor = self._db.execute(
+                """UPDATE shards SET status = ?, lease_owner = NULL, lease_expires = NULL, last_error = ?
+                   WHERE id = ? AND status = 'leased' AND lease_owner = ? AND lease_expires >= ?""",
+                (status, str(error)[:500], shard.id, owner, time.time()),
+            )
+        return status if cursor.rowcount else None
+
+    def iter_results(self, chunk_size=1000):
+        """Percorre os anúncios de todos os shards concluídos, em blocos de 'chunk_size'."""
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT rowid, data FROM results WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last_rowid, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            for rowid, data in rows:
+                last_rowid = rowid
+                yield as_record(json.loads(data))
+
+    def progress(self):
+        """Contagem de shards por status e total de anúncios coletados."""
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+            counts["ads"] = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return counts
+
+    def close(self):
+        self._db.close()
+
+
+# Conclusão e falha no Redis: conferem o dono e o vencimento do aluguel e aplicam as alterações atomicamente
+# (um script Lua roda sem intercalar com comandos de outros clientes).
+# KEYS: shard:<id>, leased, results, seen_done, done | ARGV: id, owner, agora, ad_id1, json1, ad_id2, json2...
+_REDIS_COMPLETE = """
+if redis.call('HGET', KEYS[1], 'owner') ~= ARGV[2] then return 0 end
+local expires = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if not expires or tonumber(expires) < tonumber(ARGV[3]) then return 0 end
+for i = 4, #ARGV, 2 do
+    redis.call('HSET', KEYS[3], ARGV[i], ARGV[i + 1])
+    redis.call('SADD', KEYS[4], ARGV[i])
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[1], 'owner')
+redis.call('SADD', KEYS[5], ARGV[1])
+return 1
+"""
+# KEYS: shard:<id>, leased, failed, pending | ARGV: id, owner, agora, erro, max_attempts
+_REDIS_FAIL = """
+if redis.call('HGET', KEYS[1], 'owner') ~= ARGV[2] then return false end
+local expires = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if not expires or tonumber(expires) < tonumber(ARGV[3]) then return false end
+redis.call('HSET', KEYS[1], 'last_error', ARGV[4])
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[1], 'owner')
+if tonumber(redis.call('HGET', KEYS[1], 'attempts')) >= tonumber(ARGV[5]) then
+    redis.call('SADD', KEYS[3], ARGV[1])
+    return 'failed'
+end
+redis.call('RPUSH', KEYS[4], ARGV[1])
+return 'pending'
+"""
+
+
+class RedisWorkQueue:
+    """
+    A mesma fila em um servidor compatível com Redis, para workers em várias máquinas.
+    Chaves (com o prefixo 'prefix'): shard:<id> (hash), pending (lista de ids), leased (zset id -> vencimento),
+    done/failed (sets), seen (hash ad_id -> shard), seen_done (set) e results (hash ad_id -> JSON).
+    """
+
+    def __init__(self, url, max_attempts=3, prefix="olx_job"):
+        if redis is None:
+            raise RuntimeError("O backend Redis da fila de jobs requer o pacote 'redis' (pip install redis).")
+        self.url = url
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._complete_script = self._redis.register_script(_REDIS_COMPLETE)
+        self._fail_script = self._redis.register_script(_REDIS_FAIL)
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def add_shards(self, shards):
+        added = 0
+        for query_url, page_start, page_end in shards:
+            shard_key = f"{query_url}#{page_start}"
+            if not self._redis.hsetnx(self._key("shard_index"), shard_key, ""): # Já existe
+                continue
+            shard_id = self._redis.incr(self._key("shard_seq"))
+            self._redis.hset(self._key("shard_index"), shard_key, shard_id)
+            self._redis.hset(self._key(f"shard:{shard_id}"), mapping={
+                "query_url": query_url, "page_start": page_start, "page_end": page_end, "attempts": 0,
+            })
+            self._redis.rpush(self._key("pending"), shard_id)
+            added += 1
+        return added
+
+    def _requeue_expired(self):
+        for shard_id in self._redis.zrangebyscore(self._key("leased"), 0, time.time()):
+            if self._redis.zrem(self._key("leased"), shard_id): # Só um worker consegue remover
+                self._redis.lpush(self._key("pending"), shard_id)
+
+    def lease(self, owner, lease_seconds):
+        self._requeue_expired()
+        shard_id = self._redis.lpop(self._key("pending"))
+        if shard_id is None:
+            return None
+        self._redis.zadd(self._key("leased"), {shard_id: time.time() + lease_seconds})
+        shard_key = self._key(f"shard:{shard_id}")
+        attempts = self._redis.hincrby(shard_key, "attempts", 1)
+        self._redis.hset(shard_key, "owner", owner)
+        data = self._redis.hgetall(shard_key)
+        return Shard(int(shard_id), data["query_url"], int(data["page_start"]), int(data["page_end"]), attempts=attempts)
+
+    def renew(self, shard, owner, lease_seconds):
+        if self._redis.hget(self._key(f"shard:{shard.id}"), "owner") == owner:
+            self._redis.zadd(self._key("leased"), {shard.id: time.time() + lease_seconds}, xx=True)
+
+    def claim_ad(self, ad_url, shard):
+        ad_id = extract_ad_id(ad_url)
+        if self._redis.hsetnx(self._key("seen"), ad_id, shard.id):
+            return True
+        return self._redis.hget(self._key("seen"), ad_id) == str(shard.id) and not self._redis.sismember(self._key("seen_done"), ad_id)
+
+    def release_ad(self, ad_url):
+        ad_id = extract_ad_id(ad_url)
+        if not self._redis.sismember(self._key("seen_done"), ad_id):
+            self._redis.hdel(self._key("seen"), ad_id)
+
+    def complete(self, shard, owner, results):
+        args = [shard.id, owner, time.time()]
+        for ad_url, ad_data in results:
+            args += [extract_ad_id(ad_url), json.dumps(dict(ad_data), ensure_ascii=False)]
+        keys = [self._key(f"shard:{shard.id}"), self._key("leased"), self._key("results"), self._key("seen_done"), self._key("done")]
+        return bool(self._complete_script(keys=keys, args=args))
+
+    def fail(self, shard, owner, error):
+        keys = [self._key(f"shard:{shard.id}"), self._key("leased"), self._key("failed"), self._key("pending")]
+        return self._fail_script(keys=keys, args=[shard.id, owner, time.time(), str(error)[:500], self.max_attempts])
+
+    def iter_results(self, chunk_size=1000):
+        for _, data in self._redis.hscan_iter(self._key("results"), count=chunk_size):
+            yield as_record(json.loads(data))
+
+    def progress(self):
+        return {
+            "pending": self._redis.llen(self._key("pending")),
+            "leased": self._redis.zcard(self._key("leased")),
+            "done": self._redis.scard(self._key("done")),
+            "failed": self._redis.scard(self._key("failed")),
+            "ads": self._redis.hlen(self._key("results")),
+        }
+
+    def close(self):
+        self._redis.close()
+
+
+def open_work_queue(location, max_attempts=3):
+    """Abre a fila de jobs: URL redis:// / rediss:// / unix:// para o backend Redis, caminho de arquivo para SQLite."""
+    if location.startswith(("redis://", "rediss://", "unix://")):
+        logging.info(f"Fila de jobs no Redis: {location}")
+        return RedisWorkQueue(location, max_attempts)
+    return SQLiteWorkQueue(location, max_attempts)